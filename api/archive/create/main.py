@@ -86,10 +86,8 @@ def lambda_handler(event, context):
         database_engine = body["database_engine"]
         table_details = body["tables"]
 
-        for table in table_details:
-            table["count_validation"] = {}
-            table["string_validation"] = {}
-            table["number_validation"] = {}
+        details_parameter = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
 
         archive_id = str(uuid.uuid4())
         create_secret_response = client.create_secret(
@@ -114,15 +112,18 @@ def lambda_handler(event, context):
                 "secret_arn": create_secret_response["ARN"],
                 "database": database,
                 "oracle_owner": body["oracle_owner"] if 'oracle_owner' in body else "",
-                "table_details": table_details,
+                "table_count": len(table_details),
+                "rows_archived": 0,
+                "bytes_archived": 0,
                 "time_submitted": str(dt),
                 "archive_status": "Archive Queue",
                 "job_status": "",
-                "jobs": {},
                 "configuration": {"glue":
                                   {
                                       "glue_worker": "Standard",
-                                      "glue_capacity": 2
+                                      "glue_capacity": 2,
+                                      "target_file_size_mb": 256,
+                                      "read_options": body.get("read_options", {})
                                   }
                                   },
                 "counters": {"validation":
@@ -137,6 +138,22 @@ def lambda_handler(event, context):
                 "delete_data": False
             })
 
+        # Per-table state lives in child items so pipeline steps only touch the tables they work on
+        details_table = dynamodb_client.Table(
+            details_parameter['Parameter']['Value'])
+        with details_table.batch_writer() as batch:
+            for position, table_detail in enumerate(table_details):
+                batch.put_item(
+                    Item={
+                        **table_detail,
+                        "archive_id": archive_id,
+                        "item_key": f'table#{table_detail["table"]}',
+                        "position": position,
+                        "count_validation": {},
+                        "string_validation": {},
+                        "number_validation": {},
+                    })
+
         response = {"text": "Example response from authenticated api"}
         return build_response(200, json.dumps(response))
     except Exception as ex:
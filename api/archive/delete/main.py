@@ -21,6 +21,8 @@ import traceback
 import datetime
 import uuid
 
+from boto3.dynamodb.conditions import Key
+
 # region Logging
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -81,6 +83,28 @@ def lambda_handler(event, context):
             Key={
                 'id': archive_id
             })
+
+        # Delete the per-table and per-job child items of the archive
+        details_parameter = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        details_table = dynamodb_client.Table(
+            details_parameter['Parameter']['Value'])
+        query_args = {
+            "KeyConditionExpression": Key("archive_id").eq(archive_id),
+            "ProjectionExpression": "archive_id, item_key",
+        }
+        with details_table.batch_writer() as batch:
+            while True:
+                details_response = details_table.query(**query_args)
+                for item in details_response["Items"]:
+                    batch.delete_item(
+                        Key={
+                            "archive_id": item["archive_id"],
+                            "item_key": item["item_key"]
+                        })
+                if "LastEvaluatedKey" not in details_response:
+                    break
+                query_args["ExclusiveStartKey"] = details_response["LastEvaluatedKey"]
                 
 
 
@@ -17,7 +17,12 @@ import boto3
 import json
 import logging
 import os
+import re
+import time
 import traceback
+import uuid
+
+from scan_limits import preflight, record_scan, request_user, summary_table_name
 
 # region Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -32,6 +37,22 @@ else:
 s3 = boto3.client('s3')
 athena = boto3.client('athena')
 ssm = boto3.client('ssm')
+dynamodb = boto3.client('dynamodb')
+
+URL_EXPIRES_IN = 600  # 10 minutes
+EXPORT_PREFIX = "exports/"
+# Exports are recorded in the summary table, next to the users' scanned bytes
+EXPORT_ID_PREFIX = "export#"
+EXPORT_TTL_DAYS = 7
+# Archive queries run in the archive's Glue database, "<archive ID>-<database>-database"
+ARCHIVE_DATABASE = re.compile(r"([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})-(.+)-database")
+# UNLOAD options per export format. Text output has no header row and no quoting; the
+# column names are returned with the parts.
+EXPORT_FORMATS = {
+    "csv_gzip": "format = 'TEXTFILE', field_delimiter = ',', compression = 'GZIP'",
+    "csv_zstd": "format = 'TEXTFILE', field_delimiter = ',', compression = 'ZSTD'",
+    "parquet": "format = 'PARQUET', compression = 'ZSTD'",
+}
 
 def mask_sensitive_data(event):
     keys_to_redact = ["authorization"]
@@ -55,13 +76,228 @@ def build_response(http_code, body):
         "body": body,
     }
 
+def archive_tables(details_table_name, archive_id):
+    """
+    Returns the tables of an archive with the bytes their last run archived, for the scan
+    estimate.
+    """
+    tables = []
+    query_args = {
+        'TableName': details_table_name,
+        'KeyConditionExpression': 'archive_id = :a AND begins_with(item_key, :t)',
+        'ExpressionAttributeValues': {':a': {'S': archive_id}, ':t': {'S': 'table#'}},
+        'ProjectionExpression': '#table, bytes_archived',
+        'ExpressionAttributeNames': {'#table': 'table'}
+    }
+    while True:
+        response = dynamodb.query(**query_args)
+        tables.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return [
+        {'table': item['table']['S'], 'bytes_archived': int(item['bytes_archived']['N']) if 'bytes_archived' in item else None}
+        for item in tables if item.get('table', {}).get('S')
+    ]
+
+
+def check_scan_limit(event, query_execution):
+    """
+    Estimates the bytes the UNLOAD of a query would scan, which runs the query again, and checks
+    them against the same limits as the query itself.
+
+    Returns:
+    tuple: The archive ID and the scan estimate.
+
+    Raises:
+    ValueError: If the query did not run against an archive.
+    """
+
+    match = ARCHIVE_DATABASE.fullmatch(query_execution.get("QueryExecutionContext", {}).get("Database", ""))
+    if not match:
+        raise ValueError("Only the results of an archive query can be exported")
+    archive_id, database_name = match.groups()
+
+    archives_table_param = ssm.get_parameter(
+        Name='/archive/dynamodb-table', WithDecryption=True)
+    archive_item = dynamodb.get_item(
+        TableName=archives_table_param['Parameter']['Value'],
+        Key={'id': {'S': archive_id}}
+    ).get('Item')
+    if not archive_item:
+        raise ValueError(f"Archive {archive_id} does not exist")
+
+    details_table_param = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
+    table_details = archive_tables(details_table_param['Parameter']['Value'], archive_id)
+    return archive_id, preflight(
+        event, archive_id, archive_item, database_name, table_details, query_execution["Query"])
+
+
+def record_export(event, export_execution_id, query_execution_id, archive_id):
+    """
+    Records an export against the query it exports and the user who started it. Status calls
+    are answered only for the same query and user.
+    """
+    item = {
+        'id': {'S': f'{EXPORT_ID_PREFIX}{export_execution_id}'},
+        'query_execution_id': {'S': query_execution_id},
+        'archive_id': {'S': archive_id},
+        'ttl': {'N': str(int(time.time()) + EXPORT_TTL_DAYS * 24 * 3600)}
+    }
+    user = request_user(event)
+    if user:
+        item['user'] = {'S': user}
+    dynamodb.put_item(TableName=summary_table_name(), Item=item)
+
+
+def get_export(event, export_execution_id, query_execution_id):
+    """
+    Returns the recorded export, or None if it was not started from the query by the same user.
+    """
+    item = dynamodb.get_item(
+        TableName=summary_table_name(),
+        Key={'id': {'S': f'{EXPORT_ID_PREFIX}{export_execution_id}'}},
+        ConsistentRead=True
+    ).get('Item')
+    if not item or item['query_execution_id']['S'] != query_execution_id:
+        return None
+    if item.get('user', {}).get('S') != request_user(event):
+        return None
+    return item
+
+
+def record_export_scan(event, export_execution):
+    """
+    Adds the bytes a finished export scanned to the user's daily total, once per export.
+    """
+    try:
+        dynamodb.update_item(
+            TableName=summary_table_name(),
+            Key={'id': {'S': f'{EXPORT_ID_PREFIX}{export_execution["QueryExecutionId"]}'}},
+            UpdateExpression='SET scan_recorded = :t',
+            ConditionExpression='attribute_exists(id) AND attribute_not_exists(scan_recorded)',
+            ExpressionAttributeValues={':t': {'BOOL': True}}
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return
+    record_scan(event, export_execution)
+
+
+def start_export(query_execution, export_format):
+    """
+    Starts an UNLOAD of the query's results to a new prefix of the Athena results bucket, in the
+    export format. Athena writes the results as several files, which can be downloaded in
+    parallel.
+
+    Returns:
+    str: The query execution ID of the UNLOAD.
+    """
+
+    if query_execution.get("StatementType") != "DML":
+        raise ValueError("Only the results of a SELECT query can be exported")
+
+    bucket_param = ssm.get_parameter(
+        Name='/athena/s3-athena-temp-bucket', WithDecryption=True)
+    bucket_name = bucket_param['Parameter']['Value']
+    location = f's3://{bucket_name}/{EXPORT_PREFIX}{query_execution["QueryExecutionId"]}/' \
+               f'{export_format}/{uuid.uuid4()}/'
+
+    query = query_execution["Query"].strip().rstrip(";")
+    response = athena.start_query_execution(
+        QueryString=f"UNLOAD ({query}) TO '{location}' WITH ({EXPORT_FORMATS[export_format]})",
+        QueryExecutionContext=query_execution.get("QueryExecutionContext", {}),
+        WorkGroup=query_execution.get("WorkGroup", "sdas")
+    )
+    return response["QueryExecutionId"]
+
+
+def get_columns(query_execution_id):
+    response = athena.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+    return [column["Name"] for column in response["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]]
+
+
+def export_parts(export_execution, range_size_mb=None):
+    """
+    Returns a manifest of the files an UNLOAD wrote: a presigned URL and the size of each part,
+    and, with range_size_mb, the byte ranges to download each part in parallel requests.
+    """
+
+    match = re.search(r"TO '(s3://[^']+)'", export_execution["Query"])
+    bucket_name, prefix = match.group(1).replace("s3://", "").split("/", 1)
+    if not prefix.startswith(EXPORT_PREFIX):
+        raise ValueError("Not an export of query results")
+
+    parts = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for s3_object in page.get("Contents", []):
+            part = {
+                "key": s3_object["Key"],
+                "size": s3_object["Size"],
+                "download_url": s3.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': bucket_name, 'Key': s3_object["Key"]},
+                    ExpiresIn=URL_EXPIRES_IN
+                ),
+            }
+            if range_size_mb:
+                range_size = int(range_size_mb) * 1024 * 1024
+                part["ranges"] = [
+                    f"bytes={start}-{min(start + range_size, s3_object['Size']) - 1}"
+                    for start in range(0, s3_object["Size"], range_size)
+                ]
+            parts.append(part)
+    return parts
+
+
+def export_status(event, export_execution_id, source_execution_id, range_size_mb=None):
+    export_execution = athena.get_query_execution(
+        QueryExecutionId=export_execution_id)["QueryExecution"]
+    state = export_execution["Status"]["State"]
+    result = {
+        "export_execution_id": export_execution_id,
+        "query_execution_id": source_execution_id,
+        "status": state,
+    }
+    if state in ("FAILED", "CANCELLED"):
+        result["message"] = export_execution["Status"].get("StateChangeReason", "")
+    elif state == "SUCCEEDED":
+        record_export_scan(event, export_execution)
+        parts = export_parts(export_execution, range_size_mb)
+        result.update({
+            "columns": get_columns(source_execution_id),
+            "parts": parts,
+            "total_size": sum(part["size"] for part in parts),
+            "expires_in": URL_EXPIRES_IN,
+        })
+    return result
+
+
 def lambda_handler(event, context):
     logger.info(mask_sensitive_data(event))
 
     try:
         body = json.loads(event["body"]) if "body" in event else json.loads(event)
         query_execution_id = body["query_execution_id"]
-        
+        export_format = body.get("format", "csv")
+
+        if export_format != "csv" and export_format not in EXPORT_FORMATS:
+            return build_response(400, json.dumps({
+                "error": f"Unsupported format {export_format}",
+                "formats": ["csv", *EXPORT_FORMATS]
+            }))
+
+        # Compressed and columnar exports run as an UNLOAD, which can take longer than the
+        # API timeout: the first call starts it, later calls with its ID return its parts
+        if body.get("export_execution_id"):
+            if not get_export(event, body["export_execution_id"], query_execution_id):
+                return build_response(404, json.dumps({
+                    "error": f'Export {body["export_execution_id"]} of query {query_execution_id} not found'
+                }))
+            return build_response(200, json.dumps(export_status(
+                event, body["export_execution_id"], query_execution_id, body.get("range_size_mb"))))
+
         # Get query execution details
         query_response = athena.get_query_execution(
             QueryExecutionId=query_execution_id
@@ -71,6 +307,24 @@ def lambda_handler(event, context):
             return build_response(400, json.dumps({
                 "error": "Query not completed successfully"
             }))
+
+        if export_format in EXPORT_FORMATS:
+            # The UNLOAD runs the query again, so it is refused like a query over the limits
+            archive_id, scan_estimate = check_scan_limit(event, query_response["QueryExecution"])
+            if not scan_estimate["allowed"]:
+                return build_response(400, json.dumps({
+                    "error": "Export exceeds scan limit",
+                    "message": scan_estimate["reason"],
+                    "estimate": scan_estimate
+                }))
+            export_execution_id = start_export(query_response["QueryExecution"], export_format)
+            record_export(event, export_execution_id, query_execution_id, archive_id)
+            return build_response(202, json.dumps({
+                "export_execution_id": export_execution_id,
+                "query_execution_id": query_execution_id,
+                "format": export_format,
+                "status": "QUEUED"
+            }))
         
         # Get the S3 location of the results
         result_config = query_response["QueryExecution"]["ResultConfiguration"]
@@ -86,7 +340,7 @@ def lambda_handler(event, context):
         presigned_url = s3.generate_presigned_url(
             'get_object',
             Params={'Bucket': bucket_name, 'Key': object_key},
-            ExpiresIn=600  # 10 minutes
+            ExpiresIn=URL_EXPIRES_IN
         )
         
         # Get object metadata for additional info
@@ -101,7 +355,7 @@ def lambda_handler(event, context):
         
         result = {
             "download_url": presigned_url,
-            "expires_in": 600,
+            "expires_in": URL_EXPIRES_IN,
             "file_size": file_size,
             "last_modified": last_modified.isoformat() if last_modified else None,
             "query_execution_id": query_execution_id
@@ -109,6 +363,8 @@ def lambda_handler(event, context):
 
         return build_response(200, json.dumps(result, default=str))
 
+    except ValueError as ex:
+        return build_response(400, json.dumps({"error": str(ex)}))
     except Exception as ex:
         logger.error(traceback.format_exc())
         return build_response(500, json.dumps({
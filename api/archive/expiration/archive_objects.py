@@ -0,0 +1,81 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import boto3
+
+BACKGROUND_FUNCTION = os.getenv("BACKGROUND_FUNCTION")
+
+lambda_client = boto3.client('lambda')
+
+
+def start_tag_run(table, archive_id, job, tag_key, tag_value, extra_updates=None):
+    """
+    Records a new run in the archive's job attribute and starts the background function that
+    sets (or, with an empty tag_value, removes) the tag on every object of the archive.
+
+    Args:
+    table: The archives DynamoDB table resource.
+    archive_id (str): The archive ID.
+    job (str): The attribute holding the run's progress, e.g. "expiration_job".
+    tag_key (str): The object tag to set.
+    tag_value (str): The tag value, or "" to remove the tag.
+    extra_updates (dict): Other archive attributes to set in the same write.
+
+    Returns:
+    str: The run ID.
+    """
+
+    run_id = str(uuid.uuid4())
+    names = {'#job': job}
+    values = {
+        ':job': {
+            "run_id": run_id,
+            "tag_value": tag_value,
+            "status": "InProgress",
+            "objects_processed": 0,
+            "objects_failed": 0,
+            "started_at": datetime.now(timezone.utc).isoformat()
+        }
+    }
+    clauses = ["#job = :job"]
+    for index, (attribute, value) in enumerate((extra_updates or {}).items()):
+        names[f'#a{index}'] = attribute
+        values[f':a{index}'] = value
+        clauses.append(f'#a{index} = :a{index}')
+
+    table.update_item(
+        Key={'id': archive_id},
+        UpdateExpression="SET " + ", ".join(clauses),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+    lambda_client.invoke(
+        FunctionName=BACKGROUND_FUNCTION,
+        InvocationType="Event",  # Asynchronous invocation
+        Payload=json.dumps({
+            "archive_id": archive_id,
+            "run_id": run_id,
+            "job": job,
+            "operation": "tag",
+            "tag_key": tag_key,
+            "tag_value": tag_value
+        })
+    )
+    return run_id
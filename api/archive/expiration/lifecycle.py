@@ -0,0 +1,163 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Archives that expire on the same date, or that sit in the same storage tier, share one
+# rule that matches an object tag, so the number of rules grows with the number of distinct
+# dates and tiers, not with archives.
+EXPIRATION_TAG_KEY = "sdas-expiration-date"
+STORAGE_TIER_TAG_KEY = "sdas-storage-tier"
+RULE_ID_PREFIX = "sdas-expire-"
+TIER_RULE_ID_PREFIX = "sdas-tier-"
+MAX_RULES = 1000
+# Rules for past dates are kept for a while so that lifecycle can finish expiring
+# objects, then dropped to keep room under the rule limit.
+PRUNE_AFTER_DAYS = 30
+MAX_ATTEMPTS = 3
+
+
+class LifecycleRuleLimitError(Exception):
+    """Raised when adding a rule would exceed the bucket's lifecycle rule limit."""
+
+
+def expiration_rule_id(expiration_date):
+    return f"{RULE_ID_PREFIX}{expiration_date}"
+
+
+def expiration_rule(expiration_date):
+    return {
+        "ID": expiration_rule_id(expiration_date),
+        "Filter": {
+            "Tag": {"Key": EXPIRATION_TAG_KEY, "Value": expiration_date}
+        },
+        "Expiration": {
+            "Date": datetime.strptime(expiration_date, "%Y-%m-%d")
+        },
+        "Status": "Enabled"
+    }
+
+
+def storage_tier_rule(storage_class):
+    return {
+        "ID": f"{TIER_RULE_ID_PREFIX}{storage_class}",
+        "Filter": {
+            "Tag": {"Key": STORAGE_TIER_TAG_KEY, "Value": storage_class}
+        },
+        "Transitions": [
+            {"Days": 0, "StorageClass": storage_class}
+        ],
+        "Status": "Enabled"
+    }
+
+
+def get_rules(client, bucket_name):
+    """
+    Returns the current lifecycle rules of the bucket, or an empty list if it has none.
+    """
+
+    try:
+        response = client.get_bucket_lifecycle_configuration(Bucket=bucket_name)
+        return response.get("Rules", [])
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] == "NoSuchLifecycleConfiguration":
+            return []
+        raise
+
+
+def put_rules(client, bucket_name, rules):
+    if rules:
+        client.put_bucket_lifecycle_configuration(
+            Bucket=bucket_name,
+            LifecycleConfiguration={"Rules": rules}
+        )
+    else:
+        client.delete_bucket_lifecycle(Bucket=bucket_name)
+
+
+def merge_rule(rules, new_rule, remove_ids=(), today=None):
+    """
+    Returns the rules with new_rule added if no rule with its ID exists yet.
+
+    Rules that are not managed here are kept unchanged. Expiration rules whose date is more
+    than PRUNE_AFTER_DAYS in the past are dropped, as are the rules listed in remove_ids.
+    """
+
+    today = today or datetime.utcnow().date()
+    prune_before = (today - timedelta(days=PRUNE_AFTER_DAYS)).isoformat()
+
+    merged = []
+    for rule in rules:
+        rule_id = rule.get("ID", "")
+        if rule_id in remove_ids:
+            continue
+        if rule_id.startswith(RULE_ID_PREFIX) and rule_id[len(RULE_ID_PREFIX):] < prune_before:
+            continue
+        merged.append(rule)
+
+    if not any(rule.get("ID") == new_rule["ID"] for rule in merged):
+        merged.append(new_rule)
+
+    if len(merged) > MAX_RULES:
+        raise LifecycleRuleLimitError(
+            f"Bucket lifecycle configuration would have {len(merged)} rules, the limit is {MAX_RULES}")
+
+    return merged
+
+
+def ensure_rule(client, bucket_name, new_rule, remove_ids=()):
+    """
+    Makes sure the bucket has new_rule.
+
+    S3 has no conditional write for lifecycle configurations, so a concurrent update can
+    replace ours. The configuration is read back after the write and the merge is retried
+    if the rule is missing.
+    """
+
+    rule_id = new_rule["ID"]
+    for attempt in range(MAX_ATTEMPTS):
+        rules = get_rules(client, bucket_name)
+        merged = merge_rule(rules, new_rule, remove_ids)
+        if merged != rules:
+            put_rules(client, bucket_name, merged)
+
+        if any(rule.get("ID") == rule_id for rule in get_rules(client, bucket_name)):
+            return rule_id
+        logger.warning(f"Lifecycle rule {rule_id} missing after write, retrying ({attempt + 1})")
+
+    raise Exception(f"Could not add lifecycle rule {rule_id} to bucket {bucket_name}")
+
+
+def ensure_expiration_rule(client, bucket_name, expiration_date, archive_id=None):
+    """
+    Makes sure the bucket has the shared expiration rule for expiration_date, and drops the
+    per-archive prefix rule that earlier versions created with the archive id as rule ID.
+    """
+
+    remove_ids = (archive_id,) if archive_id else ()
+    return ensure_rule(client, bucket_name, expiration_rule(expiration_date), remove_ids)
+
+
+def ensure_storage_tier_rule(client, bucket_name, storage_class):
+    """
+    Makes sure the bucket has the shared transition rule for storage_class.
+    """
+
+    return ensure_rule(client, bucket_name, storage_tier_rule(storage_class))
@@ -19,7 +19,9 @@ import boto3
 import logging
 import os
 import traceback
-from datetime import datetime
+
+from archive_objects import start_tag_run
+from lifecycle import ensure_expiration_rule, LifecycleRuleLimitError, EXPIRATION_TAG_KEY
 
 REGION = os.getenv("REGION")
 
@@ -79,8 +81,6 @@ def lambda_handler(event, context):
     expiration_status = body["expiration_status"]
     expiration_date = body["expiration_date"]
     delete_data = body["delete_data"]
-    folder_paths = [archive_id]
-    expiration = expiration_date
 
     bucket_parameter = ssm.get_parameter(
         Name='/job/s3-bucket-table-data', WithDecryption=True)
@@ -92,60 +92,18 @@ def lambda_handler(event, context):
     table = dynamodb.Table(parameter['Parameter']['Value'])
 
     try:
-            
+
+        # Objects are expired by a shared rule per date that matches an object tag. The
+        # rule is merged into the bucket configuration and the archive's objects are
+        # tagged (or untagged) by a background function.
         if delete_data is True:
-            for folder_path in folder_paths:
-
-                client.put_bucket_lifecycle_configuration(
-                    Bucket=bucket_name,
-                    LifecycleConfiguration={
-                        'Rules': [
-                            {
-                                'Expiration': {
-                                    'Date': datetime.strptime(expiration, '%Y-%m-%d')
-                                },
-                                'ID': folder_path,
-                                'Filter': {
-                                    'Prefix': folder_path + "/"
-                                },
-                                'Status': 'Enabled'
-                            }
-                        ]
-                    }
-                )
-            table.update_item(
-                Key={'id': archive_id},
-                UpdateExpression="SET delete_data= :s",
-                ExpressionAttributeValues={':s': True},
-                ReturnValues="UPDATED_NEW"
-            )
-        elif delete_data is False:
-            if delete_data is False:
-                for folder_path in folder_paths:
-
-                    client.put_bucket_lifecycle_configuration(
-                        Bucket=bucket_name,
-                        LifecycleConfiguration={
-                            'Rules': [
-                                {
-                                    'Expiration': {
-                                        'Date': datetime.strptime(expiration, '%Y-%m-%d')
-                                    },
-                                    'ID': folder_path,
-                                    'Filter': {
-                                        'Prefix': folder_path + "/"
-                                    },
-                                    'Status': 'Disabled'
-                                }
-                            ]
-                        }
-                    )
-                table.update_item(
-                    Key={'id': archive_id},
-                    UpdateExpression="SET delete_data= :s",
-                    ExpressionAttributeValues={':s': False},
-                    ReturnValues="UPDATED_NEW"
-                )
+            ensure_expiration_rule(client, bucket_name, expiration_date, archive_id)
+            tag_date = expiration_date
+        else:
+            tag_date = ""
+
+        start_tag_run(table, archive_id, "expiration_job", EXPIRATION_TAG_KEY, tag_date,
+                      extra_updates={"delete_data": delete_data is True})
 
         if expiration_status == "Enabled":
 
@@ -179,6 +137,9 @@ def lambda_handler(event, context):
         response = {"expiration_status": expiration_status}
         return build_response(200, json.dumps(response))
 
+    except LifecycleRuleLimitError as ex:
+        logger.error(str(ex))
+        return build_response(409, json.dumps({"error": str(ex)}))
     except Exception:
         logger.error(traceback.format_exc())
         return build_response(500, "Server Error")
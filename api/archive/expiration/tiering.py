@@ -0,0 +1,162 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import json
+import boto3
+import logging
+import os
+import traceback
+from datetime import datetime, timezone
+
+from archive_objects import start_tag_run
+from lifecycle import ensure_storage_tier_rule, STORAGE_TIER_TAG_KEY
+
+REGION = os.getenv("REGION")
+
+# Storage classes from warmest to coldest. Lifecycle transitions only move objects down
+# this list, so an archive never moves back to a warmer tier.
+STORAGE_TIERS = ["STANDARD", "INTELLIGENT_TIERING", "GLACIER_IR", "DEEP_ARCHIVE"]
+
+# Days without a query after which an archive moves to the tier; 0 disables the tier
+TIER_AFTER_DAYS = {
+    "INTELLIGENT_TIERING": int(os.getenv("INTELLIGENT_TIERING_AFTER_DAYS", "30")),
+    "GLACIER_IR": int(os.getenv("GLACIER_IR_AFTER_DAYS", "180")),
+    "DEEP_ARCHIVE": int(os.getenv("DEEP_ARCHIVE_AFTER_DAYS", "730")),
+}
+
+# region Logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
+    # `.basicConfig` does not execute. Thus we set the level directly.
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+
+# endregion
+
+ssm = boto3.client('ssm')
+client = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+
+
+def parse_timestamp(value):
+    """
+    Parses the timestamps stored on archives; naive values are taken as UTC.
+    """
+
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def target_tier(idle_days):
+    """
+    Returns the coldest enabled storage tier whose threshold the idle time has reached.
+    """
+
+    tier = "STANDARD"
+    for storage_class in STORAGE_TIERS[1:]:
+        after_days = TIER_AFTER_DAYS[storage_class]
+        if after_days and idle_days >= after_days:
+            tier = storage_class
+    return tier
+
+
+def apply_tier(table, bucket_name, archive_id, storage_class):
+    """
+    Moves the archive to storage_class by making sure the shared transition rule exists and
+    tagging the archive's objects in the background.
+    """
+
+    ensure_storage_tier_rule(client, bucket_name, storage_class)
+    start_tag_run(
+        table, archive_id, "tiering_job", STORAGE_TIER_TAG_KEY, storage_class,
+        extra_updates={
+            "storage_tier": {
+                "current": storage_class,
+                "since": datetime.now(timezone.utc).isoformat()
+            }
+        }
+    )
+    logger.info(f"Moving archive {archive_id} to {storage_class}")
+
+
+def lambda_handler(event, context):
+    """
+    Moves archives that have not been queried for a while to colder storage classes.
+
+    Runs on a schedule. The idle time of an archive is measured from its last query, or from
+    its submission if it was never queried. Invoke with {"archive_id": ..., "storage_tier": ...}
+    to move a single archive right away.
+
+    :param event: A scheduled event, or a single archive and storage class.
+    :type event: dict
+    :param context: A dictionary with information about the Lambda execution environment.
+    :type context: dict
+    :return: The archives that were moved, by archive ID.
+    :rtype: dict
+    """
+
+    bucket_parameter = ssm.get_parameter(
+        Name='/job/s3-bucket-table-data', WithDecryption=True)
+    bucket_name = bucket_parameter['Parameter']['Value']
+
+    parameter = ssm.get_parameter(
+        Name='/archive/dynamodb-table', WithDecryption=True)
+    table = dynamodb.Table(parameter['Parameter']['Value'])
+
+    if event.get("archive_id"):
+        if event["storage_tier"] not in STORAGE_TIERS[1:]:
+            raise ValueError(f'Unsupported storage tier {event["storage_tier"]}')
+        apply_tier(table, bucket_name, event["archive_id"], event["storage_tier"])
+        return {"moved": {event["archive_id"]: event["storage_tier"]}}
+
+    now = datetime.now(timezone.utc)
+    moved = {}
+    scan_args = {
+        'ProjectionExpression': "id, archive_status, time_submitted, last_queried, storage_tier"
+    }
+    while True:
+        response = table.scan(**scan_args)
+        for archive in response["Items"]:
+            if archive.get("archive_status") != "Archived":
+                continue
+
+            last_used = parse_timestamp(archive.get("last_queried")) or parse_timestamp(archive.get("time_submitted"))
+            if last_used is None:
+                continue
+
+            current = archive.get("storage_tier", {}).get("current", "STANDARD")
+            target = target_tier((now - last_used).days)
+            if STORAGE_TIERS.index(target) <= STORAGE_TIERS.index(current):
+                continue
+
+            try:
+                apply_tier(table, bucket_name, archive["id"], target)
+                moved[archive["id"]] = target
+            except Exception:
+                logger.error(traceback.format_exc())
+
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    logger.info(json.dumps({"moved": moved}))
+    return {"moved": moved}
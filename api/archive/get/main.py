@@ -19,6 +19,7 @@ import logging
 import os
 import traceback
 
+from boto3.dynamodb.conditions import Key
 from decimal import Decimal
 
 
@@ -69,6 +70,32 @@ def build_response(http_code, body):
     }
 
 
+def get_archive_details(details_table, archive_id):
+    # Query every child item (tables and jobs) of the archive
+    items = []
+    query_args = {
+        "KeyConditionExpression": Key("archive_id").eq(archive_id)
+    }
+    while True:
+        response = details_table.query(**query_args)
+        items.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            break
+        query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    table_details = []
+    jobs = {}
+    for item in items:
+        item_type, item_name = item["item_key"].split("#", 1)
+        if item_type == "table":
+            table_details.append(item)
+        elif item_type == "job":
+            jobs[item_name] = item
+
+    table_details.sort(key=lambda item: item.get("position", 0))
+    return table_details, jobs
+
+
 def lambda_handler(event, context):
     logger.info(mask_sensitive_data(event))
 
@@ -85,6 +112,16 @@ def lambda_handler(event, context):
         table = dynamodb_client.Table(parameter['Parameter']['Value'])
         dynamodb_response = table.get_item(Key={"id": archive_id})
 
+        # Assemble the archive with its per-table and per-job child items
+        if "Item" in dynamodb_response:
+            details_parameter = ssm.get_parameter(
+                Name='/archive/details-dynamodb-table', WithDecryption=True)
+            details_table = dynamodb_client.Table(
+                details_parameter['Parameter']['Value'])
+            table_details, jobs = get_archive_details(details_table, archive_id)
+            dynamodb_response["Item"]["table_details"] = table_details
+            dynamodb_response["Item"]["jobs"] = jobs
+
         return build_response(200, json.dumps(dynamodb_response, cls=DecimalEncoder))
     except Exception as ex:
         logger.error(traceback.format_exc())
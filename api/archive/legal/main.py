@@ -18,11 +18,13 @@ import json
 import logging
 import os
 import traceback
+import uuid
+from datetime import datetime, timezone
 
 REGION = os.getenv("REGION")
+BACKGROUND_FUNCTION = os.getenv("BACKGROUND_FUNCTION")
 
-s3 = boto3.resource('s3')
-s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 ssm = boto3.client('ssm')
 
@@ -76,47 +78,86 @@ def lambda_handler(event, context):
             event["body"]) if "body" in event else json.loads(event)
         archive_id = body["archive_id"]
         legal_hold = body["legal_hold"]
+        resume = body.get("resume", False)
 
-        bucket_parameter = ssm.get_parameter(
-            Name='/job/s3-bucket-table-data', WithDecryption=True)
-
-        bucket_name = bucket_parameter['Parameter']['Value']
+        if legal_hold not in ('ON', 'OFF'):
+            return build_response(400, json.dumps({"error": "legal_hold must be ON or OFF"}))
 
         parameter = ssm.get_parameter(
             Name='/archive/dynamodb-table', WithDecryption=True)
         table = dynamodb.Table(parameter['Parameter']['Value'])
-        
-        bucket = s3.Bucket(bucket_name)
 
+        # Objects are updated by a background function; the API only records the run
+        # and returns so that large archives are not bound by the API timeout.
+        run_id = str(uuid.uuid4())
         try:
-            for object_summary in bucket.objects.filter(Prefix=archive_id):
-                s3_client.put_object_legal_hold(
-                    Bucket=bucket_name,
-                    Key=object_summary.key,
-                    LegalHold={
-                        'Status': legal_hold
-                    },
-                )
-            
-            if legal_hold == 'ON':                
+            if resume:
+                job = table.get_item(
+                    Key={'id': archive_id},
+                    ProjectionExpression="legal_hold_job",
+                    ConsistentRead=True
+                ).get("Item", {}).get("legal_hold_job")
+                if not job or job.get("target") != legal_hold:
+                    return build_response(404, json.dumps({"error": "No matching archive or legal hold run to resume"}))
+
+                # The failures of the previous run are retried, so this run counts its own
+                update_expression = "SET legal_hold_job.run_id = :r, legal_hold_job.#status = :s, " \
+                                    "legal_hold_job.objects_failed = :zero"
+                expression_values = {':r': run_id, ':s': 'InProgress', ':zero': 0,
+                                     ':t': legal_hold, ':previous': job["run_id"]}
+                if job.get("failed_keys_truncated"):
+                    # More objects failed than were kept: walk the whole archive again
+                    update_expression += ", legal_hold_job.objects_processed = :zero " \
+                                         "REMOVE legal_hold_job.continuation_token, legal_hold_job.listing_complete, " \
+                                         "legal_hold_job.failed_keys, legal_hold_job.failed_keys_truncated, " \
+                                         "legal_hold_job.retry_keys"
+                else:
+                    # Keep the checkpointed continuation token and retry the keys that failed
+                    update_expression += ", legal_hold_job.retry_keys = :k REMOVE legal_hold_job.failed_keys"
+                    expression_values[':k'] = job.get("retry_keys", []) + job.get("failed_keys", [])
+
                 table.update_item(
                     Key={'id': archive_id},
-                    UpdateExpression="SET legal_hold= :s",
-                    ExpressionAttributeValues={':s': True},
-                    ReturnValues="UPDATED_NEW"
+                    UpdateExpression=update_expression,
+                    ConditionExpression="legal_hold_job.target = :t AND legal_hold_job.run_id = :previous",
+                    ExpressionAttributeNames={'#status': 'status'},
+                    ExpressionAttributeValues=expression_values
                 )
-            elif legal_hold == 'OFF':
+            else:
                 table.update_item(
                     Key={'id': archive_id},
-                    UpdateExpression="SET legal_hold= :s",
-                    ExpressionAttributeValues={':s': False},
-                    ReturnValues="UPDATED_NEW"
+                    UpdateExpression="SET legal_hold_job = :j",
+                    ConditionExpression="attribute_exists(id)",
+                    ExpressionAttributeValues={
+                        ':j': {
+                            "run_id": run_id,
+                            "target": legal_hold,
+                            "status": "InProgress",
+                            "objects_processed": 0,
+                            "objects_failed": 0,
+                            "started_at": datetime.now(timezone.utc).isoformat()
+                        }
+                    }
                 )
-        except Exception as ex:
-            logger.error(traceback.format_exc())
-            return build_response(500, "Server Error")
-
-        response = {"legal_hold": legal_hold}
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return build_response(404, json.dumps({"error": "No matching archive or legal hold run to resume"}))
+
+        # Objects are walked by the shared archive-objects function, like tagging and restores
+        lambda_client.invoke(
+            FunctionName=BACKGROUND_FUNCTION,
+            InvocationType="Event",  # Asynchronous invocation
+            Payload=json.dumps({
+                "archive_id": archive_id,
+                "run_id": run_id,
+                "job": "legal_hold_job",
+                "operation": "legal_hold",
+                "legal_hold": legal_hold,
+                # Recorded on the archive once every object has the hold status
+                "completed_updates": {"legal_hold": legal_hold == 'ON'}
+            })
+        )
+
+        response = {"legal_hold": legal_hold, "run_id": run_id, "status": "InProgress"}
         return build_response(200, json.dumps(response))
     except Exception as ex:
         logger.error(traceback.format_exc())
@@ -18,7 +18,12 @@ import json
 import logging
 import os
 import traceback
+import uuid
 import re
+from datetime import datetime, timedelta, timezone
+
+from materialized_views import route_materialized_views
+from scan_limits import preflight, record_scan
 
 # region Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -33,6 +38,14 @@ else:
 athena = boto3.client('athena')
 ssm = boto3.client('ssm')
 dynamodb = boto3.client('dynamodb')
+s3 = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+
+BACKGROUND_FUNCTION = os.getenv("BACKGROUND_FUNCTION")
+RESTORE_DAYS = int(os.getenv("RESTORE_DAYS", "7"))
+RESTORE_TIER = os.getenv("RESTORE_TIER", "Standard")
+# Storage classes whose objects have to be restored before Athena can read them
+RESTORE_STORAGE_CLASSES = ("GLACIER", "DEEP_ARCHIVE")
 
 def mask_sensitive_data(event):
     keys_to_redact = ["authorization"]
@@ -124,6 +137,129 @@ def transform_table_names(sql_statement, archive_id, database_name, table_detail
 
     return transformed_sql
 
+def get_archive_tables(details_table_name, archive_id):
+    """
+    Returns the tables of an archive from the per-table items of the archive details table.
+
+    Args:
+        details_table_name: Name of the archive details DynamoDB table
+        archive_id: The archive ID
+
+    Returns:
+        List of dicts with the table name and the bytes its last run archived (None if the run
+        did not record them), in the order the tables were archived
+    """
+    tables = []
+    query_args = {
+        'TableName': details_table_name,
+        'KeyConditionExpression': 'archive_id = :a AND begins_with(item_key, :t)',
+        'ExpressionAttributeValues': {':a': {'S': archive_id}, ':t': {'S': 'table#'}},
+        'ProjectionExpression': '#table, #position, bytes_archived',
+        'ExpressionAttributeNames': {'#table': 'table', '#position': 'position'}
+    }
+    while True:
+        response = dynamodb.query(**query_args)
+        tables.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    tables.sort(key=lambda item: int(item.get('position', {}).get('N', '0')))
+    return [
+        {'table': item['table']['S'], 'bytes_archived': int(item['bytes_archived']['N']) if 'bytes_archived' in item else None}
+        for item in tables if item.get('table', {}).get('S')
+    ]
+
+
+def record_query(archives_table_name, archive_id):
+    """
+    Stores the time of the archive's last query, which storage tiering uses to find cold archives.
+    """
+    dynamodb.update_item(
+        TableName=archives_table_name,
+        Key={'id': {'S': archive_id}},
+        UpdateExpression='SET last_queried = :t',
+        ExpressionAttributeValues={':t': {'S': datetime.now(timezone.utc).isoformat()}}
+    )
+
+
+def restore_ready(bucket_name, archive_id):
+    """
+    Checks a sample object of the archive to see whether its restore has finished.
+    """
+    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=f'{archive_id}/', MaxKeys=1)
+    for item in response.get('Contents', []):
+        if item.get('StorageClass') not in RESTORE_STORAGE_CLASSES:
+            return True
+        head = s3.head_object(Bucket=bucket_name, Key=item['Key'])
+        return 'ongoing-request="false"' in head.get('Restore', '')
+    return True
+
+
+def ensure_restored(archives_table_name, archive_id, archive_item):
+    """
+    Makes sure an archive in a cold storage class can be read by Athena.
+
+    Starts an asynchronous restore of the archive's objects if none is active.
+
+    Returns:
+        None if the archive can be queried, otherwise the restore status to return to the caller
+    """
+    storage_tier = archive_item.get('storage_tier', {}).get('M', {})
+    if storage_tier.get('current', {}).get('S', 'STANDARD') not in RESTORE_STORAGE_CLASSES:
+        return None
+
+    now = datetime.now(timezone.utc)
+    restore_job = archive_item.get('restore_job', {}).get('M', {})
+    restored_until = restore_job.get('restored_until', {}).get('S')
+    if restored_until and datetime.fromisoformat(restored_until) > now + timedelta(days=1):
+        bucket_parameter = ssm.get_parameter(
+            Name='/job/s3-bucket-table-data', WithDecryption=True)
+        if restore_ready(bucket_parameter['Parameter']['Value'], archive_id):
+            return None
+        return {"status": "Restoring", "restored_until": restored_until,
+                "message": "The archive is being restored from cold storage, retry the query later"}
+
+    run_id = str(uuid.uuid4())
+    restored_until = (now + timedelta(days=RESTORE_DAYS)).isoformat()
+    try:
+        dynamodb.update_item(
+            TableName=archives_table_name,
+            Key={'id': {'S': archive_id}},
+            UpdateExpression='SET restore_job = :j',
+            ConditionExpression='attribute_not_exists(restore_job) OR restore_job.restored_until < :n',
+            ExpressionAttributeValues={
+                ':j': {'M': {
+                    'run_id': {'S': run_id},
+                    'status': {'S': 'InProgress'},
+                    'objects_processed': {'N': '0'},
+                    'objects_failed': {'N': '0'},
+                    'started_at': {'S': now.isoformat()},
+                    'restored_until': {'S': restored_until}
+                }},
+                ':n': {'S': (now + timedelta(days=1)).isoformat()}
+            }
+        )
+        lambda_client.invoke(
+            FunctionName=BACKGROUND_FUNCTION,
+            InvocationType="Event",  # Asynchronous invocation
+            Payload=json.dumps({
+                "archive_id": archive_id,
+                "run_id": run_id,
+                "job": "restore_job",
+                "operation": "restore",
+                "restore_days": RESTORE_DAYS,
+                "restore_tier": RESTORE_TIER
+            })
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        # Another request started the restore first
+        pass
+
+    return {"status": "Restoring", "restored_until": restored_until,
+            "message": "The archive is being restored from cold storage, retry the query later"}
+
+
 def lambda_handler(event, context):
     logger.info(mask_sensitive_data(event))
 
@@ -153,14 +289,19 @@ def lambda_handler(event, context):
         archive_item = archive_response['Item']
         database_name = archive_item.get('database', {}).get('S', '')
 
-        # Parse table_details from DynamoDB format
-        table_details = []
-        if 'table_details' in archive_item and 'L' in archive_item['table_details']:
-            for table_item in archive_item['table_details']['L']:
-                if 'M' in table_item and 'table' in table_item['M']:
-                    table_name = table_item['M']['table'].get('S', '')
-                    if table_name:
-                        table_details.append({'table': table_name})
+        # Cold archives are restored asynchronously before they can be queried; result
+        # pages of a query that already ran skip the check
+        if not query_execution_id:
+            restore_status = ensure_restored(archives_table_name, archive_id, archive_item)
+            if restore_status:
+                return build_response(202, json.dumps(restore_status))
+            record_query(archives_table_name, archive_id)
+
+        # Table names are stored as child items of the archive
+        details_table_param = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        table_details = get_archive_tables(
+            details_table_param['Parameter']['Value'], archive_id)
 
         glue_database_name = f'{archive_id}-{database_name}-database'
 
@@ -183,7 +324,7 @@ def lambda_handler(event, context):
                 # Filter for views only
                 for table in glue_response.get('TableList', []):
                     if table.get('TableType') == 'VIRTUAL_VIEW':
-                        views.append({'name': table.get('Name', '')})
+                        views.append({'name': table.get('Name', ''), 'text': table.get('ViewOriginalText', '')})
 
                 views_next_token = glue_response.get('NextToken')
                 if not views_next_token:
@@ -196,10 +337,26 @@ def lambda_handler(event, context):
         # If query_execution_id is provided, skip execution and fetch results
         # This is for pagination - reusing the same query execution
         if not query_execution_id:
+            # Queries that would scan more than the archive's or the user's limit are refused
+            # before they reach the shared workgroup
+            scan_estimate = preflight(
+                event, archive_id, archive_item, database_name, table_details, sql_statement)
+            if not scan_estimate["allowed"]:
+                return build_response(400, json.dumps({
+                    "error": "Query exceeds scan limit",
+                    "message": scan_estimate["reason"],
+                    "estimate": scan_estimate
+                }))
+
+            # Views with a fresh materialization are read from its table
+            routed_sql = route_materialized_views(
+                sql_statement, archive_id, database_name, archive_item,
+                details_table_param['Parameter']['Value'], views)
+
             # Transform table names in SQL before execution
             # Views are passed so they won't be transformed
             transformed_sql = transform_table_names(
-                sql_statement,
+                routed_sql,
                 archive_id,
                 database_name,
                 table_details,
@@ -241,6 +398,7 @@ def lambda_handler(event, context):
                         "error": "Query execution was cancelled"
                     }))
                 elif status == "SUCCEEDED":
+                    record_scan(event, query_state_response["QueryExecution"])
                     break
 
         # Get query results with pagination support
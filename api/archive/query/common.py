@@ -0,0 +1,94 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import logging
+import os
+
+import boto3
+
+# region Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
+    # `.basicConfig` does not execute. Thus we set the level directly.
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+# endregion
+
+ssm = boto3.client('ssm')
+dynamodb = boto3.client('dynamodb')
+
+
+def mask_sensitive_data(event):
+    # remove sensitive data from request object before logging
+    keys_to_redact = ["authorization"]
+    result = {}
+    for k, v in event.items():
+        if isinstance(v, dict):
+            result[k] = mask_sensitive_data(v)
+        elif k in keys_to_redact:
+            result[k] = "<redacted>"
+        else:
+            result[k] = v
+    return result
+
+
+def build_response(http_code, body):
+    return {
+        "headers": {
+            # tell cloudfront and api gateway not to cache the response
+            "Cache-Control": "no-cache, no-store",
+            "Content-Type": "application/json",
+        },
+        "statusCode": http_code,
+        "body": body,
+    }
+
+
+def get_archive_tables(details_table_name, archive_id):
+    """
+    Returns the tables of an archive from the per-table items of the archive details table.
+
+    Args:
+        details_table_name: Name of the archive details DynamoDB table
+        archive_id: The archive ID
+
+    Returns:
+        List of dicts with the table name and the bytes its last run archived (None if the run
+        did not record them), in the order the tables were archived
+    """
+    tables = []
+    query_args = {
+        'TableName': details_table_name,
+        'KeyConditionExpression': 'archive_id = :a AND begins_with(item_key, :t)',
+        'ExpressionAttributeValues': {':a': {'S': archive_id}, ':t': {'S': 'table#'}},
+        'ProjectionExpression': '#table, #position, bytes_archived',
+        'ExpressionAttributeNames': {'#table': 'table', '#position': 'position'}
+    }
+    while True:
+        response = dynamodb.query(**query_args)
+        tables.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    tables.sort(key=lambda item: int(item.get('position', {}).get('N', '0')))
+    return [
+        {'table': item['table']['S'], 'bytes_archived': int(item['bytes_archived']['N']) if 'bytes_archived' in item else None}
+        for item in tables if item.get('table', {}).get('S')
+    ]
@@ -15,28 +15,27 @@ permissions and limitations under the License.
 
 import boto3
 import json
-import logging
 import os
 import re
 import traceback
+import uuid
 
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
-# region Logging
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-logger = logging.getLogger()
-
-if logger.hasHandlers():
-    # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
-    # `.basicConfig` does not execute. Thus we set the level directly.
-    logger.setLevel(LOG_LEVEL)
-else:
-    logging.basicConfig(level=LOG_LEVEL)
-# endregion
+from common import build_response, dynamodb, get_archive_tables, logger, mask_sensitive_data, ssm
+from materialized_views import route_materialized_views
+from scan_limits import preflight, record_scan
 
 client = boto3.client('athena')
-ssm = boto3.client('ssm')
-dynamodb = boto3.client('dynamodb')
+s3 = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+
+BACKGROUND_FUNCTION = os.getenv("BACKGROUND_FUNCTION")
+RESTORE_DAYS = int(os.getenv("RESTORE_DAYS", "7"))
+RESTORE_TIER = os.getenv("RESTORE_TIER", "Standard")
+# Storage classes whose objects have to be restored before Athena can read them
+RESTORE_STORAGE_CLASSES = ("GLACIER", "DEEP_ARCHIVE")
 
 def transform_table_names(sql_statement, archive_id, database_name, table_details, views=None):
     """
@@ -106,30 +105,93 @@ def transform_table_names(sql_statement, archive_id, database_name, table_detail
 
     return transformed_sql
 
-def mask_sensitive_data(event):
-    # remove sensitive data from request object before logging
-    keys_to_redact = ["authorization"]
-    result = {}
-    for k, v in event.items():
-        if isinstance(v, dict):
-            result[k] = mask_sensitive_data(v)
-        elif k in keys_to_redact:
-            result[k] = "<redacted>"
-        else:
-            result[k] = v
-    return result
-
-
-def build_response(http_code, body):
-    return {
-        "headers": {
-            # tell cloudfront and api gateway not to cache the response
-            "Cache-Control": "no-cache, no-store",
-            "Content-Type": "application/json",
-        },
-        "statusCode": http_code,
-        "body": body,
-    }
+def record_query(archives_table_name, archive_id):
+    """
+    Stores the time of the archive's last query, which storage tiering uses to find cold archives.
+    """
+    dynamodb.update_item(
+        TableName=archives_table_name,
+        Key={'id': {'S': archive_id}},
+        UpdateExpression='SET last_queried = :t',
+        ExpressionAttributeValues={':t': {'S': datetime.now(timezone.utc).isoformat()}}
+    )
+
+
+def restore_ready(bucket_name, archive_id):
+    """
+    Checks a sample object of the archive to see whether its restore has finished.
+    """
+    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=f'{archive_id}/', MaxKeys=1)
+    for item in response.get('Contents', []):
+        if item.get('StorageClass') not in RESTORE_STORAGE_CLASSES:
+            return True
+        head = s3.head_object(Bucket=bucket_name, Key=item['Key'])
+        return 'ongoing-request="false"' in head.get('Restore', '')
+    return True
+
+
+def ensure_restored(archives_table_name, archive_id, archive_item):
+    """
+    Makes sure an archive in a cold storage class can be read by Athena.
+
+    Starts an asynchronous restore of the archive's objects if none is active.
+
+    Returns:
+        None if the archive can be queried, otherwise the restore status to return to the caller
+    """
+    storage_tier = archive_item.get('storage_tier', {}).get('M', {})
+    if storage_tier.get('current', {}).get('S', 'STANDARD') not in RESTORE_STORAGE_CLASSES:
+        return None
+
+    now = datetime.now(timezone.utc)
+    restore_job = archive_item.get('restore_job', {}).get('M', {})
+    restored_until = restore_job.get('restored_until', {}).get('S')
+    if restored_until and datetime.fromisoformat(restored_until) > now + timedelta(days=1):
+        bucket_parameter = ssm.get_parameter(
+            Name='/job/s3-bucket-table-data', WithDecryption=True)
+        if restore_ready(bucket_parameter['Parameter']['Value'], archive_id):
+            return None
+        return {"status": "Restoring", "restored_until": restored_until,
+                "message": "The archive is being restored from cold storage, retry the query later"}
+
+    run_id = str(uuid.uuid4())
+    restored_until = (now + timedelta(days=RESTORE_DAYS)).isoformat()
+    try:
+        dynamodb.update_item(
+            TableName=archives_table_name,
+            Key={'id': {'S': archive_id}},
+            UpdateExpression='SET restore_job = :j',
+            ConditionExpression='attribute_not_exists(restore_job) OR restore_job.restored_until < :n',
+            ExpressionAttributeValues={
+                ':j': {'M': {
+                    'run_id': {'S': run_id},
+                    'status': {'S': 'InProgress'},
+                    'objects_processed': {'N': '0'},
+                    'objects_failed': {'N': '0'},
+                    'started_at': {'S': now.isoformat()},
+                    'restored_until': {'S': restored_until}
+                }},
+                ':n': {'S': (now + timedelta(days=1)).isoformat()}
+            }
+        )
+        lambda_client.invoke(
+            FunctionName=BACKGROUND_FUNCTION,
+            InvocationType="Event",  # Asynchronous invocation
+            Payload=json.dumps({
+                "archive_id": archive_id,
+                "run_id": run_id,
+                "job": "restore_job",
+                "operation": "restore",
+                "restore_days": RESTORE_DAYS,
+                "restore_tier": RESTORE_TIER
+            })
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        # Another request started the restore first
+        pass
+
+    return {"status": "Restoring", "restored_until": restored_until,
+            "message": "The archive is being restored from cold storage, retry the query later"}
 
 
 def lambda_handler(event, context):
@@ -168,14 +230,17 @@ def lambda_handler(event, context):
         archive_item = archive_response['Item']
         database_name = archive_item.get('database', {}).get('S', 'bikestores')
 
-        # Parse table_details from DynamoDB format
-        table_details = []
-        if 'table_details' in archive_item and 'L' in archive_item['table_details']:
-            for table_item in archive_item['table_details']['L']:
-                if 'M' in table_item and 'table' in table_item['M']:
-                    table_name = table_item['M']['table'].get('S', '')
-                    if table_name:
-                        table_details.append({'table': table_name})
+        # Cold archives are restored asynchronously before they can be queried
+        restore_status = ensure_restored(archives_table_name, archive_id, archive_item)
+        if restore_status:
+            return build_response(202, json.dumps(restore_status))
+        record_query(archives_table_name, archive_id)
+
+        # Table names are stored as child items of the archive
+        details_table_param = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        table_details = get_archive_tables(
+            details_table_param['Parameter']['Value'], archive_id)
 
         # Database name is constructed from archive_id and database name
         database = f'{archive_id}-{database_name}-database'
@@ -199,7 +264,7 @@ def lambda_handler(event, context):
                 # Filter for views only
                 for table in glue_response.get('TableList', []):
                     if table.get('TableType') == 'VIRTUAL_VIEW':
-                        views.append({'name': table.get('Name', '')})
+                        views.append({'name': table.get('Name', ''), 'text': table.get('ViewOriginalText', '')})
 
                 next_token = glue_response.get('NextToken')
                 if not next_token:
@@ -209,10 +274,26 @@ def lambda_handler(event, context):
         except Exception as view_error:
             logger.warning(f"Failed to fetch views, continuing without them: {str(view_error)}")
 
+        # Queries that would scan more than the archive's or the user's limit are refused
+        # before they reach the shared workgroup
+        scan_estimate = preflight(
+            event, archive_id, archive_item, database_name, table_details, sql_statement)
+        if not scan_estimate["allowed"]:
+            return build_response(400, json.dumps({
+                "error": "Query exceeds scan limit",
+                "message": scan_estimate["reason"],
+                "estimate": scan_estimate
+            }))
+
+        # Views with a fresh materialization are read from its table
+        routed_sql = route_materialized_views(
+            sql_statement, archive_id, database_name, archive_item,
+            details_table_param['Parameter']['Value'], views)
+
         # Transform table names in SQL before execution
         # Views are passed so they won't be transformed
         transformed_sql = transform_table_names(
-            sql_statement,
+            routed_sql,
             archive_id,
             database_name,
             table_details,
@@ -240,6 +321,7 @@ def lambda_handler(event, context):
                 return build_response(500, "Server Error")
 
             if query_state_response["QueryExecution"]["Status"]["State"] == "SUCCEEDED":
+                record_scan(event, query_state_response["QueryExecution"])
                 query_state_running = False
                 break
 
@@ -0,0 +1,70 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import json
+import traceback
+
+from common import build_response, dynamodb, get_archive_tables, logger, mask_sensitive_data, ssm
+from scan_limits import preflight
+
+
+def lambda_handler(event, context):
+    """
+    Estimates the bytes a query would scan without running it.
+
+    The estimate covers every archived table the query references, with the partitions and
+    columns it reads, and says whether the query fits in the archive's limit per query and the
+    user's daily limit, with suggestions to make it cheaper. The query APIs refuse queries that
+    do not fit.
+    """
+
+    logger.info(mask_sensitive_data(event))
+
+    try:
+        body = json.loads(event["body"]) if "body" in event else json.loads(event)
+        sql_statement = body["sql_statement"]
+        archive_id = body["archive_id"]
+
+        archives_table_param = ssm.get_parameter(
+            Name='/archive/dynamodb-table', WithDecryption=True)
+        archive_response = dynamodb.get_item(
+            TableName=archives_table_param['Parameter']['Value'],
+            Key={'id': {'S': archive_id}}
+        )
+
+        if 'Item' not in archive_response:
+            return build_response(404, json.dumps({
+                "error": "Archive not found",
+                "message": f"Archive with id {archive_id} does not exist"
+            }))
+
+        archive_item = archive_response['Item']
+        database_name = archive_item.get('database', {}).get('S', '')
+
+        details_table_param = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        table_details = get_archive_tables(
+            details_table_param['Parameter']['Value'], archive_id)
+
+        scan_estimate = preflight(
+            event, archive_id, archive_item, database_name, table_details, sql_statement)
+        return build_response(200, json.dumps(scan_estimate))
+
+    except Exception as ex:
+        logger.error(traceback.format_exc())
+        return build_response(500, json.dumps({
+            "error": "Internal server error",
+            "message": str(ex)
+        }))
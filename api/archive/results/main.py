@@ -0,0 +1,281 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  https://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import boto3
+import csv
+import json
+import logging
+import os
+import traceback
+from decimal import Decimal
+
+# region Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+# endregion
+
+s3 = boto3.client('s3')
+athena = boto3.client('athena')
+
+# The row index keeps the byte offset of every INDEX_INTERVAL-th row of a result file
+INDEX_INTERVAL = int(os.getenv("INDEX_INTERVAL", "10000"))
+INDEX_SUFFIX = ".sdas-index.json"
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+READ_CHUNK_BYTES = 1024 * 1024
+# Time kept back from the function timeout to store a partly built index and respond
+INDEXING_BUFFER_MS = 5000
+INTEGER_TYPES = ("tinyint", "smallint", "integer", "bigint")
+NUMBER_TYPES = ("float", "real", "double", "decimal")
+
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+def mask_sensitive_data(event):
+    keys_to_redact = ["authorization"]
+    result = {}
+    for k, v in event.items():
+        if isinstance(v, dict):
+            result[k] = mask_sensitive_data(v)
+        elif k in keys_to_redact:
+            result[k] = "<redacted>"
+        else:
+            result[k] = v
+    return result
+
+def build_response(http_code, body):
+    return {
+        "headers": {
+            "Cache-Control": "no-cache, no-store",
+            "Content-Type": "application/json",
+        },
+        "statusCode": http_code,
+        "body": body,
+    }
+
+
+def iter_records(stream, offset):
+    """
+    Yields the byte offset and bytes of each CSV record of a stream that starts at a record
+    boundary. A record ends at a newline outside quotes; Athena quotes every value and escapes
+    quotes by doubling them, so a record is complete when it holds an even number of quotes.
+    """
+
+    buffer = b""
+    record = b""
+    for chunk in stream.iter_chunks(chunk_size=READ_CHUNK_BYTES):
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            record += line + b"\n"
+            if record.count(b'"') % 2 == 0:
+                yield offset, record
+                offset += len(record)
+                record = b""
+    record += buffer
+    if record:
+        yield offset, record
+
+
+def parse_record(record):
+    return next(csv.reader([record.decode("utf-8").rstrip("\r\n")]))
+
+
+def parse_value(value, column_type):
+    # Athena writes NULL as an empty value
+    if value == "" and column_type != "varchar":
+        return None
+    if column_type in INTEGER_TYPES:
+        return int(value)
+    if column_type in NUMBER_TYPES:
+        return Decimal(value)
+    if column_type == "boolean":
+        return value == "true"
+    return value
+
+
+def get_index(bucket_name, object_key, query_execution_id):
+    """
+    Returns the sparse row index of a result file, or a new index holding the columns of the
+    result and the offset of its first row after the header.
+    """
+
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=object_key + INDEX_SUFFIX)
+        return json.loads(response["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        pass
+
+    metadata = athena.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+    column_info = metadata["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+
+    header = s3.get_object(Bucket=bucket_name, Key=object_key)["Body"]
+    _, header_record = next(iter_records(header, 0), (0, b""))
+    header.close()
+    return {
+        "columns": [column["Name"] for column in column_info],
+        "types": [column["Type"].lower() for column in column_info],
+        "interval": INDEX_INTERVAL,
+        "offsets": [],
+        "rows_indexed": 0,
+        "end_offset": len(header_record),
+        "complete": False,
+    }
+
+
+def extend_index(bucket_name, object_key, index, row, context):
+    """
+    Scans the result file from the end of the index until the index covers row, the file ends or
+    the function runs out of time, and stores the index next to the file.
+
+    Returns:
+    bool: True if the index covers row or the whole file.
+    """
+
+    if index["complete"] or index["rows_indexed"] > row:
+        return True
+
+    stream = s3.get_object(
+        Bucket=bucket_name, Key=object_key, Range=f'bytes={index["end_offset"]}-')["Body"]
+    covered = False
+    try:
+        for offset, record in iter_records(stream, index["end_offset"]):
+            if index["rows_indexed"] % index["interval"] == 0:
+                index["offsets"].append(offset)
+                # Stop at an interval boundary so a later scan continues from here
+                if index["rows_indexed"] > row \
+                        or context.get_remaining_time_in_millis() < INDEXING_BUFFER_MS:
+                    index["offsets"].pop()
+                    covered = index["rows_indexed"] > row
+                    break
+            index["rows_indexed"] += 1
+            index["end_offset"] = offset + len(record)
+        else:
+            index["complete"] = True
+            index["total_rows"] = index["rows_indexed"]
+            covered = True
+    finally:
+        stream.close()
+
+    s3.put_object(Bucket=bucket_name, Key=object_key + INDEX_SUFFIX, Body=json.dumps(index).encode("utf-8"))
+    return covered
+
+
+def read_page(bucket_name, object_key, index, row, page_size):
+    """
+    Reads page_size rows from row on, seeking to the nearest indexed row before it with a
+    byte-range request.
+
+    Returns:
+    list: The rows, each a list of values.
+    """
+
+    anchor = min(row // index["interval"], len(index["offsets"]) - 1)
+    stream = s3.get_object(
+        Bucket=bucket_name, Key=object_key, Range=f'bytes={index["offsets"][anchor]}-')["Body"]
+    rows = []
+    try:
+        skip = row - anchor * index["interval"]
+        for _, record in iter_records(stream, index["offsets"][anchor]):
+            if skip:
+                skip -= 1
+                continue
+            rows.append(parse_record(record))
+            if len(rows) == page_size:
+                break
+    finally:
+        stream.close()
+    return rows
+
+
+def lambda_handler(event, context):
+    """
+    Returns a page of a query's results, read from Athena's result file in S3.
+
+    The page starts at any row offset. The first read of a result builds a sparse index of the
+    byte offset of every INDEX_INTERVAL-th row, stored next to the result file, so later pages
+    are read with one byte-range request from the nearest indexed row. The values are returned
+    by column, converted to the column types. If the index cannot reach the offset before the
+    function times out, the response is 202 and the request can be repeated to continue.
+    """
+
+    logger.info(mask_sensitive_data(event))
+
+    try:
+        body = json.loads(event["body"]) if "body" in event else json.loads(event)
+        query_execution_id = body["query_execution_id"]
+        row = max(int(body.get("offset", 0)), 0)
+        page_size = min(max(int(body.get("page_size", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+
+        query_execution = athena.get_query_execution(
+            QueryExecutionId=query_execution_id)["QueryExecution"]
+        if query_execution["Status"]["State"] != "SUCCEEDED":
+            return build_response(400, json.dumps({
+                "error": "Query not completed successfully"
+            }))
+        if query_execution.get("StatementType") != "DML":
+            return build_response(400, json.dumps({
+                "error": "Only the results of a SELECT query can be read"
+            }))
+
+        output_location = query_execution["ResultConfiguration"]["OutputLocation"]
+        bucket_name, object_key = output_location.replace("s3://", "").split("/", 1)
+
+        index = get_index(bucket_name, object_key, query_execution_id)
+        if not extend_index(bucket_name, object_key, index, row, context):
+            return build_response(202, json.dumps({
+                "query_execution_id": query_execution_id,
+                "status": "INDEXING",
+                "rows_indexed": index["rows_indexed"]
+            }))
+
+        rows = []
+        if row < index["rows_indexed"]:
+            rows = read_page(bucket_name, object_key, index, row, page_size)
+
+        values = [
+            [parse_value(record[position], column_type) for record in rows]
+            for position, column_type in enumerate(index["types"])
+        ]
+        next_offset = row + len(rows)
+        result = {
+            "query_execution_id": query_execution_id,
+            "columns": index["columns"],
+            "types": index["types"],
+            "values": values,
+            "offset": row,
+            "row_count": len(rows),
+            "next_offset": next_offset if len(rows) == page_size else None,
+            "total_rows": index.get("total_rows"),
+        }
+        return build_response(200, json.dumps(result, cls=DecimalEncoder))
+
+    except Exception as ex:
+        logger.error(traceback.format_exc())
+        return build_response(500, json.dumps({
+            "error": "Internal server error",
+            "message": str(ex)
+        }))
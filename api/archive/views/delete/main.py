@@ -34,6 +34,10 @@ else:
 ssm = boto3.client('ssm')
 dynamodb = boto3.client('dynamodb')
 glue = boto3.client('glue')
+s3 = boto3.client('s3')
+
+# Lineage items of materialized views in the archive details table
+MATERIALIZED_VIEW_PREFIX = "mview#"
 
 
 def mask_sensitive_data(event):
@@ -61,9 +65,42 @@ def build_response(http_code, body):
     }
 
 
+def drop_materialization(archive_id, glue_database_name, view_name):
+    """
+    Deletes the materialized table of a view, its data and its lineage. A refresh that is still
+    running stops when it finds its lineage gone.
+    """
+    details_table_param = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
+    key = {'archive_id': {'S': archive_id}, 'item_key': {'S': f'{MATERIALIZED_VIEW_PREFIX}{view_name}'}}
+    response = dynamodb.delete_item(
+        TableName=details_table_param['Parameter']['Value'],
+        Key=key,
+        ReturnValues='ALL_OLD'
+    )
+    table_name = response.get('Attributes', {}).get('table_name', {}).get('S')
+    if not table_name:
+        return
+
+    try:
+        location = glue.get_table(
+            DatabaseName=glue_database_name, Name=table_name)['Table']['StorageDescriptor']['Location']
+    except glue.exceptions.EntityNotFoundException:
+        return
+    glue.delete_table(DatabaseName=glue_database_name, Name=table_name)
+
+    bucket_name, prefix = location.replace("s3://", "").split("/", 1)
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix.rstrip("/") + "/"):
+        objects = [{'Key': item["Key"]} for item in page.get("Contents", [])]
+        if objects:
+            s3.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+    logger.info(f"Deleted materialized table {table_name} of view {view_name}")
+
+
 def lambda_handler(event, context):
     """
-    Lambda handler for deleting a view from an archive.
+    Lambda handler for deleting a view from an archive, with its materialized table if it has one.
     """
     logger.info(mask_sensitive_data(event))
 
@@ -113,6 +150,8 @@ def lambda_handler(event, context):
 
             logger.info(f"Successfully deleted view: {view_name}")
 
+            drop_materialization(archive_id, glue_database_name, view_name)
+
             return build_response(200, json.dumps({
                 "message": f"View '{view_name}' successfully deleted",
                 "view_name": view_name,
@@ -23,6 +23,8 @@ import re
 
 from decimal import Decimal
 
+from materialized_views import get_materializations, is_fresh, refresh_failed, refresh_in_progress
+
 REGION = os.getenv("REGION")
 
 class DecimalEncoder(json.JSONEncoder):
@@ -141,6 +143,11 @@ def lambda_handler(event, context):
 
         logger.info(f"Fetching views from Glue database: {glue_database_name}")
 
+        details_table_param = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        materializations = get_materializations(
+            details_table_param['Parameter']['Value'], archive_id)
+
         # Get all tables from Glue database
         views = []
         next_token = None
@@ -192,6 +199,24 @@ def lambda_handler(event, context):
                             for col in table.get('StorageDescriptor', {}).get('Columns', [])
                         ]
                     }
+
+                    lineage = materializations.get(view_info['name'])
+                    if lineage:
+                        if refresh_in_progress(lineage):
+                            status = 'Refreshing'
+                        elif refresh_failed(lineage, archive_item, raw_view_text):
+                            status = 'Failed'
+                        elif is_fresh(lineage, archive_item, raw_view_text):
+                            status = 'Fresh'
+                        else:
+                            status = 'Stale'
+                        view_info['materialization'] = {
+                            'status': status,
+                            'table_name': lineage.get('table_name'),
+                            'partitioned_by': lineage.get('partitioned_by', []),
+                            'materialized_at': lineage.get('materialized_at'),
+                            'message': lineage.get('materialize_job', {}).get('message')
+                        }
                     views.append(view_info)
 
             next_token = response.get('NextToken')
@@ -0,0 +1,184 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import boto3
+import json
+import logging
+import os
+import traceback
+
+from materialized_views import get_materializations, is_fresh, refresh_in_progress, start_refresh
+
+REGION = os.getenv("REGION")
+
+# region Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+# endregion
+
+ssm = boto3.client('ssm')
+dynamodb = boto3.client('dynamodb')
+glue = boto3.client('glue')
+
+
+def mask_sensitive_data(event):
+    # remove sensitive data from request object before logging
+    keys_to_redact = ["authorization"]
+    result = {}
+    for k, v in event.items():
+        if isinstance(v, dict):
+            result[k] = mask_sensitive_data(v)
+        elif k in keys_to_redact:
+            result[k] = "<redacted>"
+        else:
+            result[k] = v
+    return result
+
+
+def build_response(http_code, body):
+    return {
+        "headers": {
+            "Cache-Control": "no-cache, no-store",
+            "Content-Type": "application/json",
+        },
+        "statusCode": http_code,
+        "body": body,
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Lambda handler for materializing a view of an archive.
+
+    The view is written to a ZSTD-compressed Parquet table in the archive's Glue database,
+    optionally partitioned by some of its columns, in the background. The query APIs read the
+    table in place of the view while it is fresh, and refresh it after the archive is re-run
+    or the view is replaced. Materializing a view that is already fresh does nothing unless
+    force is set. Returns the lineage of the view's materialization.
+    """
+    logger.info(mask_sensitive_data(event))
+
+    try:
+        body = json.loads(event["body"]) if "body" in event else json.loads(event)
+        archive_id = body["archive_id"]
+        view_name = body["view_name"]
+        partitioned_by = body.get("partitioned_by")
+        force = bool(body.get("force", False))
+
+        # Get DynamoDB table name for archives
+        archives_table_param = ssm.get_parameter(
+            Name='/archive/dynamodb-table', WithDecryption=True)
+        archives_table_name = archives_table_param['Parameter']['Value']
+
+        # Fetch archive metadata from DynamoDB
+        archive_response = dynamodb.get_item(
+            TableName=archives_table_name,
+            Key={'id': {'S': archive_id}}
+        )
+
+        if 'Item' not in archive_response:
+            return build_response(404, json.dumps({
+                "error": "Archive not found",
+                "message": f"Archive with id {archive_id} does not exist"
+            }))
+
+        archive_item = archive_response['Item']
+        database_name = archive_item.get('database', {}).get('S', '')
+
+        if not database_name:
+            return build_response(400, json.dumps({
+                "error": "Invalid archive",
+                "message": "Archive does not have a database name"
+            }))
+
+        if archive_item.get('archive_status', {}).get('S') != 'Archived':
+            return build_response(409, json.dumps({
+                "error": "Archive not ready",
+                "message": "Views can be materialized once the archive is archived"
+            }))
+
+        # Construct Glue database name
+        glue_database_name = f'{archive_id}-{database_name}-database'
+
+        try:
+            view = glue.get_table(DatabaseName=glue_database_name, Name=view_name)['Table']
+        except glue.exceptions.EntityNotFoundException:
+            view = {}
+        if view.get('TableType') != 'VIRTUAL_VIEW':
+            return build_response(404, json.dumps({
+                "error": "View not found",
+                "message": f"View '{view_name}' does not exist in database '{glue_database_name}'"
+            }))
+
+        details_table_param = ssm.get_parameter(
+            Name='/archive/details-dynamodb-table', WithDecryption=True)
+        details_table_name = details_table_param['Parameter']['Value']
+
+        lineage = get_materializations(details_table_name, archive_id).get(view_name, {})
+        if partitioned_by is None:
+            partitioned_by = lineage.get('partitioned_by', [])
+
+        columns = [column['Name'] for column in view.get('StorageDescriptor', {}).get('Columns', [])]
+        unknown = [column for column in partitioned_by if column not in columns]
+        if unknown or len(partitioned_by) >= len(columns):
+            return build_response(400, json.dumps({
+                "error": "Invalid partition columns",
+                "message": f"Partition columns must be some, not all, of the view's columns: {', '.join(columns)}"
+            }))
+
+        view_text = view.get('ViewOriginalText', '')
+        unchanged = list(partitioned_by) == list(lineage.get('partitioned_by', []))
+        if not force and unchanged and is_fresh(lineage, archive_item, view_text):
+            return build_response(200, json.dumps({
+                "view_name": view_name,
+                "status": "Fresh",
+                "lineage": lineage
+            }, default=str))
+
+        if refresh_in_progress(lineage):
+            return build_response(202, json.dumps({
+                "view_name": view_name,
+                "status": "InProgress",
+                "lineage": lineage
+            }, default=str))
+
+        run_id = start_refresh(
+            details_table_name, archive_id, view_name, archive_item, view_text, partitioned_by)
+        logger.info(f"Materializing view {view_name} of archive {archive_id}, run {run_id}")
+
+        return build_response(202, json.dumps({
+            "view_name": view_name,
+            "status": "InProgress",
+            # None if another request started a refresh first
+            "run_id": run_id
+        }))
+
+    except KeyError as ke:
+        logger.error(f"Missing required parameter: {str(ke)}")
+        return build_response(400, json.dumps({
+            "error": "Bad request",
+            "message": f"Missing required parameter: {str(ke)}"
+        }))
+    except Exception as ex:
+        logger.error(traceback.format_exc())
+        return build_response(500, json.dumps({
+            "error": "Internal server error",
+            "message": str(ex)
+        }))
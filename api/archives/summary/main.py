@@ -0,0 +1,132 @@
+""" 
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import boto3
+import json
+import logging
+import os
+import traceback
+
+from decimal import Decimal
+
+REGION = os.getenv("REGION")
+SUMMARY_ID = "summary"
+SCHEDULER_ID = "glue-scheduler"
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj) if obj == obj.to_integral_value() else float(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+# region Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
+    # `.basicConfig` does not execute. Thus we set the level directly.
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+# endregion
+
+ssm = boto3.client('ssm')
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+
+def mask_sensitive_data(event):
+    # remove sensitive data from request object before logging
+    keys_to_redact = ["authorization"]
+    result = {}
+    for k, v in event.items():
+        if isinstance(v, dict):
+            result[k] = mask_sensitive_data(v)
+        elif k in keys_to_redact:
+            result[k] = "<redacted>"
+        else:
+            result[k] = v
+    return result
+
+
+def build_response(http_code, body):
+    return {
+        "headers": {
+            # tell cloudfront and api gateway not to cache the response
+            "Cache-Control": "no-cache, no-store",
+            "Content-Type": "application/json",
+        },
+        "statusCode": http_code,
+        "body": body,
+    }
+
+
+def format_summary(item):
+    # The summary item stores flat "status#<status>" and "engine#<engine>" counters
+    summary = {
+        "archives": item.get("archives", 0),
+        "tables": item.get("tables", 0),
+        "rows": item.get("rows", 0),
+        "bytes": item.get("bytes", 0),
+        "by_status": {},
+        "by_engine": {},
+    }
+
+    for key, value in item.items():
+        if key.startswith("status#") and value:
+            summary["by_status"][key[len("status#"):]] = value
+        elif key.startswith("engine#") and value:
+            summary["by_engine"][key[len("engine#"):]] = value
+
+    return summary
+
+
+def format_scheduler(item):
+    # The Glue run scheduler item holds the DPUs and runs in use and the set of queued job runs
+    return {
+        "dpu_in_use": item.get("dpu_in_use", 0),
+        "runs_in_use": item.get("runs_in_use", 0),
+        "queue_depth": len(item.get("queued", [])),
+    }
+
+
+def lambda_handler(event, context):
+    logger.info(mask_sensitive_data(event))
+
+    try: 
+        parameter = ssm.get_parameter(
+            Name='/archive/summary-dynamodb-table', WithDecryption=True)
+        table = dynamodb.Table(parameter['Parameter']['Value'])
+
+        dynamodb_response = table.get_item(Key={"id": SUMMARY_ID})
+        item = dynamodb_response.get("Item", {})
+        scheduler_response = table.get_item(Key={"id": SCHEDULER_ID})
+
+        response = {"data": {
+            **format_summary(item),
+            "glue_scheduler": format_scheduler(scheduler_response.get("Item", {}))
+        }}
+        return build_response(200, json.dumps(response, cls=DecimalEncoder))
+    
+    except Exception as ex:
+        logger.error(traceback.format_exc())
+        return build_response(500, "Server Error")
+
+
+if __name__ == "__main__":
+
+    example_event = {}
+    response = lambda_handler(example_event, {})
+    print(json.dumps(response))
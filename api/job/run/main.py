@@ -17,10 +17,16 @@ import boto3
 import json
 import logging
 import os
+import re
 import traceback
 import uuid
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 REGION = os.getenv("REGION")
+SCHEDULER_ROLE_ARN = os.getenv("SCHEDULER_ROLE_ARN")
+SCHEDULE_GROUP = os.getenv("SCHEDULE_GROUP", "default")
+TIME_PATTERN = re.compile(r"^([01][0-9]|2[0-3]):[0-5][0-9]$")
+WINDOW_ON_CLOSE = ("pause", "stop")
 
 # region Logging
 
@@ -38,6 +44,7 @@ else:
 
 ssm = boto3.client('ssm')
 client = boto3.client('stepfunctions')
+scheduler_client = boto3.client('scheduler')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 
 def mask_sensitive_data(event):
@@ -66,6 +73,84 @@ def build_response(http_code, body):
     }
 
 
+def check_timezone(timezone, label):
+    """
+    Raises:
+    ValueError: If timezone is not an IANA time zone name, e.g. "Europe/Berlin".
+    """
+
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"{label} timezone {timezone!r} is not a valid time zone name")
+
+
+def parse_window(window):
+    """
+    Validates a maintenance window, e.g. {"start": "22:00", "end": "06:00", "timezone": "UTC",
+    "on_close": "pause"}. Windows whose end is before their start run over midnight.
+
+    Raises:
+    ValueError: If the window is invalid.
+    """
+
+    if not TIME_PATTERN.match(window.get("start", "")) or not TIME_PATTERN.match(window.get("end", "")):
+        raise ValueError("Maintenance window start and end must be HH:MM")
+    if window.get("on_close", "pause") not in WINDOW_ON_CLOSE:
+        raise ValueError(f"Maintenance window on_close must be one of {WINDOW_ON_CLOSE}")
+    # Checked here, otherwise the run fails when the Glue state machine opens the window
+    check_timezone(window.get("timezone", "UTC"), "Maintenance window")
+    return {
+        "start": window["start"],
+        "end": window["end"],
+        "timezone": window.get("timezone", "UTC"),
+        "on_close": window.get("on_close", "pause"),
+    }
+
+
+def schedule_expression(archive_schedule):
+    """
+    Returns the EventBridge Scheduler expression of a one-time run at date and time, or of a
+    recurring run given as a cron expression.
+
+    Raises:
+    ValueError: If neither is given, or the schedule's timezone is invalid.
+    """
+
+    check_timezone(archive_schedule.get("timezone", "UTC"), "Schedule")
+    if archive_schedule.get("cron"):
+        return f'cron({archive_schedule["cron"]})'
+    if archive_schedule.get("date") and TIME_PATTERN.match(archive_schedule.get("time", "")):
+        return f'at({archive_schedule["date"]}T{archive_schedule["time"]}:00)'
+    raise ValueError("A schedule needs a date and time or a cron expression")
+
+
+def put_schedule(archive_id, state_machine_arn, archive_schedule, input_value):
+    """
+    Creates or replaces the archive's schedule, which starts the archive state machine.
+    One-time schedules delete themselves after they ran.
+    """
+
+    schedule = {
+        "Name": f"sdas-archive-{archive_id}",
+        "GroupName": SCHEDULE_GROUP,
+        "ScheduleExpression": schedule_expression(archive_schedule),
+        "ScheduleExpressionTimezone": archive_schedule.get("timezone", "UTC"),
+        "FlexibleTimeWindow": {"Mode": "OFF"},
+        "ActionAfterCompletion": "NONE" if archive_schedule.get("cron") else "DELETE",
+        "Target": {
+            "Arn": state_machine_arn,
+            "RoleArn": SCHEDULER_ROLE_ARN,
+            "Input": json.dumps(input_value),
+        },
+    }
+    try:
+        scheduler_client.create_schedule(**schedule)
+    except scheduler_client.exceptions.ConflictException:
+        scheduler_client.update_schedule(**schedule)
+    return schedule["ScheduleExpression"]
+
+
 def lambda_handler(event, context):
     logger.info(mask_sensitive_data(event))
 
@@ -76,7 +161,15 @@ def lambda_handler(event, context):
         archive_id = body["archive_id"]
         worker_capacity = body["worker_capacity"]
         worker_type = body["worker_type"]
-        run_now = body["archive_schedule"]["run_now"]
+        archive_schedule = body["archive_schedule"]
+        run_now = archive_schedule["run_now"]
+
+        try:
+            window = parse_window(archive_schedule["window"]) if archive_schedule.get("window") else None
+            if not run_now:
+                schedule_expression(archive_schedule)
+        except ValueError as ex:
+            return build_response(400, json.dumps({"message": str(ex)}))
 
         parameter = ssm.get_parameter(
             Name='/archive/dynamodb-table', WithDecryption=True)
@@ -98,11 +191,28 @@ def lambda_handler(event, context):
             ReturnValues="UPDATED_NEW"
         )
 
+        # Table runs of the archive only start inside the maintenance window
+        if window:
+            table.update_item(
+                Key={'id': archive_id},
+                UpdateExpression="SET configuration.#window= :w",
+                ExpressionAttributeNames={'#window': 'window'},
+                ExpressionAttributeValues={':w': window}
+            )
+        else:
+            table.update_item(
+                Key={'id': archive_id},
+                UpdateExpression="REMOVE configuration.#window",
+                ExpressionAttributeNames={'#window': 'window'}
+            )
+
         parameter = ssm.get_parameter(
             Name='/job/step-functions-state-machine', WithDecryption=True)
 
+        # A resumed run skips the tables that were archived and validated
         input_value = {
-            "archive_id": archive_id
+            "archive_id": archive_id,
+            "resume": bool(body.get("resume", False))
         }
 
         if run_now:
@@ -117,10 +227,24 @@ def lambda_handler(event, context):
                 ExpressionAttributeValues={':s': "Archiving"},
                 ReturnValues="UPDATED_NEW"
             )
+            response = {"RequestId": response["ResponseMetadata"]["RequestId"]}
         else:
-            print("ADD SCHEDULER")
+            expression = put_schedule(
+                archive_id, parameter['Parameter']['Value'], archive_schedule, input_value)
+            table.update_item(
+                Key={'id': archive_id},
+                UpdateExpression="SET archive_status= :s, configuration.schedule= :e",
+                ExpressionAttributeValues={
+                    ':s': "Scheduled",
+                    ':e': {
+                        "expression": expression,
+                        "timezone": archive_schedule.get("timezone", "UTC")
+                    }
+                },
+                ReturnValues="UPDATED_NEW"
+            )
+            response = {"Schedule": expression}
 
-        response = {"RequestId": response["ResponseMetadata"]["RequestId"]}
         return build_response(200, json.dumps(response))
 
     except Exception as ex:
@@ -0,0 +1,200 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import hashlib
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+# A materialized view is a Parquet table built from a view with CTAS. Its lineage is an
+# "mview#<view name>" item of the archive details table: the table currently serving the view,
+# the archive run and the view definition it was built from, and the refresh in progress.
+MATERIALIZED_VIEW_PREFIX = "mview#"
+MATERIALIZE_FUNCTION = os.getenv("MATERIALIZE_FUNCTION")
+# A refresh that has not finished after this long is taken to have died and can be restarted
+REFRESH_TIMEOUT = timedelta(hours=6)
+
+dynamodb = boto3.client('dynamodb')
+lambda_client = boto3.client('lambda')
+deserializer = TypeDeserializer()
+
+
+def from_item(item):
+    return {key: deserializer.deserialize(value) for key, value in item.items()}
+
+
+def view_hash(view_text):
+    return hashlib.sha256(view_text.encode("utf-8")).hexdigest()
+
+
+def archive_run(archive_item):
+    """
+    Returns the number of runs of an archive, as counted by the archive pipeline when a run starts.
+    """
+    return int(archive_item.get('run_count', {}).get('N', '0'))
+
+
+def get_materializations(details_table_name, archive_id):
+    """
+    Returns the lineage of the archive's materialized views by view name.
+    """
+    materializations = {}
+    query_args = {
+        'TableName': details_table_name,
+        'KeyConditionExpression': 'archive_id = :a AND begins_with(item_key, :m)',
+        'ExpressionAttributeValues': {':a': {'S': archive_id}, ':m': {'S': MATERIALIZED_VIEW_PREFIX}},
+        'ConsistentRead': True
+    }
+    while True:
+        response = dynamodb.query(**query_args)
+        for item in response.get('Items', []):
+            lineage = from_item(item)
+            materializations[lineage['view_name']] = lineage
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return materializations
+
+
+def is_fresh(lineage, archive_item, view_text):
+    """
+    Returns whether a materialization holds the current data of its view: it was built from the
+    archive's latest completed run and from the current definition of the view.
+    """
+    return bool(lineage.get('table_name')) \
+        and archive_item.get('archive_status', {}).get('S') == 'Archived' \
+        and int(lineage.get('archive_run', -1)) == archive_run(archive_item) \
+        and lineage.get('view_hash') == view_hash(view_text)
+
+
+def refresh_in_progress(lineage):
+    job = lineage.get('materialize_job', {})
+    if job.get('status') != 'InProgress':
+        return False
+    started_at = datetime.fromisoformat(job['started_at'])
+    return datetime.now(timezone.utc) - started_at < REFRESH_TIMEOUT
+
+
+def refresh_failed(lineage, archive_item, view_text):
+    """
+    Returns whether the last refresh failed on the current archive run and view definition; it
+    is not retried automatically until one of them changes.
+    """
+    job = lineage.get('materialize_job', {})
+    return job.get('status') == 'Failed' \
+        and int(job.get('archive_run', -1)) == archive_run(archive_item) \
+        and job.get('view_hash') == view_hash(view_text)
+
+
+def start_refresh(details_table_name, archive_id, view_name, archive_item, view_text, partitioned_by):
+    """
+    Starts building a new version of a materialized view in the background, unless a refresh
+    of the view is already running.
+
+    Returns:
+        The run ID of the refresh, or None if another refresh is running
+    """
+    now = datetime.now(timezone.utc)
+    run_id = str(uuid.uuid4())
+    try:
+        dynamodb.update_item(
+            TableName=details_table_name,
+            Key={'archive_id': {'S': archive_id}, 'item_key': {'S': f'{MATERIALIZED_VIEW_PREFIX}{view_name}'}},
+            UpdateExpression='SET view_name = :v, materialize_job = :j',
+            ConditionExpression='attribute_not_exists(materialize_job) OR materialize_job.#status <> :running '
+                                'OR materialize_job.started_at < :expired',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':v': {'S': view_name},
+                ':j': {'M': {
+                    'run_id': {'S': run_id},
+                    'status': {'S': 'InProgress'},
+                    'started_at': {'S': now.isoformat()},
+                    'archive_run': {'N': str(archive_run(archive_item))},
+                    'view_hash': {'S': view_hash(view_text)},
+                    'partitioned_by': {'L': [{'S': column} for column in partitioned_by]}
+                }},
+                ':running': {'S': 'InProgress'},
+                ':expired': {'S': (now - REFRESH_TIMEOUT).isoformat()}
+            }
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        return None
+
+    lambda_client.invoke(
+        FunctionName=MATERIALIZE_FUNCTION,
+        InvocationType="Event",  # Asynchronous invocation
+        Payload=json.dumps({
+            "archive_id": archive_id,
+            "view_name": view_name,
+            "run_id": run_id
+        })
+    )
+    return run_id
+
+
+def route_materialized_views(sql_statement, archive_id, database_name, archive_item, details_table_name, views):
+    """
+    Replaces references to views that have a fresh materialization with its table.
+
+    A stale materialization (the archive was re-run or the view was replaced) is refreshed in
+    the background and the query reads the view itself until the refresh is done.
+
+    Args:
+        sql_statement: User's SQL query
+        archive_id: Archive UUID
+        database_name: Database name from archive
+        archive_item: The archive item, as returned by the low-level DynamoDB client
+        details_table_name: Name of the archive details DynamoDB table
+        views: List of the archive's views with their name and definition
+
+    Returns:
+        SQL reading materialized tables in place of the views they materialize
+    """
+    # Statements that create, replace or drop views keep their view names
+    if not re.match(r'\s*(select|with)\b', sql_statement, flags=re.IGNORECASE):
+        return sql_statement
+
+    referenced = [
+        view for view in views
+        if re.search(r'\b' + re.escape(view['name']) + r'\b', sql_statement, flags=re.IGNORECASE)
+    ]
+    if not referenced:
+        return sql_statement
+
+    materializations = get_materializations(details_table_name, archive_id)
+    database_prefix = f'{archive_id}-{database_name}-database'
+    for view in referenced:
+        lineage = materializations.get(view['name'])
+        if not lineage:
+            continue
+
+        if is_fresh(lineage, archive_item, view['text']):
+            table_name = f'"{database_prefix}"."{lineage["table_name"]}"'
+            # Quoted and unquoted references are replaced in one pass, so the replacement
+            # is never matched again
+            pattern = r'"' + re.escape(view['name']) + r'"|\b' + re.escape(view['name']) + r'\b'
+            sql_statement = re.sub(pattern, lambda _: table_name, sql_statement, flags=re.IGNORECASE)
+        elif archive_item.get('archive_status', {}).get('S') == 'Archived' \
+                and not refresh_in_progress(lineage) and not refresh_failed(lineage, archive_item, view['text']):
+            start_refresh(details_table_name, archive_id, view['name'], archive_item, view['text'],
+                          lineage.get('partitioned_by', []))
+
+    return sql_statement
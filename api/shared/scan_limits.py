@@ -0,0 +1,276 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+import boto3
+
+# Bytes a single query of an archive may scan; an archive can set its own limit in
+# configuration.query.max_scan_bytes
+ARCHIVE_MAX_SCAN_BYTES = int(os.getenv("ARCHIVE_MAX_SCAN_BYTES", str(100 * 1024 ** 3)))
+# Bytes a user may scan per day (UTC) across all archives
+USER_DAILY_SCAN_BYTES = int(os.getenv("USER_DAILY_SCAN_BYTES", str(1024 ** 4)))
+# A user's scanned bytes per day are kept in the summary table, next to the archive counters
+USER_SCAN_ID_PREFIX = "user-scan#"
+USER_SCAN_TTL_DAYS = 7
+
+ssm = boto3.client('ssm')
+glue = boto3.client('glue')
+s3 = boto3.client('s3')
+dynamodb = boto3.client('dynamodb')
+
+
+def request_user(event):
+    """
+    Returns the Cognito user of an API request, or None when the function is invoked directly.
+    """
+    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
+    return claims.get("sub") or claims.get("cognito:username")
+
+
+def user_scan_id(user):
+    return f'{USER_SCAN_ID_PREFIX}{user}#{datetime.now(timezone.utc).date().isoformat()}'
+
+
+def summary_table_name():
+    parameter = ssm.get_parameter(
+        Name='/archive/summary-dynamodb-table', WithDecryption=True)
+    return parameter['Parameter']['Value']
+
+
+def references(sql_statement, name):
+    return re.search(r'\b' + re.escape(name) + r'\b', sql_statement, flags=re.IGNORECASE) is not None
+
+
+def count_partitions(database, glue_table_name, expression=""):
+    paginator = glue.get_paginator("get_partitions")
+    return sum(
+        len(page["Partitions"])
+        for page in paginator.paginate(DatabaseName=database, TableName=glue_table_name,
+                                       Expression=expression, ExcludeColumnSchema=True)
+    )
+
+
+def partition_expression(sql_statement, partition_keys):
+    """
+    Builds a Glue partition expression from the equality predicates on partition keys in the
+    query, e.g. "(year = '2020' OR year = '2021')". Returns "" when the query has none.
+    """
+    clauses = []
+    for key in partition_keys:
+        values = re.findall(
+            r'\b' + re.escape(key) + r"\b\s*=\s*('[^']*'|\d+)", sql_statement, flags=re.IGNORECASE)
+        if values:
+            clauses.append("(" + " OR ".join(f"{key} = {value}" for value in values) + ")")
+    return " AND ".join(clauses)
+
+
+def columns_read(sql_statement, columns):
+    """
+    Returns the columns a query reads: all of them for SELECT * or when it names none of them,
+    otherwise the ones it names.
+    """
+    if re.search(r'(\bselect|,)\s*(\w+\.)?\*', sql_statement, flags=re.IGNORECASE):
+        return columns
+    named = [column for column in columns if references(sql_statement, column)]
+    # The columns could not be resolved, e.g. an aggregate over all rows
+    return named or columns
+
+
+def location_size(location):
+    """
+    Returns the size of the objects under an S3 location, e.g. s3://bucket/archive/table/.
+    """
+    bucket_name, _, prefix = location.replace("s3://", "", 1).partition("/")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    size = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        size += sum(s3_object["Size"] for s3_object in page.get("Contents", []))
+    return size
+
+
+def archive_views(database):
+    """
+    Returns the text of the views of an archive's Glue database, by view name.
+    """
+    views = {}
+    paginator = glue.get_paginator("get_tables")
+    for page in paginator.paginate(DatabaseName=database):
+        for table in page["TableList"]:
+            if table.get("TableType") == "VIRTUAL_VIEW":
+                views[table["Name"]] = table.get("ViewOriginalText", "")
+    return views
+
+
+def view_text(sql_statement, views):
+    """
+    Returns the text of the views a query reads, including the views they read in turn.
+    """
+    texts = []
+    pending = [sql_statement]
+    remaining = dict(views)
+    while pending:
+        text = pending.pop()
+        for name in [name for name in remaining if references(text, name)]:
+            texts.append(remaining[name])
+            pending.append(remaining.pop(name))
+    return " ".join(texts)
+
+
+def estimate_table(database, glue_table_name, sql_statement, bytes_archived, full_scan=False):
+    """
+    Estimates the bytes a query scans in one table.
+
+    The size is the size the table's last run archived, as recorded on its table item, so the
+    table's files are not listed; tables archived before sizes were recorded are listed once.
+    When the query filters on partition keys, the size is scaled by the share of partitions it
+    selects. The tables are Parquet, so Athena reads only the columns the query uses; the size
+    is also scaled by the share of columns read. A table read through a view is counted in full,
+    as the columns and filters of the query cannot be traced to it.
+    """
+    table = glue.get_table(DatabaseName=database, Name=glue_table_name)["Table"]
+    columns = [column["Name"] for column in table["StorageDescriptor"].get("Columns", [])]
+    partition_keys = [key["Name"] for key in table.get("PartitionKeys", [])]
+
+    table_bytes = bytes_archived
+    if table_bytes is None:
+        table_bytes = location_size(table["StorageDescriptor"]["Location"])
+    if full_scan:
+        return {
+            "bytes": table_bytes,
+            "estimated_bytes": table_bytes,
+            "columns_read": len(columns),
+            "columns_total": len(columns),
+            "partition_keys": partition_keys,
+            "partitions_pruned": False,
+            "through_view": True,
+        }
+
+    expression = partition_expression(sql_statement, partition_keys) if partition_keys else ""
+    if expression:
+        total_partitions = count_partitions(database, glue_table_name)
+        selected_partitions = count_partitions(database, glue_table_name, expression)
+        table_bytes = table_bytes * selected_partitions // max(total_partitions, 1)
+
+    read = columns_read(sql_statement, columns)
+    return {
+        "bytes": table_bytes,
+        "estimated_bytes": table_bytes * len(read) // max(len(columns), 1),
+        "columns_read": len(read),
+        "columns_total": len(columns),
+        "partition_keys": partition_keys,
+        "partitions_pruned": bool(expression),
+        "through_view": False,
+    }
+
+
+def suggestions(sql_statement, tables):
+    hints = []
+    if re.search(r'(\bselect|,)\s*(\w+\.)?\*', sql_statement, flags=re.IGNORECASE):
+        hints.append("Select only the columns you need instead of *; each column is stored and scanned separately")
+    for table in tables:
+        if table["partition_keys"] and not table["partitions_pruned"] and not table["through_view"]:
+            hints.append(f'Filter {table["table"]} on its partition columns ({", ".join(table["partition_keys"])})')
+    if not re.search(r'\blimit\s+\d+', sql_statement, flags=re.IGNORECASE):
+        hints.append("Add a LIMIT to preview the results")
+    return hints
+
+
+def preflight(event, archive_id, archive_item, database_name, table_details, sql_statement):
+    """
+    Estimates the bytes a query of an archive would scan and checks them against the archive's
+    limit per query and the user's daily limit.
+
+    Args:
+        event: The API request, which identifies the user
+        archive_id: The archive ID
+        archive_item: The archive item, as returned by the low-level DynamoDB client
+        database_name: Database name from archive
+        table_details: List of table metadata from DynamoDB, with the bytes archived per table,
+            None for tables archived before sizes were recorded
+        sql_statement: User's SQL query
+
+    Returns:
+        Dict with the estimate per referenced table, the limits and whether the query may run
+    """
+    database = f'{archive_id}-{database_name}-database'
+    views_read = view_text(sql_statement, archive_views(database))
+    tables = []
+    for table in table_details:
+        through_view = references(views_read, table['table'])
+        if not through_view and not references(sql_statement, table['table']):
+            continue
+        estimate = estimate_table(database, f'{archive_id}-{database_name}-{table["table"]}-table', sql_statement,
+                                  table.get('bytes_archived'), full_scan=through_view)
+        tables.append({"table": table['table'], **estimate})
+    estimated_bytes = sum(table["estimated_bytes"] for table in tables)
+
+    query_configuration = archive_item.get('configuration', {}).get('M', {}).get('query', {}).get('M', {})
+    archive_limit = int(query_configuration.get('max_scan_bytes', {}).get('N', ARCHIVE_MAX_SCAN_BYTES))
+
+    user = request_user(event)
+    scanned_today = 0
+    if user:
+        item = dynamodb.get_item(
+            TableName=summary_table_name(),
+            Key={'id': {'S': user_scan_id(user)}}
+        ).get('Item', {})
+        scanned_today = int(item.get('bytes_scanned', {}).get('N', '0'))
+
+    reason = None
+    if estimated_bytes > archive_limit:
+        reason = f"The query would scan about {estimated_bytes} bytes, the limit for this archive is {archive_limit}"
+    elif user and scanned_today + estimated_bytes > USER_DAILY_SCAN_BYTES:
+        reason = (f"The query would scan about {estimated_bytes} bytes, {USER_DAILY_SCAN_BYTES - scanned_today} "
+                  f"bytes are left of your daily limit")
+
+    return {
+        "archive_id": archive_id,
+        "estimated_bytes": estimated_bytes,
+        "tables": tables,
+        "limits": {
+            "archive_max_scan_bytes": archive_limit,
+            "user_daily_scan_bytes": USER_DAILY_SCAN_BYTES if user else None,
+            "user_scanned_today": scanned_today if user else None,
+        },
+        "allowed": reason is None,
+        "reason": reason,
+        "suggestions": suggestions(sql_statement, tables),
+    }
+
+
+def record_scan(event, query_execution):
+    """
+    Adds the bytes a finished query scanned to the user's daily total.
+    """
+    user = request_user(event)
+    bytes_scanned = query_execution.get("Statistics", {}).get("DataScannedInBytes", 0)
+    if not user or not bytes_scanned:
+        return
+    dynamodb.update_item(
+        TableName=summary_table_name(),
+        Key={'id': {'S': user_scan_id(user)}},
+        UpdateExpression='ADD bytes_scanned :b SET #ttl = if_not_exists(#ttl, :ttl)',
+        ExpressionAttributeNames={'#ttl': 'ttl'},
+        ExpressionAttributeValues={
+            ':b': {'N': str(bytes_scanned)},
+            ':ttl': {'N': str(int(time.time()) + USER_SCAN_TTL_DAYS * 24 * 3600)}
+        }
+    )
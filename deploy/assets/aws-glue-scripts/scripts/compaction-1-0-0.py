@@ -0,0 +1,111 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import sys
+import math
+import boto3
+from awsglue.utils import getResolvedOptions
+from pyspark.context import SparkContext
+from awsglue.context import GlueContext
+from awsglue.job import Job
+
+DEFAULT_TARGET_FILE_SIZE_MB = 256
+DELETE_BATCH_SIZE = 1000
+
+
+def listParquetObjects(s3Client, bucket, prefix):
+    """
+    Returns the keys and the total size of the data files under the prefix, skipping
+    Spark and Hadoop marker files.
+    """
+
+    keys = []
+    totalBytes = 0
+    paginator = s3Client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", []):
+            name = item["Key"].rsplit("/", 1)[-1]
+            if name and not name.startswith(("_", ".")) and not name.endswith("$folder$"):
+                keys.append(item["Key"])
+                totalBytes += item["Size"]
+    return keys, totalBytes
+
+
+def deleteObjects(s3Client, bucket, keys):
+    """
+    Deletes the keys in batches of up to 1000 and fails if any delete was rejected.
+    """
+
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        response = s3Client.delete_objects(
+            Bucket=bucket,
+            Delete={
+                "Objects": [{"Key": key} for key in keys[start:start + DELETE_BATCH_SIZE]],
+                "Quiet": True,
+            },
+        )
+        if response.get("Errors"):
+            raise Exception(f"Failed to delete {len(response['Errors'])} objects: {response['Errors'][:5]}")
+
+
+# Rewrites an archived table prefix (s3://BUCKET/ARCHIVE_ID/DATABASE/TABLE/) into files of
+# about TARGET_FILE_SIZE_MB. The compacted files are appended next to the existing ones and
+# the existing files are deleted once the write has been committed, so the table location and
+# the Glue catalog entry stay the same.
+args = getResolvedOptions(sys.argv, ["JOB_NAME", "BUCKET", "ARCHIVE_ID", "DATABASE", "TABLE"])
+targetFileSizeMb = DEFAULT_TARGET_FILE_SIZE_MB
+if "--TARGET_FILE_SIZE_MB" in sys.argv:
+    targetFileSizeMb = int(getResolvedOptions(sys.argv, ["TARGET_FILE_SIZE_MB"])["TARGET_FILE_SIZE_MB"])
+
+sc = SparkContext()
+glueContext = GlueContext(sc)
+spark = glueContext.spark_session
+job = Job(glueContext)
+job.init(args["JOB_NAME"], args)
+
+s3Client = boto3.client("s3")
+prefix = args["ARCHIVE_ID"] + "/" + args["DATABASE"] + "/" + args["TABLE"] + "/"
+path = "s3://" + args["BUCKET"] + "/" + prefix
+
+existingKeys, existingBytes = listParquetObjects(s3Client, args["BUCKET"], prefix)
+fileCount = max(1, math.ceil(existingBytes / (targetFileSizeMb * 1024 * 1024)))
+print(f"Compacting {len(existingKeys)} files ({existingBytes} bytes) under {path} into {fileCount} files")
+
+if len(existingKeys) > fileCount:
+    # Only the files listed above are read, so the files written below are never picked up
+    df = spark.read.parquet(*["s3://" + args["BUCKET"] + "/" + key for key in existingKeys])
+    partitionCount = df.rdd.getNumPartitions()
+    if fileCount < partitionCount:
+        df = df.coalesce(fileCount)
+    elif fileCount > partitionCount:
+        df = df.repartition(fileCount)
+
+    df.write.mode("append").option("compression", "uncompressed").parquet(path)
+
+    # The expiration and storage tier lifecycle rules select the archive's objects by tag, so
+    # the compacted files get the tags of the files they replace
+    tagSet = s3Client.get_object_tagging(Bucket=args["BUCKET"], Key=existingKeys[0])["TagSet"]
+    if tagSet:
+        replacedKeys = set(existingKeys)
+        compactedKeys, _ = listParquetObjects(s3Client, args["BUCKET"], prefix)
+        for key in compactedKeys:
+            if key not in replacedKeys:
+                s3Client.put_object_tagging(Bucket=args["BUCKET"], Key=key, Tagging={"TagSet": tagSet})
+
+    deleteObjects(s3Client, args["BUCKET"], existingKeys)
+else:
+    print("Prefix is already at or below the target file count, nothing to do")
+
+job.commit()
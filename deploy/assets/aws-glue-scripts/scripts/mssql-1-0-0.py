@@ -14,6 +14,7 @@ permissions and limitations under the License.
 """
 
 import sys
+import math
 import json
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
@@ -21,6 +22,17 @@ from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
 from awsglue.dynamicframe import DynamicFrame
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+
+DEFAULT_TARGET_FILE_SIZE_MB = 256
+# Files starting with an underscore are ignored by Athena
+CHUNK_PLAN_FILE = "_sdas_chunks.json"
+CHUNK_MARKER_FILE = "_sdas_chunk_complete"
+# Rows of the source matching the archived range, compared with the archive by the count validation
+SOURCE_COUNT_FILE = "_sdas_source_count.json"
+# The archive bucket has Object Lock enabled, which requires a checksum on every upload
+UPLOAD_CHECKSUM = "SHA256"
 
 
 def directJDBCSource(
@@ -31,6 +43,9 @@ def directJDBCSource(
     table,
     redshiftTmpDir,
     transformation_ctx,
+    readOptions=None,
+    rowFilter=None,
+    columns=None,
 ) -> DynamicFrame:
 
     connection_options = {
@@ -42,6 +57,17 @@ def directJDBCSource(
     if redshiftTmpDir:
         connection_options["redshiftTmpDir"] = redshiftTmpDir
 
+    # Engine specific JDBC read options, e.g. fetchsize or hashpartitions
+    connection_options.update(readOptions or {})
+
+    # Push the column selection and row filter down to the source database so only the
+    # archived columns of qualifying rows are read
+    if columns or rowFilter:
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+        if rowFilter:
+            query += f" WHERE {rowFilter}"
+        connection_options["sampleQuery"] = query
+
     return glueContext.create_dynamic_frame.from_options(
         connection_type=connectionType,
         connection_options=connection_options,
@@ -49,44 +75,259 @@ def directJDBCSource(
     )
 
 
+def fileLayout(sliceRows, rowBytes, targetFileSizeMb):
+    """
+    Returns the number of files a slice of sliceRows rows is written to, and the most rows per
+    file, so that the files come out at about targetFileSizeMb.
+    """
+
+    rowsPerFile = max(1, int(targetFileSizeMb * 1024 * 1024 / rowBytes))
+    return max(1, math.ceil(sliceRows / rowsPerFile)), rowsPerFile
+
+
+def sqlString(value):
+    return str(value).replace("'", "''")
+
+
+def chunkPlan(s3Client, bucket, tablePath, readBounds, chunkCount) -> list:
+    """
+    Returns the key ranges of the table's chunks as [low, high) pairs.
+
+    The plan is computed from the minimum and maximum key on the first run and stored next to
+    the chunks, so reruns use the same ranges even if rows were added to the source since.
+    """
+
+    planKey = tablePath + CHUNK_PLAN_FILE
+    try:
+        return json.loads(s3Client.get_object(Bucket=bucket, Key=planKey)["Body"].read())
+    except s3Client.exceptions.NoSuchKey:
+        pass
+
+    low, high = readBounds()
+    plan = []
+    if low is not None:
+        low, high = int(low), int(high)
+        width = max(1, math.ceil((high - low + 1) / chunkCount))
+        plan = [[start, start + width] for start in range(low, high + 1, width)]
+
+    s3Client.put_object(Bucket=bucket, Key=planKey, Body=json.dumps(plan).encode("utf-8"),
+                        ChecksumAlgorithm=UPLOAD_CHECKSUM)
+    return plan
+
+
+def archiveChunks(s3Client, bucket, tablePath, plan, chunkColumn, rowFilter, archiveSlice, parallelism):
+    """
+    Archives each chunk of the plan to its own prefix and marks it complete. Chunks that are
+    already marked are skipped, and the partial output of a chunk that failed before is
+    removed before it is extracted again.
+
+    Returns the source rows of all chunks. The marker of a chunk holds the rows counted when it
+    was extracted, so a skipped chunk is not counted again.
+    """
+
+    def archiveChunk(index):
+        chunkPath = f"{tablePath}chunk-{index:05d}/"
+        markerKey = chunkPath + CHUNK_MARKER_FILE
+        low, high = plan[index]
+        chunkFilter = f"{chunkColumn} >= {low} AND {chunkColumn} < {high}"
+        if rowFilter:
+            chunkFilter = f"({rowFilter}) AND {chunkFilter}"
+
+        if s3Client.list_objects_v2(Bucket=bucket, Prefix=markerKey).get("KeyCount", 0):
+            print(f"Chunk {index} already archived, skipping")
+            marker = s3Client.get_object(Bucket=bucket, Key=markerKey)["Body"].read()
+            # Markers of earlier versions are empty
+            return json.loads(marker)["rows"] if marker else countRows(chunkFilter)
+
+        paginator = s3Client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=chunkPath):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if keys:
+                s3Client.delete_objects(Bucket=bucket, Delete={"Objects": keys, "Quiet": True})
+
+        chunkRows = archiveSlice(chunkFilter, chunkPath, f"chunk{index}_")
+        s3Client.put_object(Bucket=bucket, Key=markerKey, Body=json.dumps({"rows": chunkRows}).encode("utf-8"),
+                            ChecksumAlgorithm=UPLOAD_CHECKSUM)
+        print(f"Chunk {index} archived")
+        return chunkRows
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        return sum(executor.map(archiveChunk, range(len(plan))))
+
+
 args = getResolvedOptions(sys.argv, ["JOB_NAME", "TABLE", "BUCKET", "DATABASE", "ARCHIVE_ID", "MAPPINGS", "CONNECTION", "MSSQL_SCHEMA"])
+targetFileSizeMb = DEFAULT_TARGET_FILE_SIZE_MB
+if "--TARGET_FILE_SIZE_MB" in sys.argv:
+    targetFileSizeMb = int(getResolvedOptions(sys.argv, ["TARGET_FILE_SIZE_MB"])["TARGET_FILE_SIZE_MB"])
+readOptions = {}
+if "--READ_OPTIONS" in sys.argv:
+    readOptions = json.loads(getResolvedOptions(sys.argv, ["READ_OPTIONS"])["READ_OPTIONS"])
+rowFilter = None
+if "--ROW_FILTER" in sys.argv:
+    rowFilter = getResolvedOptions(sys.argv, ["ROW_FILTER"])["ROW_FILTER"]
+columns = None
+if "--COLUMNS" in sys.argv:
+    columns = json.loads(getResolvedOptions(sys.argv, ["COLUMNS"])["COLUMNS"])
+chunkColumn = None
+chunkCount = 1
+chunkParallelism = 1
+if "--CHUNK_COLUMN" in sys.argv:
+    chunkOptions = getResolvedOptions(sys.argv, ["CHUNK_COLUMN", "CHUNK_COUNT", "CHUNK_PARALLELISM"])
+    chunkColumn = chunkOptions["CHUNK_COLUMN"]
+    chunkCount = int(chunkOptions["CHUNK_COUNT"])
+    chunkParallelism = int(chunkOptions["CHUNK_PARALLELISM"])
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args["JOB_NAME"], args)
 
-# Script generated for node SQL Server table
-SQLServertable_node1 = directJDBCSource(
-    glueContext,
-    connectionName=args["CONNECTION"],
-    connectionType="sqlserver",
-    database=args["DATABASE"],
-    table=str(args["MSSQL_SCHEMA"]) + "." + str(args["TABLE"]),
-    redshiftTmpDir="",
-    transformation_ctx="SQLServertable_node1",
-)
-
+sourceTable = str(args["MSSQL_SCHEMA"]) + "." + str(args["TABLE"])
+tablePath = args["ARCHIVE_ID"] + "/" + args["DATABASE"] + "/" + args["TABLE"] + "/"
 # Script generated for node ApplyMapping
 tuples = list(map(tuple, json.loads(args["MAPPINGS"])))
 
-ApplyMapping_node2 = ApplyMapping.apply(
-    frame=SQLServertable_node1,
-    mappings=tuples,
-    transformation_ctx="ApplyMapping_node2",
-)
-
-# Script generated for node S3 bucket
-S3bucket_node3 = glueContext.write_dynamic_frame.from_options(
-    frame=ApplyMapping_node2,
-    connection_type="s3",
-    format="glueparquet",
-    connection_options={
-        "path": "s3://" + args["BUCKET"] + "/" + args["ARCHIVE_ID"] + "/" + args["DATABASE"] + "/" + args["TABLE"] + "/",
-        "partitionKeys": [],
-    },
-    format_options={"compression": "uncompressed"},
-    transformation_ctx="S3bucket_node3",
-)
-
-job.commit()
+
+def archiveSlice(sliceFilter, path, ctx):
+    """
+    Reads the rows matching sliceFilter from the source and writes them under path, replacing
+    the files an earlier run of the slice left there, so a rerun does not duplicate rows.
+
+    Returns the source rows matching sliceFilter, counted with the same predicate right before
+    they are read; the count validation compares the archive with it.
+    """
+
+    sliceRows = countRows(sliceFilter)
+
+    # Script generated for node SQL Server table
+    SQLServertable_node1 = directJDBCSource(
+        glueContext,
+        connectionName=args["CONNECTION"],
+        connectionType="sqlserver",
+        database=args["DATABASE"],
+        table=sourceTable,
+        redshiftTmpDir="",
+        transformation_ctx=ctx + "SQLServertable_node1",
+        readOptions=readOptions,
+        rowFilter=sliceFilter,
+        columns=columns,
+    )
+
+    # Script generated for node ApplyMapping
+    ApplyMapping_node2 = ApplyMapping.apply(
+        frame=SQLServertable_node1,
+        mappings=tuples,
+        transformation_ctx=ctx + "ApplyMapping_node2",
+    )
+
+    # Size the output files from the slice's row count and the source's average row size: the
+    # hash-partitioned read produces one small file per partition, so the rows are repartitioned
+    # into files of about the target size, and maxRecordsPerFile caps a file that comes out larger
+    archivedDf = ApplyMapping_node2.toDF()
+    writer = archivedDf.write
+    if rowBytes:
+        fileCount, rowsPerFile = fileLayout(sliceRows, rowBytes, targetFileSizeMb)
+        writer = archivedDf.repartition(fileCount).write.option("maxRecordsPerFile", rowsPerFile)
+    writer.mode("overwrite") \
+        .option("compression", "uncompressed") \
+        .parquet("s3://" + args["BUCKET"] + "/" + path)
+    return sliceRows
+
+
+def readBounds():
+    # The bounds are read in a single query, without the hash partitioning of the table read
+    boundsOptions = {key: value for key, value in readOptions.items() if not key.startswith("hash")}
+    bounds = directJDBCSource(
+        glueContext,
+        connectionName=args["CONNECTION"],
+        connectionType="sqlserver",
+        database=args["DATABASE"],
+        table=sourceTable,
+        redshiftTmpDir="",
+        transformation_ctx="ChunkBounds_node0",
+        readOptions=boundsOptions,
+        rowFilter=rowFilter,
+        columns=[f"MIN({chunkColumn}) AS low", f"MAX({chunkColumn}) AS high"],
+    ).toDF().first()
+    # By position: Oracle returns the aliases upper-cased, and the column names differ per engine
+    return bounds[0], bounds[1]
+
+
+def countRows(countFilter):
+    """
+    Counts the source rows matching countFilter in a single query.
+    """
+
+    countOptions = {key: value for key, value in readOptions.items() if not key.startswith("hash")}
+    count = directJDBCSource(
+        glueContext,
+        connectionName=args["CONNECTION"],
+        connectionType="sqlserver",
+        database=args["DATABASE"],
+        table=sourceTable,
+        redshiftTmpDir="",
+        transformation_ctx="SourceCount_node0",
+        readOptions=countOptions,
+        rowFilter=countFilter,
+        columns=["COUNT(*) AS row_count"],
+    ).toDF().first()
+    return int(count[0])
+
+
+def sourceRowBytes():
+    """
+    Returns the average size in bytes of a source row from the database's table statistics, or
+    None if the table has no statistics or they cannot be read. The size covers every column, so
+    files of a table archived with fewer columns come out smaller than the target.
+    """
+
+    statsOptions = {key: value for key, value in readOptions.items() if not key.startswith("hash")}
+    try:
+        stats = directJDBCSource(
+            glueContext,
+            connectionName=args["CONNECTION"],
+            connectionType="sqlserver",
+            database=args["DATABASE"],
+            table="sys.dm_db_partition_stats",
+            redshiftTmpDir="",
+            transformation_ctx="RowBytes_node0",
+            readOptions=statsOptions,
+            rowFilter="object_id = OBJECT_ID('" + sqlString(sourceTable) + "') AND index_id IN (0, 1)",
+            columns=["SUM(used_page_count) * 8192.0 / NULLIF(SUM(row_count), 0) AS row_bytes"],
+        ).toDF().first()
+    except Exception as ex:
+        print(f"Table statistics of {sourceTable} cannot be read, output files are not sized: {ex}")
+        return None
+    if not stats or not stats[0]:
+        print(f"{sourceTable} has no table statistics, output files are not sized")
+        return None
+    return float(stats[0])
+
+
+rowBytes = sourceRowBytes()
+s3Client = boto3.client("s3")
+# Very large tables are archived in key-range chunks, each to its own prefix with a
+# completion marker, so a rerun only extracts the chunks that did not complete
+if chunkColumn:
+    plan = chunkPlan(s3Client, args["BUCKET"], tablePath, readBounds, chunkCount)
+    sourceRows = archiveChunks(
+        s3Client, args["BUCKET"], tablePath, plan, chunkColumn, rowFilter, archiveSlice, chunkParallelism)
+    # Rows added to the source after the plan was made are outside its key range and not archived
+    countFilter = f"{chunkColumn} >= {plan[0][0]} AND {chunkColumn} < {plan[-1][1]}" if plan else None
+    if countFilter and rowFilter:
+        countFilter = f"({rowFilter}) AND {countFilter}"
+else:
+    # Replaces the whole table prefix, including the chunks of an earlier chunked run
+    sourceRows = archiveSlice(rowFilter, tablePath, "")
+    countFilter = rowFilter
+
+# The count is not taken in the snapshot of the read. Only a count bounded by a row filter or
+# by chunk key ranges is expected to match exactly; rows inserted into or deleted from an
+# unbounded live table while it is read make a mismatch a warning.
+s3Client.put_object(Bucket=args["BUCKET"], Key=tablePath + SOURCE_COUNT_FILE,
+                    Body=json.dumps({"rows": sourceRows, "filter": countFilter,
+                                     "bounded": bool(countFilter)}).encode("utf-8"),
+                    ChecksumAlgorithm=UPLOAD_CHECKSUM)
+print(f"{sourceRows} source rows archived")
+
+job.commit()
\ No newline at end of file
@@ -17,6 +17,8 @@ import * as cdk from 'aws-cdk-lib';
 import * as ec2 from 'aws-cdk-lib/aws-ec2';
 import * as lambdaPython from '@aws-cdk/aws-lambda-python-alpha';
 import * as apigwv2 from '@aws-cdk/aws-apigatewayv2-alpha';
+import * as events from 'aws-cdk-lib/aws-events';
+import * as targets from 'aws-cdk-lib/aws-events-targets';
 import { Construct } from 'constructs';
 import { ApiGatewayV2LambdaConstruct } from '../constructs/apigatewayv2-lambda-construct';
 import { ApiGatewayV2CloudFrontConstruct } from '../constructs/apigatewayv2-cloudfront-construct';
@@ -55,6 +57,7 @@ export class Apis extends Construct {
 	public readonly testConnectionLambda: lambdaPython.PythonFunction;
 	public readonly api: ApiGatewayV2CloudFrontConstruct;
 	public readonly rdsSecurityGroup: cdk.aws_ec2.SecurityGroup;
+	public readonly archiveObjects: lambdaPython.PythonFunction;
 
 	constructor(scope: Construct, id: string, props: ApisProps) {
 		super(scope, id);
@@ -227,59 +230,128 @@ export class Apis extends Construct {
 			api: this.api.apiGatewayV2,
 		});
 
-		// [START] Legal Hold
-		const legalHold = new lambdaPython.PythonFunction(this, 'LegalHoldFn', {
-			runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
-			handler: 'lambda_handler',
-			index: 'main.py',
-			entry: '../api/archive/legal',
-			timeout: cdk.Duration.minutes(15),
-			environment: {
-				REGION: awsRegion,
-			},
-		});
+		// [START] Materialized views
+		// Writes a view to a Parquet table with CTAS and INSERT INTO; started by
+		// the materialize API and by the query APIs when a materialization is stale
+		const materializeView = new lambdaPython.PythonFunction(
+			this,
+			'MaterializeViewFn',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'main.py',
+				entry: '../functions/materialize-view',
+				timeout: cdk.Duration.minutes(15),
+				environment: {
+					REGION: awsRegion,
+				},
+			}
+		);
 
-		new ApiGatewayV2LambdaConstruct(this, 'LegalHoldGateway', {
-			lambdaFn: legalHold,
-			routePath: '/api/archive/legal',
-			methods: [apigwv2.HttpMethod.POST],
-			api: this.api.apiGatewayV2,
+		const materializeViewInvokePolicy = new PolicyStatement({
+			effect: Effect.ALLOW,
+			actions: ['lambda:InvokeFunction'],
+			resources: [materializeView.functionArn],
 		});
 
-		legalHold.role?.attachInlinePolicy(
-			new Policy(this, 'LegalHoldPolicy', {
+		materializeView.role?.attachInlinePolicy(
+			new Policy(this, 'MaterializeViewPolicy', {
 				statements: [
 					iam.dynamoDbReadOnlyPolicy,
 					iam.ssmGetParameterPolicy,
 					iam.dynamoDbWritePolicy,
+					iam.athenaPolicy,
+					iam.s3GetObjectAthenaQueryPolicy,
+					iam.glueCatalogPolicy,
+					iam.glueDatabasePolicy,
+					iam.glueTablePolicy,
+					iam.glueS3BucketPolicy,
+					iam.materializedViewPolicy,
+					// Kept out of the role's default policy to avoid a
+					// dependency cycle between the function and its role
+					materializeViewInvokePolicy,
 				],
 			})
 		);
+		// [END] Materialized views
 
-		legalHold.role?.attachInlinePolicy(
-			new Policy(this, 'LegalHoldInlinePolicy', {
+		// [START] Expiration
+		// Applies an operation (tagging, restore, legal hold) to every object of an archive.
+		// Object tags select the shared lifecycle rules for expiration and
+		// storage tiering, so one rule covers every archive with the same
+		// expiration date or tier.
+		const archiveObjects = new lambdaPython.PythonFunction(
+			this,
+			'ArchiveObjectsFn',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'main.py',
+				entry: '../functions/archive-objects',
+				timeout: cdk.Duration.minutes(15),
+				environment: {
+					REGION: awsRegion,
+					MAX_WORKERS: '32',
+				},
+			}
+		);
+
+		this.archiveObjects = archiveObjects;
+
+		const archiveObjectsInvokePolicy = new PolicyStatement({
+			effect: Effect.ALLOW,
+			actions: ['lambda:InvokeFunction'],
+			resources: [archiveObjects.functionArn],
+		});
+
+		// EventBridge Scheduler starts scheduled archive runs with this role
+		const archiveSchedulerRole = new Role(this, 'ArchiveSchedulerRole', {
+			assumedBy: new ServicePrincipal('scheduler.amazonaws.com'),
+		});
+		archiveSchedulerRole.addToPolicy(iam.stateMachinePolicy);
+
+		// Passed to the run API, which creates the schedules in this group
+		const archiveScheduleGroup = 'default';
+		const archiveSchedulePolicy = new PolicyStatement({
+			effect: Effect.ALLOW,
+			actions: ['scheduler:CreateSchedule', 'scheduler:UpdateSchedule'],
+			resources: [
+				`arn:aws:scheduler:${awsRegion}:${cdk.Stack.of(this).account}:schedule/${archiveScheduleGroup}/sdas-archive-*`,
+			],
+		});
+		const archiveSchedulerPassRolePolicy = new PolicyStatement({
+			effect: Effect.ALLOW,
+			actions: ['iam:PassRole'],
+			resources: [archiveSchedulerRole.roleArn],
+		});
+
+		archiveObjects.role?.attachInlinePolicy(
+			new Policy(this, 'ArchiveObjectsPolicy', {
 				statements: [
+					iam.dynamoDbReadOnlyPolicy,
+					iam.ssmGetParameterPolicy,
+					iam.dynamoDbWritePolicy,
 					new PolicyStatement({
 						effect: Effect.ALLOW,
 						actions: [
-							's3:GetBucketLocation',
-							's3:GetObject',
 							's3:ListBucket',
-							's3:ListBucketMultipartUploads',
-							's3:ListMultipartUploadParts',
-							's3:AbortMultipartUpload',
-							's3:CreateBucket',
-							's3:PutObject',
+							's3:GetObjectTagging',
+							's3:PutObjectTagging',
+							's3:DeleteObjectTagging',
+							's3:RestoreObject',
 							's3:PutObjectLegalHold',
+							// Restores of retried keys look up their storage class
+							's3:GetObject',
 						],
 						resources: ['*'],
 					}),
+					// Kept out of the role's default policy to avoid a
+					// dependency cycle between the function and its role
+					archiveObjectsInvokePolicy,
 				],
 			})
 		);
-		// [END] Legal Hold
 
-		// [START] Expiration
 		const expiration = new lambdaPython.PythonFunction(
 			this,
 			'ExpirationFn',
@@ -288,12 +360,14 @@ export class Apis extends Construct {
 				handler: 'lambda_handler',
 				index: 'main.py',
 				entry: '../api/archive/expiration',
-				timeout: cdk.Duration.minutes(15),
+				timeout: cdk.Duration.seconds(30),
 				environment: {
 					REGION: awsRegion,
+					BACKGROUND_FUNCTION: archiveObjects.functionArn,
 				},
 			}
 		);
+		archiveObjects.grantInvoke(expiration);
 
 		new ApiGatewayV2LambdaConstruct(this, 'ExpirationGateway', {
 			lambdaFn: expiration,
@@ -326,14 +400,94 @@ export class Apis extends Construct {
 							's3:AbortMultipartUpload',
 							's3:PutBucketLifecycleConfiguration',
 							's3:PutLifecycleConfiguration',
+							's3:GetLifecycleConfiguration',
 						],
 						resources: ['*'],
 					}),
 				],
 			})
 		);
+
+		// Moves archives that have not been queried for a while to colder
+		// storage classes; restores are started by the query APIs
+		const storageTiering = new lambdaPython.PythonFunction(
+			this,
+			'StorageTieringFn',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'tiering.py',
+				entry: '../api/archive/expiration',
+				timeout: cdk.Duration.minutes(15),
+				environment: {
+					REGION: awsRegion,
+					BACKGROUND_FUNCTION: archiveObjects.functionArn,
+					INTELLIGENT_TIERING_AFTER_DAYS: '30',
+					GLACIER_IR_AFTER_DAYS: '180',
+					DEEP_ARCHIVE_AFTER_DAYS: '730',
+				},
+			}
+		);
+		archiveObjects.grantInvoke(storageTiering);
+
+		storageTiering.role?.attachInlinePolicy(
+			new Policy(this, 'StorageTieringPolicy', {
+				statements: [
+					iam.dynamoDbReadOnlyPolicy,
+					iam.ssmGetParameterPolicy,
+					iam.dynamoDbWritePolicy,
+					new PolicyStatement({
+						effect: Effect.ALLOW,
+						actions: [
+							's3:GetLifecycleConfiguration',
+							's3:PutLifecycleConfiguration',
+						],
+						resources: ['*'],
+					}),
+				],
+			})
+		);
+
+		new events.Rule(this, 'StorageTieringSchedule', {
+			schedule: events.Schedule.rate(cdk.Duration.days(1)),
+			targets: [new targets.LambdaFunction(storageTiering)],
+		});
 		// [END] Expiration
 
+		// [START] Legal Hold
+		// Objects are updated by the archive-objects function, which checkpoints
+		// its progress on the archive and re-invokes itself until every page is done.
+		const legalHold = new lambdaPython.PythonFunction(this, 'LegalHoldFn', {
+			runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+			handler: 'lambda_handler',
+			index: 'main.py',
+			entry: '../api/archive/legal',
+			timeout: cdk.Duration.seconds(30),
+			environment: {
+				REGION: awsRegion,
+				BACKGROUND_FUNCTION: archiveObjects.functionArn,
+			},
+		});
+
+		new ApiGatewayV2LambdaConstruct(this, 'LegalHoldGateway', {
+			lambdaFn: legalHold,
+			routePath: '/api/archive/legal',
+			methods: [apigwv2.HttpMethod.POST],
+			api: this.api.apiGatewayV2,
+		});
+
+		legalHold.role?.attachInlinePolicy(
+			new Policy(this, 'LegalHoldPolicy', {
+				statements: [
+					iam.dynamoDbReadOnlyPolicy,
+					iam.ssmGetParameterPolicy,
+					iam.dynamoDbWritePolicy,
+				],
+			})
+		);
+		archiveObjects.grantInvoke(legalHold);
+		// [END] Legal Hold
+
 		// [START] api/archive/validate
 		const validateArchive = new lambdaPython.PythonFunction(
 			this,
@@ -398,6 +552,17 @@ export class Apis extends Construct {
 		);
 		// [START] api/archive/archive
 
+		// Modules shared by the query and view handlers (materialized view routing, scan
+		// limits), importable from /opt/python
+		const apiSharedLayer = new lambdaPython.PythonLayerVersion(
+			this,
+			'ApiSharedLayer',
+			{
+				entry: '../api/shared',
+				compatibleRuntimes: [cdk.aws_lambda.Runtime.PYTHON_3_10],
+			}
+		);
+
 		const sdasApis = [
 			{
 				name: 'TablesStatus',
@@ -482,6 +647,24 @@ export class Apis extends Construct {
 					iam.ssmGetParameterPolicy,
 				],
 			},
+			{
+				name: 'ArchivesSummary',
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'main.py',
+				entry: '../api/archives/summary',
+				timeout: cdk.Duration.seconds(30),
+				environment: {
+					REGION: awsRegion,
+				},
+				routePath: '/api/archives/summary',
+				methods: [apigwv2.HttpMethod.GET],
+				api: this.api.apiGatewayV2,
+				iamInlinePolicy: [
+					iam.dynamoDbReadOnlyPolicy,
+					iam.ssmGetParameterPolicy,
+				],
+			},
 			{
 				name: 'GetArchive',
 				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
@@ -508,6 +691,8 @@ export class Apis extends Construct {
 				timeout: cdk.Duration.minutes(5),
 				environment: {
 					REGION: awsRegion,
+					SCHEDULER_ROLE_ARN: archiveSchedulerRole.roleArn,
+					SCHEDULE_GROUP: archiveScheduleGroup,
 				},
 				routePath: '/api/job/run',
 				methods: [apigwv2.HttpMethod.POST],
@@ -518,6 +703,8 @@ export class Apis extends Construct {
 					iam.ssmGetParameterPolicy,
 					iam.stateMachinePolicy,
 					iam.glueS3BucketPolicy,
+					archiveSchedulePolicy,
+					archiveSchedulerPassRolePolicy,
 				],
 			},
 			{
@@ -526,8 +713,12 @@ export class Apis extends Construct {
 				handler: 'lambda_handler',
 				index: 'main.py',
 				entry: '../api/archive/query',
+				layers: [apiSharedLayer],
 				timeout: cdk.Duration.minutes(15),
-				environment: {},
+				environment: {
+					BACKGROUND_FUNCTION: archiveObjects.functionArn,
+					MATERIALIZE_FUNCTION: materializeView.functionArn,
+				},
 				routePath: '/api/archive/query',
 				methods: [apigwv2.HttpMethod.POST],
 				api: this.api.apiGatewayV2,
@@ -540,6 +731,30 @@ export class Apis extends Construct {
 					iam.glueDatabasePolicy,
 					iam.glueTablePolicy,
 					iam.glueS3BucketPolicy,
+					iam.dynamoDbWritePolicy,
+					archiveObjectsInvokePolicy,
+					materializeViewInvokePolicy,
+				],
+			},
+			{
+				name: 'QueryPreflight',
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'preflight.py',
+				entry: '../api/archive/query',
+				layers: [apiSharedLayer],
+				timeout: cdk.Duration.seconds(30),
+				environment: {},
+				routePath: '/api/archive/query/preflight',
+				methods: [apigwv2.HttpMethod.POST],
+				api: this.api.apiGatewayV2,
+				iamInlinePolicy: [
+					iam.ssmGetParameterPolicy,
+					iam.dynamoDbReadOnlyPolicy,
+					iam.glueCatalogPolicy,
+					iam.glueDatabasePolicy,
+					iam.glueTablePolicy,
+					iam.glueS3BucketPolicy,
 				],
 			},
 			{
@@ -548,6 +763,7 @@ export class Apis extends Construct {
 				handler: 'lambda_handler',
 				index: 'main.py',
 				entry: '../api/archive/views/list',
+				layers: [apiSharedLayer],
 				timeout: cdk.Duration.seconds(30),
 				environment: {
 					REGION: awsRegion,
@@ -582,6 +798,35 @@ export class Apis extends Construct {
 					iam.glueCatalogPolicy,
 					iam.glueDatabasePolicy,
 					iam.glueTablePolicy,
+					// Drops the view's materialized table and its lineage
+					iam.dynamoDbWritePolicy,
+					iam.glueS3BucketPolicy,
+					iam.materializedViewPolicy,
+				],
+			},
+			{
+				name: 'MaterializeView',
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'main.py',
+				entry: '../api/archive/views/materialize',
+				layers: [apiSharedLayer],
+				timeout: cdk.Duration.seconds(30),
+				environment: {
+					REGION: awsRegion,
+					MATERIALIZE_FUNCTION: materializeView.functionArn,
+				},
+				routePath: '/api/archive/views/materialize',
+				methods: [apigwv2.HttpMethod.POST],
+				api: this.api.apiGatewayV2,
+				iamInlinePolicy: [
+					iam.ssmGetParameterPolicy,
+					iam.dynamoDbReadOnlyPolicy,
+					iam.dynamoDbWritePolicy,
+					iam.glueCatalogPolicy,
+					iam.glueDatabasePolicy,
+					iam.glueTablePolicy,
+					materializeViewInvokePolicy,
 				],
 			},
 			{
@@ -590,8 +835,12 @@ export class Apis extends Construct {
 				handler: 'lambda_handler',
 				index: 'main.py',
 				entry: '../api/archive/query-full',
+				layers: [apiSharedLayer],
 				timeout: cdk.Duration.minutes(15),
-				environment: {},
+				environment: {
+					BACKGROUND_FUNCTION: archiveObjects.functionArn,
+					MATERIALIZE_FUNCTION: materializeView.functionArn,
+				},
 				routePath: '/api/archive/query-full',
 				methods: [apigwv2.HttpMethod.POST],
 				api: this.api.apiGatewayV2,
@@ -604,6 +853,9 @@ export class Apis extends Construct {
 					iam.glueDatabasePolicy,
 					iam.glueTablePolicy,
 					iam.glueS3BucketPolicy,
+					iam.dynamoDbWritePolicy,
+					archiveObjectsInvokePolicy,
+					materializeViewInvokePolicy,
 				],
 			},
 			{
@@ -614,6 +866,8 @@ export class Apis extends Construct {
 				entry: '../api/archive/download',
 				timeout: cdk.Duration.seconds(30),
 				environment: {},
+				// Exports are checked against the query scan limits
+				layers: [apiSharedLayer],
 				routePath: '/api/archive/download',
 				methods: [apigwv2.HttpMethod.POST],
 				api: this.api.apiGatewayV2,
@@ -621,6 +875,30 @@ export class Apis extends Construct {
 					iam.ssmGetParameterPolicy,
 					iam.athenaPolicy,
 					iam.s3GetObjectAthenaQueryPolicy,
+					iam.dynamoDbReadOnlyPolicy,
+					iam.dynamoDbWritePolicy,
+					// UNLOAD reads the archived tables and writes the export parts
+					iam.glueCatalogPolicy,
+					iam.glueDatabasePolicy,
+					iam.glueTablePolicy,
+					iam.glueS3BucketPolicy,
+				],
+			},
+			{
+				name: 'ReadResults',
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_10,
+				handler: 'lambda_handler',
+				index: 'main.py',
+				entry: '../api/archive/results',
+				timeout: cdk.Duration.seconds(30),
+				environment: {},
+				routePath: '/api/archive/results',
+				methods: [apigwv2.HttpMethod.POST],
+				api: this.api.apiGatewayV2,
+				iamInlinePolicy: [
+					iam.athenaPolicy,
+					// ListBucket, so a missing row index reads as NoSuchKey
+					iam.glueS3BucketPolicy,
 				],
 			},
 		];
@@ -638,6 +916,7 @@ export class Apis extends Construct {
 				methods: val.methods,
 				api: val.api,
 				iamInlinePolicy: val.iamInlinePolicy,
+				layers: val.layers,
 			});
 		}
 	}
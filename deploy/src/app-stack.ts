@@ -76,6 +76,9 @@ export class AppStack extends cdk.Stack {
 			tables.archivesTable,
 			tables.queryLookupTable,
 			tables.fetchSchemaTable,
+			tables.summaryTable,
+			tables.archiveDetailsTable,
+			tables.glueJobsTable,
 			buckets.athenaTempBucket,
 			buckets.archiveDataBucket,
 			buckets.glueAssetBucket,
@@ -34,6 +34,7 @@ export interface DasApiPythonConstructProps extends cdk.StackProps {
 	readonly methods: Array<apigwv2.HttpMethod>;
 	readonly api: apigw.HttpApi;
 	readonly iamInlinePolicy?: Array<iam.PolicyStatement>;
+	readonly layers?: Array<cdk.aws_lambda.ILayerVersion>;
 }
 
 const defaultProps: Partial<DasApiPythonConstruct> = {};
@@ -59,6 +60,7 @@ export class DasApiPythonConstruct extends Construct {
 				entry: props.entry,
 				timeout: props.timeout,
 				environment: props.environment,
+				layers: props.layers,
 			}
 		);
 
@@ -22,6 +22,7 @@ export interface DynamoDBTableProps {
 	partitionKey: { name: string; type: dynamodb.AttributeType };
 	sortKey?: { name: string; type: dynamodb.AttributeType };
 	timeToLiveAttribute?: string;
+	stream?: dynamodb.StreamViewType;
 }
 
 export class DynamoDBTableConstruct extends Construct {
@@ -39,6 +40,7 @@ export class DynamoDBTableConstruct extends Construct {
 			removalPolicy: cdk.RemovalPolicy.DESTROY,
 			pointInTimeRecovery: true,
 			timeToLiveAttribute: props.timeToLiveAttribute,
+			stream: props.stream,
 		});
 	}
 }
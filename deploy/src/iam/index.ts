@@ -32,6 +32,7 @@ export class Iam extends Construct {
 	public readonly glueDatabasePolicy: PolicyStatement;
 	public readonly glueTablePolicy: PolicyStatement;
 	public readonly glueS3BucketPolicy: PolicyStatement;
+	public readonly materializedViewPolicy: PolicyStatement;
 	public readonly awsGluePolicy: PolicyStatement;
 	public readonly stateMachinePolicy: PolicyStatement;
 	public readonly awsGluePolicyTest: PolicyStatement;
@@ -47,6 +48,9 @@ export class Iam extends Construct {
 		archivesTable: DynamoDBTableConstruct,
 		queryLookupTable: DynamoDBTableConstruct,
 		fetchSchemaTable: DynamoDBTableConstruct,
+		summaryTable: DynamoDBTableConstruct,
+		archiveDetailsTable: DynamoDBTableConstruct,
+		glueJobsTable: DynamoDBTableConstruct,
 		athenaTempBucket: S3BucketConstruct,
 		archiveDataBucket: S3BucketConstruct,
 		glueAssetBucket: S3BucketConstruct,
@@ -204,6 +208,16 @@ export class Iam extends Construct {
 			})
 		);
 
+		// Compaction gives the files it writes the lifecycle tags of the files they replace
+		this.awsGlueRole.addToPolicy(
+			new iam.PolicyStatement({
+				sid: 'GlueS3ObjectTagging',
+				effect: iam.Effect.ALLOW,
+				actions: ['s3:GetObjectTagging', 's3:PutObjectTagging'],
+				resources: [`${archiveDataBucket.bucket.bucketArn}/*`],
+			})
+		);
+
 		new ssm.StringParameter(this, 'AwsGlueRoleParameter', {
 			parameterName: '/glue/glue-role',
 			stringValue: this.awsGlueRole.roleName,
@@ -240,6 +254,9 @@ export class Iam extends Construct {
 			resources: [
 				`arn:aws:dynamodb:*:${awsAccountId}:table/${archivesTable.table.tableName}`,
 				`arn:aws:dynamodb:*:${awsAccountId}:table/${queryLookupTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${summaryTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${archiveDetailsTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${glueJobsTable.table.tableName}`,
 			],
 		});
 
@@ -278,6 +295,9 @@ export class Iam extends Construct {
 			resources: [
 				`arn:aws:dynamodb:*:${awsAccountId}:table/${archivesTable.table.tableName}`,
 				`arn:aws:dynamodb:*:${awsAccountId}:table/${queryLookupTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${summaryTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${archiveDetailsTable.table.tableName}`,
+				`arn:aws:dynamodb:*:${awsAccountId}:table/${glueJobsTable.table.tableName}`,
 			],
 		});
 
@@ -295,6 +315,9 @@ export class Iam extends Construct {
 				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/archive/query-lookup-dynamodb-table`,
 				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/glue/glue-role`,
 				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/sqs/validation`,
+				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/archive/summary-dynamodb-table`,
+				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/archive/details-dynamodb-table`,
+				`arn:aws:ssm:${awsRegion}:${awsAccountId}:parameter/archive/glue-jobs-dynamodb-table`,
 			],
 		});
 
@@ -349,6 +372,7 @@ export class Iam extends Construct {
 			actions: [
 				'glue:GetTable',
 				'glue:GetTables',
+				'glue:GetPartitions',
 				'glue:DeleteTable',
 				'glue:CreateTable',
 				'glue:UpdateTable',
@@ -375,6 +399,25 @@ export class Iam extends Construct {
 			],
 		});
 
+		// CTAS and INSERT INTO write the partitions of materialized views; their data is
+		// kept under tables/ in the Athena temp bucket
+		this.materializedViewPolicy = new iam.PolicyStatement({
+			actions: [
+				'glue:GetPartitions',
+				'glue:CreatePartition',
+				'glue:BatchCreatePartition',
+				'glue:DeletePartition',
+				'glue:BatchDeletePartition',
+				's3:DeleteObject',
+			],
+			resources: [
+				`arn:aws:glue:${awsRegion}:${awsAccountId}:catalog`,
+				`arn:aws:glue:${awsRegion}:${awsAccountId}:database/*`,
+				`arn:aws:glue:${awsRegion}:${awsAccountId}:table/*`,
+				`${athenaTempBucket.bucket.bucketArn}/tables/*`,
+			],
+		});
+
 		this.awsGluePolicy = new iam.PolicyStatement({
 			actions: [
 				'glue:GetConnection',
@@ -384,9 +427,12 @@ export class Iam extends Construct {
 				'glue:StartJobRun',
 				'glue:CreateDatabase',
 				'glue:CreateTable',
+				'glue:UpdateTable',
 				'glue:GetDatabase',
 				'glue:GetTable',
+				'glue:GetTables',
 				'glue:GetJobRun',
+				'glue:GetJobRuns',
 			],
 			resources: [`arn:aws:glue:${awsRegion}:${awsAccountId}:*`],
 		});
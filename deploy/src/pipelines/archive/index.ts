@@ -25,6 +25,9 @@ import { Iam } from '../../iam';
 import { Buckets } from '../../buckets';
 
 export class Archive extends Construct {
+	public readonly tableRetryStateMachine: cdk.aws_stepfunctions.StateMachine;
+	public readonly schedulerLayer: lambdaPython.PythonLayerVersion;
+
 	constructor(
 		scope: Construct,
 		id: string,
@@ -139,6 +142,17 @@ export class Archive extends Construct {
 			}
 		);
 
+		// The Glue scheduler module, shared by the step that starts table runs,
+		// the scheduler reconciler and the Glue job state change handler
+		this.schedulerLayer = new lambdaPython.PythonLayerVersion(
+			this,
+			'SchedulerLayer',
+			{
+				entry: '../step-functions/shared',
+				compatibleRuntimes: [cdk.aws_lambda.Runtime.PYTHON_3_9],
+			}
+		);
+
 		const stepFunctionGlueStepNine = new lambdaPython.PythonFunction(
 			this,
 			'StepFunctionGlueStepNine',
@@ -147,9 +161,16 @@ export class Archive extends Construct {
 				handler: 'lambda_handler',
 				index: 'step-nine-start-jobs.py',
 				entry: '../step-functions/aws-glue-job',
+				layers: [this.schedulerLayer],
 				timeout: cdk.Duration.minutes(5),
 				environment: {
 					REGION: awsRegion,
+					// Budget shared by all archives; keep below the account's Glue quotas
+					GLUE_MAX_DPU: '100',
+					GLUE_MAX_CONCURRENT_RUNS: '30',
+					// Defaults per source database (hostname:port)
+					SOURCE_MAX_CONNECTIONS: '10',
+					SOURCE_MAX_RUNS: '4',
 				},
 			}
 		);
@@ -234,6 +255,65 @@ export class Archive extends Construct {
 			})
 		);
 
+		// Frees scheduler slots whose run ended without its state change being handled, or
+		// whose lease expired before a run was started, and drops abandoned queue entries
+		const schedulerReconciler = new lambdaPython.PythonFunction(
+			this,
+			'StepFunctionGlueSchedulerReconciler',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_9,
+				handler: 'lambda_handler',
+				index: 'scheduler-reconciler.py',
+				entry: '../step-functions/aws-glue-job',
+				layers: [this.schedulerLayer],
+				timeout: cdk.Duration.minutes(5),
+				environment: {
+					REGION: awsRegion,
+				},
+			}
+		);
+
+		schedulerReconciler.role?.attachInlinePolicy(
+			new Policy(this, 'StepFunctionGlueSchedulerReconcilerPolicy', {
+				statements: [
+					iam.dynamoDbWritePolicy,
+					iam.dynamoDbReadOnlyPolicy,
+					iam.ssmGetParameterPolicy,
+					iam.awsGluePolicy,
+				],
+			})
+		);
+
+		new cdk.aws_events.Rule(this, 'SchedulerReconcilerSchedule', {
+			schedule: cdk.aws_events.Schedule.rate(cdk.Duration.minutes(15)),
+			targets: [new cdk.aws_events_targets.LambdaFunction(schedulerReconciler)],
+		});
+
+		// Runs wait in step nine until the shared Glue DPU budget has room
+		const capacityRetry: cdk.aws_stepfunctions.RetryProps = {
+			errors: ['GlueCapacityUnavailable'],
+			interval: cdk.Duration.seconds(30),
+			backoffRate: 1.5,
+			maxDelay: cdk.Duration.minutes(10),
+			maxAttempts: 200,
+			jitterStrategy: cdk.aws_stepfunctions.JitterType.FULL,
+		};
+
+		// Table runs pause until the archive's maintenance window opens
+		const windowRetry: cdk.aws_stepfunctions.RetryProps = {
+			errors: ['MaintenanceWindowClosed'],
+			interval: cdk.Duration.minutes(5),
+			backoffRate: 1,
+			maxAttempts: 300,
+		};
+
+		// A window that stops the archive when it closes ends the table's run; step nine marks
+		// the table skipped and the archive stopped, and a resumed run picks the table up
+		const windowEndedCatch: cdk.aws_stepfunctions.CatchProps = {
+			errors: ['MaintenanceWindowEnded'],
+			resultPath: '$.error',
+		};
+
 		const definition = new cdk.aws_stepfunctions_tasks.LambdaInvoke(
 			this,
 			'Step One - Start Status',
@@ -324,6 +404,15 @@ export class Archive extends Construct {
 							outputPath: '$.Payload',
 						}
 					)
+						.addRetry(capacityRetry)
+						.addRetry(windowRetry)
+						.addCatch(
+							new cdk.aws_stepfunctions.Pass(
+								this,
+								'Table Skipped - Window Ended'
+							),
+							windowEndedCatch
+						)
 				)
 			);
 
@@ -348,6 +437,47 @@ export class Archive extends Construct {
 			}
 		);
 
+		// Restarts a single failed table run after a backoff delay. Started by the
+		// Glue job state change handler with the input of the failed run.
+		this.tableRetryStateMachine = new cdk.aws_stepfunctions.StateMachine(
+			this,
+			'GlueTableRetryStateMachine',
+			{
+				definition: new cdk.aws_stepfunctions.Wait(
+					this,
+					'Retry Backoff',
+					{
+						time: cdk.aws_stepfunctions.WaitTime.secondsPath(
+							'$.retry_delay'
+						),
+					}
+				).next(
+					new cdk.aws_stepfunctions_tasks.LambdaInvoke(
+						this,
+						'Retry - Glue Job',
+						{
+							lambdaFunction: stepFunctionGlueStepNine,
+							outputPath: '$.Payload',
+						}
+					)
+						.addRetry(capacityRetry)
+						.addRetry(windowRetry)
+						.addCatch(
+							new cdk.aws_stepfunctions.Pass(
+								this,
+								'Retry Skipped - Window Ended'
+							),
+							windowEndedCatch
+						)
+				),
+				tracingEnabled: true,
+				logs: {
+					destination: logGroup,
+					level: cdk.aws_stepfunctions.LogLevel.ALL,
+				},
+			}
+		);
+
 		const createStateMachineParam = new ssm.StringParameter(
 			this,
 			'CreateStateMachineParam',
@@ -361,6 +491,29 @@ export class Archive extends Construct {
 			}
 		);
 
+		// Rewrites an archived table prefix into files of about
+		// --TARGET_FILE_SIZE_MB. Started on demand with --ARCHIVE_ID,
+		// --DATABASE and --TABLE.
+		new cdk.aws_glue.CfnJob(this, 'CompactionJob', {
+			name: 'sdas-compaction',
+			role: iam.awsGlueRole.roleArn,
+			command: {
+				name: 'glueetl',
+				scriptLocation: `s3://${buckets.glueAssetBucket.bucketName}/scripts/compaction-1-0-0.py`,
+				pythonVersion: '3',
+			},
+			defaultArguments: {
+				'--TempDir': `s3://${buckets.glueTempBucket.bucketName}/temp/`,
+				'--job-bookmark-option': 'job-bookmark-disable',
+				'--BUCKET': buckets.archiveDataBucket.bucketName,
+				'--TARGET_FILE_SIZE_MB': '256',
+			},
+			maxRetries: 0,
+			glueVersion: '3.0',
+			workerType: 'G.1X',
+			numberOfWorkers: 2,
+		});
+
 		new cdk.aws_s3_deployment.BucketDeployment(this, 'DeployFiles', {
 			sources: [
 				cdk.aws_s3_deployment.Source.asset('./assets/aws-glue-scripts'),
@@ -20,6 +20,8 @@ import { Apis } from '../apis';
 import { Iam } from '../iam';
 import { Buckets } from '../buckets';
 import { Validation } from './validation';
+import { Summary } from './summary';
+import { Migrations } from './migrations';
 import { Tables } from '../tables';
 
 export class Pipelines extends Construct {
@@ -36,7 +38,7 @@ export class Pipelines extends Construct {
 	) {
 		super(scope, id);
 
-		new Archive(
+		const archive = new Archive(
 			this,
 			'Archive',
 			awsAccountId,
@@ -53,7 +55,14 @@ export class Pipelines extends Construct {
 			awsAccountId,
 			awsRegion,
 			iam,
-			tables
+			tables,
+			archive.tableRetryStateMachine,
+			apis.archiveObjects,
+			archive.schedulerLayer
 		);
+
+		new Summary(this, 'Summary', awsRegion, iam, tables);
+
+		new Migrations(this, 'Migrations', awsRegion, iam, tables);
 	}
 }
@@ -0,0 +1,76 @@
+/**
+ * Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Amazon Software License (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *   https://aws.amazon.com/asl/
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+
+import { Construct } from 'constructs';
+import * as lambdaPython from '@aws-cdk/aws-lambda-python-alpha';
+import * as cdk from 'aws-cdk-lib';
+import { Policy } from 'aws-cdk-lib/aws-iam';
+import { Iam } from '../../iam';
+import { Tables } from '../../tables';
+
+export class Migrations extends Construct {
+	constructor(
+		scope: Construct,
+		id: string,
+		awsRegion: string,
+		iam: Iam,
+		tables: Tables
+	) {
+		super(scope, id);
+
+		// Moves the inline table_details and jobs of archives created before the
+		// archive details table existed into its items, on every deployment
+		const archiveDetailsMigrationFn = new lambdaPython.PythonFunction(
+			this,
+			'ArchiveDetailsMigrationFn',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_9,
+				handler: 'lambda_handler',
+				index: 'archive-details.py',
+				entry: '../functions/migrations',
+				timeout: cdk.Duration.minutes(15),
+				environment: {
+					REGION: awsRegion,
+					ARCHIVE_TABLE: tables.archivesTable.table.tableName,
+					ARCHIVE_DETAILS_TABLE:
+						tables.archiveDetailsTable.table.tableName,
+				},
+			}
+		);
+
+		archiveDetailsMigrationFn.role?.attachInlinePolicy(
+			new Policy(this, 'ArchiveDetailsMigrationFnPolicy', {
+				statements: [
+					iam.dynamoDbWritePolicy,
+					iam.dynamoDbReadOnlyPolicy,
+				],
+			})
+		);
+
+		const archiveDetailsMigrationProvider =
+			new cdk.custom_resources.Provider(
+				this,
+				'ArchiveDetailsMigrationProvider',
+				{ onEventHandler: archiveDetailsMigrationFn }
+			);
+
+		new cdk.CustomResource(this, 'ArchiveDetailsMigration', {
+			serviceToken: archiveDetailsMigrationProvider.serviceToken,
+			// Changes on every deployment, so archives restored from a
+			// backup of the old shape are migrated too
+			properties: { Deployment: Date.now().toString() },
+		});
+	}
+}
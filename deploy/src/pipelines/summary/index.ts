@@ -0,0 +1,72 @@
+/**
+ * Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+ *
+ * Licensed under the Amazon Software License (the "License").
+ * You may not use this file except in compliance with the License.
+ * A copy of the License is located at
+ *
+ *   https://aws.amazon.com/asl/
+ *
+ * or in the "license" file accompanying this file. This file is distributed
+ * on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+ * express or implied. See the License for the specific language governing
+ * permissions and limitations under the License.
+ */
+
+import { Construct } from 'constructs';
+import * as lambdaPython from '@aws-cdk/aws-lambda-python-alpha';
+import * as cdk from 'aws-cdk-lib';
+import { Policy } from 'aws-cdk-lib/aws-iam';
+import { DynamoEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
+import { Iam } from '../../iam';
+import { Tables } from '../../tables';
+
+export class Summary extends Construct {
+	constructor(
+		scope: Construct,
+		id: string,
+		awsRegion: string,
+		iam: Iam,
+		tables: Tables
+	) {
+		super(scope, id);
+
+		const archiveSummaryFn = new lambdaPython.PythonFunction(
+			this,
+			'ArchiveSummaryFn',
+			{
+				runtime: cdk.aws_lambda.Runtime.PYTHON_3_9,
+				handler: 'lambda_handler',
+				index: 'archive-summary.py',
+				entry: '../functions/streams',
+				timeout: cdk.Duration.minutes(5),
+				environment: {
+					REGION: awsRegion,
+					ARCHIVE_TABLE: tables.archivesTable.table.tableName,
+					SUMMARY_TABLE: tables.summaryTable.table.tableName,
+				},
+			}
+		);
+
+		archiveSummaryFn.role?.attachInlinePolicy(
+			new Policy(this, 'ArchiveSummaryFnPolicy', {
+				statements: [
+					iam.dynamoDbWritePolicy,
+					iam.dynamoDbReadOnlyPolicy,
+				],
+			})
+		);
+
+		// A single concurrent consumer per shard keeps the summary updates
+		// ordered; batching coalesces bursts of archive updates into one write.
+		archiveSummaryFn.addEventSource(
+			new DynamoEventSource(tables.archivesTable.table, {
+				startingPosition: cdk.aws_lambda.StartingPosition.TRIM_HORIZON,
+				batchSize: 100,
+				maxBatchingWindow: cdk.Duration.seconds(5),
+				bisectBatchOnError: true,
+				retryAttempts: 10,
+			})
+		);
+	}
+}
@@ -31,7 +31,10 @@ export class Validation extends Construct {
 		awsAccountId: string,
 		awsRegion: string,
 		iam: Iam,
-		tables: Tables
+		tables: Tables,
+		tableRetryStateMachine: cdk.aws_stepfunctions.StateMachine,
+		archiveObjects: cdk.aws_lambda.IFunction,
+		schedulerLayer: cdk.aws_lambda.ILayerVersion
 	) {
 		super(scope, id);
 
@@ -51,9 +54,12 @@ export class Validation extends Construct {
 				timeout: cdk.Duration.seconds(60),
 				environment: {
 					REGION: awsRegion,
+					// Tags the objects of a finished run for the lifecycle rules
+					ARCHIVE_OBJECTS_FUNCTION: archiveObjects.functionArn,
 				},
 			}
 		);
+		archiveObjects.grantInvoke(validationQueueFn);
 
 		validationQueueFn.role?.attachInlinePolicy(
 			new Policy(this, 'ValidationQueueFnPolicy', {
@@ -87,8 +93,12 @@ export class Validation extends Construct {
 			],
 		});
 
+		// Messages are grouped by archive; a batch updates each archive's counter once
 		validationQueueFn.addEventSource(
-			new SqsEventSource(sqsFifoValidation, {})
+			new SqsEventSource(sqsFifoValidation, {
+				batchSize: 10,
+				reportBatchItemFailures: true,
+			})
 		);
 
 		/*
@@ -105,7 +115,9 @@ export class Validation extends Construct {
 				index: 'step-one-get-schema.py',
 				entry: '../step-functions/validation',
 				timeout: cdk.Duration.minutes(5),
-				environment: {},
+				environment: {
+					ARCHIVE_DETAILS_TABLE: tables.archiveDetailsTable.table.tableName,
+				},
 			}
 		);
 
@@ -298,7 +310,7 @@ export class Validation extends Construct {
 			backoffRate: 2.5,
 		};
 
-		const validationDefinition =
+		const validateTable =
 			new cdk.aws_stepfunctions_tasks.LambdaInvoke(
 				this,
 				'Step One - Get Schema',
@@ -372,6 +384,25 @@ export class Validation extends Construct {
 					)
 				);
 
+		// The Glue job status handler starts one execution per archive for the tables whose
+		// runs succeeded in the same batch. A table whose validation fails does not stop the
+		// validation of the others.
+		const validationDefinition = new cdk.aws_stepfunctions.Map(
+			this,
+			'Validate Tables',
+			{
+				maxConcurrency: 10,
+				itemsPath: cdk.aws_stepfunctions.JsonPath.stringAt('$.tables'),
+			}
+		).iterator(
+			new cdk.aws_stepfunctions.Parallel(this, 'Validate Table')
+				.branch(validateTable)
+				.addCatch(
+					new cdk.aws_stepfunctions.Pass(this, 'Table Validation Failed'),
+					{ resultPath: '$.error' }
+				)
+		);
+
 		const validationLogGroup = new cdk.aws_logs.LogGroup(
 			this,
 			'ValidationStateMachineLog',
@@ -414,10 +445,19 @@ export class Validation extends Construct {
 				handler: 'lambda_handler',
 				index: 'glue-job-status.py',
 				entry: '../functions/eventbridge',
-				timeout: cdk.Duration.seconds(30),
+				layers: [schedulerLayer],
+				timeout: cdk.Duration.minutes(5),
 				environment: {
 					REGION: awsRegion,
 					ARCHIVE_TABLE: tables.archivesTable.table.tableName,
+					ARCHIVE_DETAILS_TABLE:
+						tables.archiveDetailsTable.table.tableName,
+					SUMMARY_TABLE: tables.summaryTable.table.tableName,
+					GLUE_JOBS_TABLE: tables.glueJobsTable.table.tableName,
+					TABLE_RETRY_STATE_MACHINE:
+						tableRetryStateMachine.stateMachineArn,
+					// Attempts per table, including the first run
+					MAX_TABLE_ATTEMPTS: '3',
 					VALIDATION_STATE_MACHINE:
 						validationStateMachine.stateMachineArn,
 				},
@@ -448,6 +488,7 @@ export class Validation extends Construct {
 					iam.awsGluePolicy,
 					iam.awsGluePolicyTest,
 					iam.stateMachinePolicy,
+					iam.glueS3BucketPolicy,
 				],
 			})
 		);
@@ -488,16 +529,53 @@ export class Validation extends Construct {
 			})
 		);
 
+		/*
+		 * START
+		 * SQS Queue for Glue Job State Changes
+		 */
+
+		// Glue job state changes are queued and handled in batches, so that runs of the same
+		// archive ending together update the archive once and start one validation
+		const glueJobStatusDeadLetterQueue = new sqs.Queue(
+			this,
+			'GlueJobStatusDeadLetterQueue',
+			{
+				encryption: sqs.QueueEncryption.SQS_MANAGED,
+				retentionPeriod: Duration.days(14),
+			}
+		);
+
+		const glueJobStatusQueue = new sqs.Queue(this, 'GlueJobStatusQueue', {
+			encryption: sqs.QueueEncryption.SQS_MANAGED,
+			// Six times the function timeout, so a batch is not redelivered while it is handled
+			visibilityTimeout: Duration.minutes(30),
+			deadLetterQueue: {
+				queue: glueJobStatusDeadLetterQueue,
+				maxReceiveCount: 5,
+			},
+		});
+
+		glueJobStatusFn.addEventSource(
+			new SqsEventSource(glueJobStatusQueue, {
+				batchSize: 100,
+				maxBatchingWindow: Duration.seconds(30),
+				reportBatchItemFailures: true,
+			})
+		);
+
 		new cdk.aws_events.Rule(this, `GlueJobStatusRule`, {
 			eventPattern: {
 				source: [`aws.glue`],
 				detailType: ['Glue Job State Change'],
 			},
-			targets: [
-				new cdk.aws_events_targets.LambdaFunction(glueJobStatusFn),
-			],
+			targets: [new cdk.aws_events_targets.SqsQueue(glueJobStatusQueue)],
 		});
 
+		/*
+		 * END
+		 * SQS Queue for Glue Job State Changes
+		 */
+
 		new cdk.aws_events.Rule(this, `AthenaJobStatusRule`, {
 			eventPattern: {
 				source: [`aws.athena`],
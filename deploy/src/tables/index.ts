@@ -22,6 +22,9 @@ export class Tables extends Construct {
 	public readonly archivesTable: DynamoDBTableConstruct;
 	public readonly queryLookupTable: DynamoDBTableConstruct;
 	public readonly fetchSchemaTable: DynamoDBTableConstruct;
+	public readonly summaryTable: DynamoDBTableConstruct;
+	public readonly archiveDetailsTable: DynamoDBTableConstruct;
+	public readonly glueJobsTable: DynamoDBTableConstruct;
 
 	constructor(scope: Construct, id: string) {
 		super(scope, id);
@@ -33,6 +36,45 @@ export class Tables extends Construct {
 				name: 'id',
 				type: cdk.aws_dynamodb.AttributeType.STRING,
 			},
+			stream: cdk.aws_dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
+		});
+
+		// Create Archive Details Table (per-table and per-job child items of an archive)
+		this.archiveDetailsTable = new DynamoDBTableConstruct(
+			this,
+			'ArchiveDetailsTable',
+			{
+				tableName: 'ArchiveDetails',
+				partitionKey: {
+					name: 'archive_id',
+					type: cdk.aws_dynamodb.AttributeType.STRING,
+				},
+				sortKey: {
+					name: 'item_key',
+					type: cdk.aws_dynamodb.AttributeType.STRING,
+				},
+			}
+		);
+
+		// Create Glue Jobs Table (maps a Glue job name to its archive and table)
+		this.glueJobsTable = new DynamoDBTableConstruct(this, 'GlueJobsTable', {
+			tableName: 'GlueJobs',
+			partitionKey: {
+				name: 'job_name',
+				type: cdk.aws_dynamodb.AttributeType.STRING,
+			},
+			timeToLiveAttribute: 'ttl',
+		});
+
+		// Create Archive Summary Table (maintained from the Archives table stream); the daily
+		// scan totals of users expire through ttl
+		this.summaryTable = new DynamoDBTableConstruct(this, 'SummaryTable', {
+			tableName: 'ArchiveSummary',
+			partitionKey: {
+				name: 'id',
+				type: cdk.aws_dynamodb.AttributeType.STRING,
+			},
+			timeToLiveAttribute: 'ttl',
 		});
 
 		// Create Query Lookup Table
@@ -79,5 +121,32 @@ export class Tables extends Construct {
 			tier: ssm.ParameterTier.STANDARD,
 			allowedPattern: '.*',
 		});
+
+		new ssm.StringParameter(this, 'ArchiveDetailsDynamoDBTableParam', {
+			parameterName: '/archive/details-dynamodb-table',
+			stringValue: this.archiveDetailsTable.table.tableName,
+			description: 'Table name for per-table and per-job archive items.',
+			type: ssm.ParameterType.STRING,
+			tier: ssm.ParameterTier.STANDARD,
+			allowedPattern: '.*',
+		});
+
+		new ssm.StringParameter(this, 'GlueJobsDynamoDBTableParam', {
+			parameterName: '/archive/glue-jobs-dynamodb-table',
+			stringValue: this.glueJobsTable.table.tableName,
+			description: 'Table name for the archive and table of each Glue job.',
+			type: ssm.ParameterType.STRING,
+			tier: ssm.ParameterTier.STANDARD,
+			allowedPattern: '.*',
+		});
+
+		new ssm.StringParameter(this, 'SummaryDynamoDBTableParam', {
+			parameterName: '/archive/summary-dynamodb-table',
+			stringValue: this.summaryTable.table.tableName,
+			description: 'Table name for aggregated archive counters.',
+			type: ssm.ParameterType.STRING,
+			tier: ssm.ParameterTier.STANDARD,
+			allowedPattern: '.*',
+		});
 	}
 }
@@ -0,0 +1,332 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import json
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+REGION = os.getenv("REGION")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "32"))
+# Stop picking up new pages when less than this is left of the invocation
+RESUME_THRESHOLD_MS = int(os.getenv("RESUME_THRESHOLD_MS", "60000"))
+# Storage classes whose objects have to be restored before they can be read
+RESTORE_STORAGE_CLASSES = ("GLACIER", "DEEP_ARCHIVE")
+# Keys of failed objects kept on the job for a resumed run to retry; when more objects fail,
+# the resumed run walks the whole archive again
+MAX_FAILED_KEYS = int(os.getenv("MAX_FAILED_KEYS", "500"))
+
+s3_client = boto3.client('s3', config=Config(max_pool_connections=MAX_WORKERS))
+lambda_client = boto3.client('lambda')
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+ssm = boto3.client('ssm')
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+
+
+class StaleRunError(Exception):
+    """Raised when a newer request has replaced the run being processed."""
+
+
+def set_tag(bucket_name, item, event):
+    """
+    Sets the tag_key tag of an object, or every tag of event["tags"], removing the tags whose
+    value is empty and keeping the object's other tags.
+    """
+
+    tags = event.get("tags") or {event["tag_key"]: event.get("tag_value", "")}
+
+    tag_set = s3_client.get_object_tagging(Bucket=bucket_name, Key=item["Key"])["TagSet"]
+    new_tag_set = [tag for tag in tag_set if tag["Key"] not in tags]
+    new_tag_set.extend({'Key': key, 'Value': value} for key, value in tags.items() if value)
+
+    if sorted(new_tag_set, key=lambda tag: tag["Key"]) == sorted(tag_set, key=lambda tag: tag["Key"]):
+        return
+    if new_tag_set:
+        s3_client.put_object_tagging(
+            Bucket=bucket_name, Key=item["Key"], Tagging={'TagSet': new_tag_set})
+    else:
+        s3_client.delete_object_tagging(Bucket=bucket_name, Key=item["Key"])
+
+
+def restore(bucket_name, item, event):
+    """
+    Requests a temporary restore of an archived object. Objects in other storage classes
+    and restores that are already running are left alone.
+    """
+
+    storage_class = item.get("StorageClass")
+    if storage_class is None:
+        # Keys retried from an earlier run carry no listing metadata
+        storage_class = s3_client.head_object(
+            Bucket=bucket_name, Key=item["Key"]).get("StorageClass", "STANDARD")
+    if storage_class not in RESTORE_STORAGE_CLASSES:
+        return
+    try:
+        s3_client.restore_object(
+            Bucket=bucket_name,
+            Key=item["Key"],
+            RestoreRequest={
+                'Days': int(event.get("restore_days", 7)),
+                'GlacierJobParameters': {'Tier': event.get("restore_tier", "Standard")}
+            }
+        )
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "RestoreAlreadyInProgress":
+            raise
+
+
+def legal_hold(bucket_name, item, event):
+    """
+    Sets the legal hold status of an object to event["legal_hold"], 'ON' or 'OFF'.
+    """
+
+    s3_client.put_object_legal_hold(
+        Bucket=bucket_name, Key=item["Key"], LegalHold={'Status': event["legal_hold"]})
+
+
+OPERATIONS = {
+    "tag": set_tag,
+    "restore": restore,
+    "legal_hold": legal_hold,
+}
+
+
+def process_object(bucket_name, item, event):
+    """
+    Applies the operation of the run to a single object.
+
+    Returns:
+    bool: True if the object was processed.
+    """
+
+    try:
+        OPERATIONS[event["operation"]](bucket_name, item, event)
+        return True
+    except Exception:
+        logger.error(f'Failed to {event["operation"]} {item["Key"]}: {traceback.format_exc()}')
+        return False
+
+
+def process_items(executor, bucket_name, items, event):
+    """
+    Applies the operation of the run to a batch of objects over the thread pool.
+
+    Returns:
+    list: The keys of the objects that failed.
+    """
+
+    results = list(executor.map(lambda item: process_object(bucket_name, item, event), items))
+    return [item["Key"] for item, processed in zip(items, results) if not processed]
+
+
+def update_job(table, archive_id, job, run_id, update_expression, expression_values, expression_names=None):
+    """
+    Updates the job attribute of the archive if it still belongs to this run.
+    """
+
+    update_args = {
+        'Key': {'id': archive_id},
+        'UpdateExpression': update_expression,
+        'ConditionExpression': "#job.run_id = :r",
+        'ExpressionAttributeNames': {'#job': job, **(expression_names or {})},
+        'ExpressionAttributeValues': {**expression_values, ':r': run_id},
+        'ReturnValues': "UPDATED_NEW"
+    }
+    if '#status' in update_expression:
+        update_args['ExpressionAttributeNames']['#status'] = 'status'
+
+    try:
+        return table.update_item(**update_args)
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        raise StaleRunError(run_id)
+
+
+def save_progress(table, archive_id, job, run_id, processed, failed_keys, stored_keys,
+                  set_clauses=(), remove_paths=(), expression_values=None):
+    """
+    Adds the counters of a batch to the job and keeps the keys that failed, up to MAX_FAILED_KEYS
+    across the run.
+
+    Returns:
+    int: The number of failed keys stored on the job.
+    """
+
+    clauses = ["#job.objects_processed = #job.objects_processed + :p",
+               "#job.objects_failed = #job.objects_failed + :f", *set_clauses]
+    values = {':p': processed, ':f': len(failed_keys), **(expression_values or {})}
+
+    kept = failed_keys[:max(MAX_FAILED_KEYS - stored_keys, 0)]
+    if kept:
+        clauses.append("#job.failed_keys = list_append(if_not_exists(#job.failed_keys, :empty), :k)")
+        values[':empty'] = []
+        values[':k'] = kept
+    if len(kept) < len(failed_keys):
+        clauses.append("#job.failed_keys_truncated = :true")
+        values[':true'] = True
+
+    update_expression = "SET " + ", ".join(clauses)
+    if remove_paths:
+        update_expression += " REMOVE " + ", ".join(remove_paths)
+    update_job(table, archive_id, job, run_id, update_expression, values)
+    return stored_keys + len(kept)
+
+
+def finish_run(table, archive_id, job_attribute, run_id, completed_updates):
+    """
+    Marks the run Completed if every object was processed, Failed otherwise, and on completion
+    sets the archive attributes in completed_updates (e.g. the archive's legal hold state).
+    """
+
+    job = table.get_item(
+        Key={'id': archive_id},
+        ProjectionExpression="#job",
+        ExpressionAttributeNames={'#job': job_attribute},
+        ConsistentRead=True
+    ).get("Item", {}).get(job_attribute, {})
+
+    if job.get("objects_failed", 0):
+        update_job(table, archive_id, job_attribute, run_id, "SET #job.#status = :s", {':s': 'Failed'})
+        return
+
+    clauses = ["#job.#status = :s"]
+    values = {':s': 'Completed'}
+    names = {}
+    for index, (name, value) in enumerate((completed_updates or {}).items()):
+        clauses.append(f"#u{index} = :u{index}")
+        names[f'#u{index}'] = name
+        values[f':u{index}'] = value
+    update_job(table, archive_id, job_attribute, run_id, "SET " + ", ".join(clauses), values, names)
+
+
+def lambda_handler(event, context):
+    """
+    Applies an operation to every object of an archive in the background.
+
+    Operations are "tag", which sets or removes one object tag (used for the expiration and
+    storage tier lifecycle rules), "restore", which restores archived objects for querying, and
+    "legal_hold", which sets the legal hold status of the objects. Pages of up to 1000 keys are
+    processed over a bounded thread pool and the continuation token is checkpointed on the
+    archive's job attribute after each page; the function re-invokes itself before it runs out
+    of time and resumes from the checkpoint.
+
+    The keys of failed objects are kept on the job (up to MAX_FAILED_KEYS). A resumed run gets
+    them back as retry_keys, retries them first, and walks only what the earlier run had not
+    listed yet.
+
+    :param event: {"archive_id": str, "run_id": str, "job": str, "operation": "tag" | "restore" | "legal_hold",
+                   "tag_key": str, "tag_value": str, "tags": dict, "restore_days": int, "restore_tier": str,
+                   "legal_hold": "ON" | "OFF", "completed_updates": dict}
+    :type event: dict
+    :param context: A dictionary with information about the Lambda execution environment.
+    :type context: dict
+    :return: The input event dictionary.
+    :rtype: dict
+    """
+
+    logger.info(json.dumps(event))
+
+    archive_id = event["archive_id"]
+    job_attribute = event["job"]
+    run_id = event["run_id"]
+
+    bucket_parameter = ssm.get_parameter(
+        Name='/job/s3-bucket-table-data', WithDecryption=True)
+    bucket_name = bucket_parameter['Parameter']['Value']
+
+    parameter = ssm.get_parameter(
+        Name='/archive/dynamodb-table', WithDecryption=True)
+    table = dynamodb.Table(parameter['Parameter']['Value'])
+
+    try:
+        archive = table.get_item(
+            Key={'id': archive_id},
+            ProjectionExpression="#job",
+            ExpressionAttributeNames={'#job': job_attribute},
+            ConsistentRead=True
+        )
+        job = archive.get("Item", {}).get(job_attribute, {})
+        if job.get("run_id") != run_id:
+            logger.info(f"Run {run_id} of {job_attribute} was superseded, stopping")
+            return event
+
+        continuation_token = job.get("continuation_token")
+        stored_keys = len(job.get("failed_keys", []))
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            retry_keys = job.get("retry_keys", [])
+            if retry_keys:
+                failed_keys = process_items(executor, bucket_name, [{"Key": key} for key in retry_keys], event)
+                stored_keys = save_progress(table, archive_id, job_attribute, run_id,
+                                            len(retry_keys) - len(failed_keys), failed_keys, stored_keys,
+                                            remove_paths=["#job.retry_keys"])
+
+            while not job.get("listing_complete"):
+                list_args = {'Bucket': bucket_name, 'Prefix': archive_id + "/"}
+                if continuation_token:
+                    list_args['ContinuationToken'] = continuation_token
+                page = s3_client.list_objects_v2(**list_args)
+
+                items = page.get("Contents", [])
+                failed_keys = process_items(executor, bucket_name, items, event)
+
+                continuation_token = page.get("NextContinuationToken")
+                if continuation_token:
+                    stored_keys = save_progress(table, archive_id, job_attribute, run_id,
+                                                len(items) - len(failed_keys), failed_keys, stored_keys,
+                                                set_clauses=["#job.continuation_token = :t"],
+                                                expression_values={':t': continuation_token})
+                else:
+                    # A resumed run retries the failed keys instead of listing the archive again
+                    stored_keys = save_progress(table, archive_id, job_attribute, run_id,
+                                                len(items) - len(failed_keys), failed_keys, stored_keys,
+                                                set_clauses=["#job.listing_complete = :true"],
+                                                remove_paths=["#job.continuation_token"],
+                                                expression_values={':true': True})
+                    break
+
+                if context.get_remaining_time_in_millis() < RESUME_THRESHOLD_MS:
+                    lambda_client.invoke(
+                        FunctionName=context.invoked_function_arn,
+                        InvocationType="Event",
+                        Payload=json.dumps(event)
+                    )
+                    return event
+
+        finish_run(table, archive_id, job_attribute, run_id, event.get("completed_updates"))
+
+    except StaleRunError:
+        logger.info(f"Run {run_id} of {job_attribute} was superseded, stopping")
+    except Exception:
+        logger.error(traceback.format_exc())
+        try:
+            update_job(table, archive_id, job_attribute, run_id,
+                       "SET #job.#status = :s", {':s': 'Failed'})
+        except StaleRunError:
+            pass
+        raise
+
+    return event
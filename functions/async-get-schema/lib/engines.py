@@ -0,0 +1,55 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+from lib import mysql
+from lib import mssql
+from lib import oracle
+from lib import postgresql
+
+CONNECTIONS = {
+    "mysql": mysql.Connection,
+    "mssql": mssql.Connection,
+    "oracle": oracle.Connection,
+    "postgresql": postgresql.Connection,
+}
+
+
+def get_tables(data):
+    """
+    Reads the schema of every table of the source database.
+
+    Oracle schemas are read once per owner in the comma separated oracle_owner, and each
+    table records the owner it belongs to.
+
+    Raises:
+    ValueError: If the engine is not supported.
+    """
+
+    database_engine = data["database_engine"]
+    if database_engine not in CONNECTIONS:
+        raise ValueError(f"Unsupported database engine: {database_engine}")
+
+    connection_args = (data["hostname"], data["port"], data["username"], data["password"], data["database"])
+
+    if database_engine == "oracle":
+        tables = []
+        for owner in data["oracle_owner"].split(","):
+            connection = oracle.Connection(*connection_args, owner)
+            for table in connection.get_schema():
+                table["oracle_owner"] = owner
+                tables.append(table)
+        return tables
+
+    return CONNECTIONS[database_engine](*connection_args).get_schema()
@@ -18,10 +18,7 @@ import logging
 import os
 import traceback
 import boto3
-from lib import mysql
-from lib import mssql
-from lib import oracle
-from lib import postgresql
+from lib import engines
 
 REGION = os.getenv("REGION")
 DYNAMODB_TABLE = os.getenv("DYNAMODB_TABLE")
@@ -82,37 +79,7 @@ def lambda_handler(event, context):
         update_dynamodb(job_id, "In Progress")
 
         # Database connection and data fetching logic
-        hostname = data["hostname"]
-        port = data["port"]
-        username = data["username"]
-        password = data["password"]
-        database = data["database"]
-        database_engine = data["database_engine"]
-
-        tables = []
-
-        if database_engine == "oracle":
-            oracle_owner = data["oracle_owner"]
-            oracle_owner_list = oracle_owner.split(",")
-
-            for owner in oracle_owner_list:
-                oracle_connection = oracle.Connection(hostname, port, username, password, database, owner)
-                tables_connection = oracle_connection.get_schema()
-                for table in tables_connection:
-                    table["oracle_owner"] = owner
-                    tables.append(table)
-
-        elif database_engine == "mysql":
-            connection = mysql.Connection(hostname, port, username, password, database)
-            tables = connection.get_schema()
-
-        elif database_engine == "mssql":
-            connection = mssql.Connection(hostname, port, username, password, database)
-            tables = connection.get_schema()
-
-        elif database_engine == "postgresql":
-            connection = postgresql.Connection(hostname, port, username, password, database)
-            tables = connection.get_schema()
+        tables = engines.get_tables(data)
 
         # Update DynamoDB with the results
         update_dynamodb(job_id, "Completed", tables)
@@ -16,54 +16,207 @@ permissions and limitations under the License.
 import boto3
 import json
 import os
+from decimal import Decimal
 
 REGION = os.getenv("REGION")
+# Results above this size are stored in S3 and the table item keeps a pointer, which keeps the
+# item well below the DynamoDB item size limit
+MAX_INLINE_RESULT_BYTES = int(os.getenv("MAX_INLINE_RESULT_BYTES", str(32 * 1024)))
+RESULT_PAGE_SIZE = 1000
+INTEGER_TYPES = ("tinyint", "smallint", "integer", "bigint")
+NUMBER_TYPES = ("float", "real", "double", "decimal")
 
 client = boto3.client("athena")
+s3 = boto3.client('s3')
 sqs = boto3.client('sqs')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 ssm = boto3.client('ssm')
 
 
-# Get Athena Response
-def get_athena_response(query_execution_id):
-    response = client.get_query_results(
-        QueryExecutionId=query_execution_id,
-        MaxResults=123
-    )
-    return response
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+def parse_value(value, column_type):
+    """
+    Converts an Athena result value to the Python type of its column; numbers become int or
+    Decimal so that they can be stored in DynamoDB.
+    """
+
+    if value is None:
+        return None
+    if column_type in INTEGER_TYPES:
+        return int(value)
+    if column_type in NUMBER_TYPES:
+        number = Decimal(value)
+        return number if number.is_finite() else value
+    if column_type == "boolean":
+        return value == "true"
+    return value
+
+
+def get_query_results(query_execution_id):
+    """
+    Returns the column names and the typed rows of a query's results, reading every page.
+
+    Returns:
+    tuple: The column names and the rows, each a list of values.
+    """
+
+    columns = []
+    column_types = []
+    rows = []
+    paginator = client.get_paginator("get_query_results")
+    for page in paginator.paginate(
+            QueryExecutionId=query_execution_id,
+            PaginationConfig={"PageSize": RESULT_PAGE_SIZE}):
+        page_rows = page["ResultSet"]["Rows"]
+        if not columns:
+            column_info = page["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+            columns = [column["Name"] for column in column_info]
+            column_types = [column["Type"].lower() for column in column_info]
+            # The first page of a SELECT starts with a header row of the column names
+            page_rows = page_rows[1:]
+        for row in page_rows:
+            rows.append([
+                parse_value(data.get("VarCharValue"), column_type)
+                for data, column_type in zip(row["Data"], column_types)
+            ])
+    return columns, rows
+
+
+def store_results(archive_id, table_name, validation_type, columns, rows):
+    """
+    Returns the validation attributes holding a query's results: the rows themselves when they
+    are small, or otherwise the S3 location of a JSON object with the columns and rows, next to
+    the archive's data.
+    """
+
+    body = json.dumps({"columns": columns, "rows": rows}, cls=DecimalEncoder)
+    if len(body.encode("utf-8")) <= MAX_INLINE_RESULT_BYTES:
+        return {"columns": columns, "results": rows, "results_location": None, "results_rows": len(rows)}
+
+    bucket_parameter = ssm.get_parameter(
+        Name='/job/s3-bucket-table-data', WithDecryption=True)
+    bucket_name = bucket_parameter['Parameter']['Value']
+    # Outside the table prefixes, so the results are not read as archived data
+    key = f'{archive_id}/_validation/{table_name}/{validation_type}.json'
+    # The archive bucket has Object Lock enabled, which requires a checksum on every upload
+    s3.put_object(Bucket=bucket_name, Key=key, Body=body.encode("utf-8"), ContentType="application/json",
+                  ChecksumAlgorithm="SHA256")
+    return {
+        "columns": columns,
+        "results": [],
+        "results_location": f's3://{bucket_name}/{key}',
+        "results_rows": len(rows),
+    }
 
 
 # Set Job State Function
-def update_validation_state(archive_id, query_execution_id, table_name, validation_type, athena_response, query,
-                            status_message):
+def update_validation_state(archive_id, query_execution_id, table_name, validation_type, query, status_message):
     parameter = ssm.get_parameter(
         Name='/archive/dynamodb-table', WithDecryption=True)
+    details_parameter = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
     table = dynamodb.Table(parameter['Parameter']['Value'])
-    dynamodb_response = table.get_item(Key={"id": archive_id})
+    details_table = dynamodb.Table(details_parameter['Parameter']['Value'])
 
     sqs_parameter = ssm.get_parameter(
         Name='/sqs/validation', WithDecryption=True)
     sqs_parameter_value = sqs_parameter['Parameter']['Value']
     print(sqs_parameter_value)
 
-    for index, item in enumerate(dynamodb_response["Item"]["table_details"]):
-        if item["table"] == table_name:
-            table.update_item(
-                Key={'id': archive_id},
-                UpdateExpression=f'set table_details[{index}].{validation_type} = :newJob',
-                ExpressionAttributeValues={
-                    ':newJob': {
-                        "query_execution_id": query_execution_id,
-                        "query": query,
-                        "state": status_message,
-                        "results": athena_response["ResultSet"]["Rows"]
-                    }
-                }
-            )
+    columns, rows = get_query_results(query_execution_id)
+
+    # The archived row count is compared with the source rows the Glue job counted for the same
+    # range. Only a count bounded by a row filter or chunk key ranges has to match; the count of an
+    # unbounded live table can change while it is read, so its mismatch is a warning.
+    rows_archived = None
+    count_mismatch = None
+    count_warning = None
+    if validation_type == "count_validation":
+        rows_archived = int(rows[0][0])
+        count_validation = details_table.get_item(
+            Key={'archive_id': archive_id, 'item_key': f'table#{table_name}'},
+            ProjectionExpression="count_validation.source_count, count_validation.source_bounded",
+            ConsistentRead=True
+        ).get("Item", {}).get("count_validation", {})
+        source_count = count_validation.get("source_count")
+        if source_count is None:
+            count_warning = f"{rows_archived} rows archived; the Glue job recorded no source row count"
+        elif int(source_count) != rows_archived:
+            difference = f"{rows_archived} rows archived, {int(source_count)} source rows"
+            if count_validation.get("source_bounded"):
+                count_mismatch = difference
+                status_message = "FAILED"
+            else:
+                count_warning = f"{difference}; the table has no row filter, rows may have changed while it was read"
+
+    validation = {
+        "query_execution_id": query_execution_id,
+        "query": query,
+        "state": status_message,
+        **store_results(archive_id, table_name, validation_type, columns, rows)
+    }
+    if validation_type == "count_validation":
+        validation["matches_source"] = count_mismatch is None and count_warning is None
+        validation["warning"] = count_warning is not None
+        validation["message"] = count_mismatch or count_warning or f"{rows_archived} rows archived, matching the source"
+
+    # Set the validation's attributes one by one, keeping the ones the validation step stored
+    # when it started the query, such as the source count
+    clauses = []
+    expression_names = {'#v': validation_type}
+    expression_values = {}
+    for index, (attribute, value) in enumerate(validation.items()):
+        expression_names[f'#a{index}'] = attribute
+        expression_values[f':a{index}'] = value
+        clauses.append(f'#v.#a{index} = :a{index}')
+
+    # Track the archived row count for the summary counters. The per-table count is
+    # overwritten, so only the difference to the previous run is added to the archive.
+    if validation_type == "count_validation":
+        clauses.append('rows_archived = :r')
+        expression_values[':r'] = rows_archived
+
+    details_response = details_table.update_item(
+        Key={'archive_id': archive_id, 'item_key': f'table#{table_name}'},
+        UpdateExpression="SET " + ", ".join(clauses),
+        ConditionExpression='attribute_exists(item_key)',
+        ExpressionAttributeNames=expression_names,
+        ExpressionAttributeValues=expression_values,
+        ReturnValues="UPDATED_OLD"
+    )
+
+    if rows_archived is not None:
+        previous_rows = details_response.get("Attributes", {}).get("rows_archived", 0)
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="ADD rows_archived :r",
+            ExpressionAttributeValues={
+                ':r': rows_archived - int(previous_rows)
+            }
+        )
+
+    if count_warning:
+        print(f"Count validation of table {table_name}: {count_warning}")
+    if count_mismatch:
+        # Like a failed validation query, the archive fails and the table is re-extracted on resume
+        print(f"Count validation of table {table_name} failed: {count_mismatch}")
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="SET archive_status= :s",
+            ExpressionAttributeValues={':s': 'Failed'},
+            ReturnValues="UPDATED_NEW"
+        )
+        return
 
     # Send message to SQS queue
-    message = {"archive_id": archive_id}
+    # The query execution ID keeps a redelivered message from being counted twice
+    message = {"archive_id": archive_id, "query_execution_id": query_execution_id}
     response = sqs.send_message(
         QueueUrl=str(sqs_parameter_value),
         MessageGroupId=archive_id,
@@ -90,7 +243,6 @@ def get_archive(query_execution_id):
 def lambda_handler(event, context):
     archive_id, table_name, validation_type, query = get_archive(
         event["detail"]["queryExecutionId"])
-    athena_response = get_athena_response(event["detail"]["queryExecutionId"])
 
     if event["detail"]["currentState"] == "SUCCEEDED":
 
@@ -99,7 +251,6 @@ def lambda_handler(event, context):
             event["detail"]["queryExecutionId"],
             table_name,
             validation_type,
-            athena_response,
             query,
             "SUCCEEDED"
         )
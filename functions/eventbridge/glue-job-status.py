@@ -17,20 +17,33 @@ import os
 import boto3
 import uuid
 import json
+import traceback
+# Shared with the Glue state machine through a Lambda layer
+import scheduler
 
 REGION = os.getenv("REGION")
 ARCHIVE_TABLE = os.environ["ARCHIVE_TABLE"]
+ARCHIVE_DETAILS_TABLE = os.environ["ARCHIVE_DETAILS_TABLE"]
+SUMMARY_TABLE = os.environ["SUMMARY_TABLE"]
+GLUE_JOBS_TABLE = os.environ["GLUE_JOBS_TABLE"]
 VALIDATION_STATE_MACHINE = os.environ["VALIDATION_STATE_MACHINE"]
+TABLE_RETRY_STATE_MACHINE = os.environ["TABLE_RETRY_STATE_MACHINE"]
+MAX_TABLE_ATTEMPTS = int(os.getenv("MAX_TABLE_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = int(os.getenv("RETRY_BASE_DELAY_SECONDS", "300"))
+RETRY_MAX_DELAY_SECONDS = int(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600"))
+VALIDATION_TABLES_PER_EXECUTION = int(os.getenv("VALIDATION_TABLES_PER_EXECUTION", "500"))
 
 dynamodb_client = boto3.resource('dynamodb', region_name=REGION)
 glue_client = boto3.client('glue', region_name=REGION)
 step_functions_client = boto3.client('stepfunctions')
+s3_client = boto3.client('s3')
+ssm = boto3.client('ssm')
 
 
 def update_job_state(archive_id, job_run_id, job_name, job_message, job_state, job_timestamp, table_name, started_on,
                      completed_on):
     """
-    Updates the state of a job run in a DynamoDB table.
+    Updates the state of a job run in its per-job item of the archive details table.
 
     Args:
     id (str): The ID of the job.
@@ -39,7 +52,7 @@ def update_job_state(archive_id, job_run_id, job_name, job_message, job_state, j
     job_message (str): The message associated with the job run.
     job_state (str): The state of the job run.
     job_timestamp (datetime): The timestamp of the job run.
-    table_name (str): The name of the DynamoDB table to update.
+    table_name (str): The name of the DynamoDB archive details table to update.
     started_on (datetime): The timestamp when the job was started.
     completed_on (datetime): The timestamp when the job was completed.
 
@@ -56,123 +69,383 @@ def update_job_state(archive_id, job_run_id, job_name, job_message, job_state, j
     table = dynamodb_client.Table(table_name)
     result = table.update_item(
         Key={
-            "id": archive_id
+            "archive_id": archive_id,
+            "item_key": f"job#{job_run_id}"
         },
-        UpdateExpression="SET jobs.#job_run_id = :job_state",
+        UpdateExpression="SET job_name = :job_name, job_run_id = :job_run_id, message = :message, "
+                         "#state = :state, #timestamp = :timestamp, started_on = :started_on, "
+                         "completed_on = :completed_on",
         ExpressionAttributeNames={
-            "#job_run_id": job_run_id
+            "#state": "state",
+            "#timestamp": "timestamp"
         },
         ExpressionAttributeValues={
-            ":job_state": {
-                "job_name": job_name,
-                "job_run_id": job_run_id,
-                "message": job_message,
-                "state": job_state,
-                "timestamp": str(job_timestamp),
-                "started_on": str(started_on),
-                "completed_on": str(completed_on),
-            }
+            ":job_name": job_name,
+            ":job_run_id": job_run_id,
+            ":message": job_message,
+            ":state": job_state,
+            ":timestamp": str(job_timestamp),
+            ":started_on": str(started_on),
+            ":completed_on": str(completed_on),
         },
     )
     return result
 
 
+def release_scheduler_slot(archive_id, job_run_id, job_state):
+    """
+    Returns the DPUs and source connections of a finished job run to the scheduler budgets, and
+    adapts the connection limit of the source database.
+
+    The job item names the run's slot item in the summary table, which is released with the
+    scheduler module shared with the Glue state machine. A slot is released once even when the
+    state change is delivered more than once or the scheduler reconciler frees it at the same time.
+    """
+
+    details_table = dynamodb_client.Table(ARCHIVE_DETAILS_TABLE)
+    job_item = details_table.get_item(
+        Key={"archive_id": archive_id, "item_key": f"job#{job_run_id}"},
+        ProjectionExpression="scheduler_slot"
+    ).get("Item", {})
+    if "scheduler_slot" not in job_item:
+        # The reconciler frees the slot of a run whose job item was never written
+        return
+
+    scheduler.release_slot(dynamodb_client.Table(SUMMARY_TABLE), job_item["scheduler_slot"], job_state)
+
+
+def retry_table_run(archive_id, table_name, job_run_id, job_state):
+    """
+    Records the outcome of a table's run and, if the run failed and the table has attempts
+    left, restarts it after an exponential backoff. A run is retried once, even when its state
+    change is delivered more than once.
+
+    Returns:
+    bool: True if the run is retried.
+    """
+
+    details_table = dynamodb_client.Table(ARCHIVE_DETAILS_TABLE)
+    try:
+        table_item = details_table.update_item(
+            Key={"archive_id": archive_id, "item_key": f"table#{table_name}"},
+            UpdateExpression="SET job_state = :s",
+            ConditionExpression="attribute_exists(item_key)",
+            ExpressionAttributeValues={":s": job_state},
+            ReturnValues="ALL_NEW"
+        )["Attributes"]
+    except dynamodb_client.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"No table item for {table_name} of archive {archive_id}")
+        return False
+
+    attempts = int(table_item.get("run_attempts", 1))
+    if job_state not in scheduler.SOURCE_OVERLOAD_STATES or "run_input" not in table_item \
+            or attempts >= MAX_TABLE_ATTEMPTS:
+        return False
+
+    try:
+        details_table.update_item(
+            Key={"archive_id": archive_id, "item_key": f"table#{table_name}"},
+            UpdateExpression="SET retried_run_id = :run",
+            ConditionExpression="attribute_not_exists(retried_run_id) OR retried_run_id <> :run",
+            ExpressionAttributeValues={":run": job_run_id}
+        )
+    except dynamodb_client.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Run {job_run_id} of table {table_name} is already retried")
+        return True
+
+    delay = min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_DELAY_SECONDS)
+    step_functions_client.start_execution(
+        stateMachineArn=TABLE_RETRY_STATE_MACHINE,
+        name=str(uuid.uuid4()),
+        input=json.dumps({
+            **table_item["run_input"],
+            "attempt": attempts + 1,
+            "retry_delay": delay
+        }, default=str),
+    )
+    print(f"Retrying table {table_name} of archive {archive_id} in {delay} seconds (attempt {attempts + 1})")
+    return True
+
+
+def get_prefix_size(bucket_name, prefix):
+    """
+    Returns the total size in bytes of the objects stored under an S3 prefix.
+
+    Args:
+    bucket_name (str): The name of the S3 bucket.
+    prefix (str): The prefix to sum the object sizes of.
+
+    Returns:
+    int: The total size in bytes.
+    """
+
+    total_bytes = 0
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for s3_object in page.get("Contents", []):
+            total_bytes += s3_object["Size"]
+    return total_bytes
+
+
+def lookup_jobs(job_names):
+    """
+    Returns the archive and table of each Glue job from the job registry, by job name.
+
+    Jobs that are not registered, because they were started before the registry existed, are
+    left out; see legacy_archive_id.
+    """
+
+    registry = {}
+    keys = [{"job_name": job_name} for job_name in set(job_names)]
+    for start in range(0, len(keys), 100):
+        request = {
+            GLUE_JOBS_TABLE: {
+                "Keys": keys[start:start + 100],
+                "ProjectionExpression": "job_name, archive_id, #table",
+                "ExpressionAttributeNames": {"#table": "table"},
+            }
+        }
+        while request:
+            response = dynamodb_client.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(GLUE_JOBS_TABLE, []):
+                registry[item["job_name"]] = item
+            request = response.get("UnprocessedKeys")
+    return registry
+
+
+def legacy_archive_id(job_name):
+    # Job names start with the archive ID, a UUID of five hyphen separated groups
+    return "-".join(job_name.split("-")[:5])
+
+
+def record_job_run(archive_id, table_name, state_change):
+    """
+    Records the state change of one job run on its job and table items, releases its
+    scheduler slot and retries its table if the run failed.
+
+    Returns:
+    bool: True if the table's run is retried.
+    """
+
+    detail = state_change["detail"]
+    response = glue_client.get_job_run(
+        JobName=detail["jobName"],
+        RunId=detail["jobRunId"],
+        PredecessorsIncluded=False
+    )
+
+    # Set Job State
+    update_job_state(
+        archive_id,
+        detail["jobRunId"],
+        detail["jobName"],
+        detail["message"],
+        detail["state"],
+        state_change["time"],
+        ARCHIVE_DETAILS_TABLE,
+        response["JobRun"]["StartedOn"],
+        response["JobRun"]["CompletedOn"]
+    )
+
+    if detail["state"] not in scheduler.TERMINAL_STATES:
+        return False
+    release_scheduler_slot(archive_id, detail["jobRunId"], detail["state"])
+    return retry_table_run(archive_id, table_name, detail["jobRunId"], detail["state"])
+
+
+def record_table_size(bucket_name, archive_item, table_name):
+    """
+    Stores the archived size of a table on its item.
+
+    The per-table size is overwritten, so only the difference to the previous run is returned,
+    to be added to the archive.
+
+    Returns:
+    tuple: The table item before the update and the size difference in bytes.
+    """
+
+    details_table = dynamodb_client.Table(ARCHIVE_DETAILS_TABLE)
+    table_bytes = get_prefix_size(
+        bucket_name,
+        f'{archive_item["id"]}/{archive_item["database"]}/{table_name}/'
+    )
+    details_response = details_table.update_item(
+        Key={"archive_id": archive_item["id"], "item_key": f"table#{table_name}"},
+        UpdateExpression="SET bytes_archived = :b",
+        ExpressionAttributeValues={':b': table_bytes},
+        ReturnValues="ALL_OLD"
+    )
+    table_item = details_response.get("Attributes", {})
+    return table_item, table_bytes - int(table_item.get("bytes_archived", 0))
+
+
+def process_archive_events(archive_id, state_changes, bucket_name):
+    """
+    Processes the job state changes of one archive received in the same batch.
+
+    Each run is recorded on its own job and table items. The archive item is then updated once
+    for all of them: its status, the bytes archived by the tables that succeeded, and one
+    validation execution for those tables.
+
+    Args:
+    archive_id (str): The archive the job runs belong to.
+    state_changes (list): (message ID, table name, Glue Job State Change event) tuples; the
+        table name is None for jobs missing from the job registry.
+    bucket_name (str): The archive bucket.
+
+    Returns:
+    list: The message IDs of the events that could not be processed.
+    """
+
+    table = dynamodb_client.Table(ARCHIVE_TABLE)
+    archive_item = table.get_item(
+        Key={"id": archive_id},
+        ProjectionExpression="id, #database, database_engine, oracle_owner",
+        ExpressionAttributeNames={"#database": "database"}
+    )["Item"]
+
+    failed_messages = []
+    archive_failed = False
+    succeeded_tables = []
+    for message_id, table_name, state_change in state_changes:
+        job_state = state_change["detail"]["state"]
+        if table_name is None:
+            table_name = state_change["detail"]["jobName"][len(f'{archive_id}-{archive_item["database"]}-'):]
+        try:
+            retrying = record_job_run(archive_id, table_name, state_change)
+        except Exception:
+            print(traceback.format_exc())
+            failed_messages.append(message_id)
+            continue
+
+        # The archive fails once a table has no attempts left
+        if job_state in scheduler.SOURCE_OVERLOAD_STATES and not retrying:
+            archive_failed = True
+        if job_state == "SUCCEEDED":
+            succeeded_tables.append((message_id, table_name))
+
+    if archive_failed:
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="SET job_status= :s, archive_status= :s",
+            ExpressionAttributeValues={':s': 'Failed'},
+            ReturnValues="UPDATED_NEW"
+        )
+
+    if not succeeded_tables:
+        return failed_messages
+
+    # A failed run of another table keeps the archive failed, and an archive stopped when its
+    # maintenance window closed stays stopped while its running tables finish
+    try:
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="SET job_status= :s, archive_status= :a",
+            ConditionExpression="job_status <> :f AND archive_status <> :stopped",
+            ExpressionAttributeValues={
+                ':s': 'Succeeded',
+                ':a': 'Validating',
+                ':f': 'Failed',
+                ':stopped': 'Stopped'
+            },
+            ReturnValues="UPDATED_NEW"
+        )
+    except dynamodb_client.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Archive {archive_id} already failed or stopped, keeping its status")
+
+    # Track the archived size for the summary counters
+    validated_tables = []
+    bytes_added = 0
+    for message_id, table_name in succeeded_tables:
+        try:
+            table_item, table_bytes = record_table_size(bucket_name, archive_item, table_name)
+        except Exception:
+            print(traceback.format_exc())
+            failed_messages.append(message_id)
+            continue
+        bytes_added += table_bytes
+        # The schema is loaded from the table's item by the validation, keeping the execution
+        # input small for archives with many or wide tables
+        validated_tables.append({
+            "table": {
+                "archive_id": archive_id,
+                "table": table_name,
+                "database": archive_item["database"],
+                "database_engine": archive_item["database_engine"],
+                "oracle_owner": archive_item["oracle_owner"]
+            }
+        })
+
+    if not validated_tables:
+        return failed_messages
+
+    table.update_item(
+        Key={'id': archive_id},
+        UpdateExpression="ADD bytes_archived :b",
+        ExpressionAttributeValues={':b': bytes_added},
+        ReturnValues="UPDATED_NEW"
+    )
+
+    # One validation execution per archive and batch, validating its tables in a Map state. Large
+    # batches are split so each input stays well below the Step Functions input limit.
+    for start in range(0, len(validated_tables), VALIDATION_TABLES_PER_EXECUTION):
+        step_functions_client.start_execution(
+            stateMachineArn=VALIDATION_STATE_MACHINE,
+            name=str(uuid.uuid4()),
+            input=json.dumps({"tables": validated_tables[start:start + VALIDATION_TABLES_PER_EXECUTION]},
+                             default=str),
+        )
+    return failed_messages
+
+
 def lambda_handler(event, context):
     """
     Lambda function that handles AWS Glue job state changes and triggers a Step Functions state machine
     to run validation.
 
-    The function receives an event dictionary with information about the Glue job run, such as the job name, job run ID,
-    and state. It extracts the archive ID from the job name and retrieves the corresponding archive record from a
-    DynamoDB table. If the job run succeeded, it extracts the table schema from the archive record and triggers a Step
-    Functions state machine to validate the table schema. If the job run failed, it updates the archive status in the
-    DynamoDB table to 'Failed'. The function returns the input event dictionary.
+    The Glue Job State Change events are delivered through an SQS queue in batches. The archive
+    and table of each job are looked up in the job registry, and the events are grouped by
+    archive, so that each archive item is read and updated once per batch and the validations of
+    its succeeded tables are started in one execution. A run that failed with no attempts left
+    fails its archive.
 
-    :param event: A dictionary with information about the Glue job run, including the job name, job run ID, and state.
+    :param event: An SQS batch whose message bodies are Glue Job State Change events.
     :type event: dict
     :param context: A dictionary with information about the Lambda execution environment.
     :type context: dict
-    :return: The input event dictionary.
+    :return: The messages to redeliver, as SQS partial batch failures.
     :rtype: dict
     """
 
-    if ("jobName" in event["detail"]):
-        x = event["detail"]["jobName"].split("-")
-        archive_id = x[0] + "-" + x[1] + "-" + x[2] + "-" + x[3] + "-" + x[4]
+    records = []
+    for record in event["Records"]:
+        state_change = json.loads(record["body"])
+        if "jobName" in state_change["detail"]:
+            records.append((record["messageId"], state_change))
 
-        table = dynamodb_client.Table(ARCHIVE_TABLE)
-        dynamodb_response = table.get_item(Key={"id": archive_id})
+    if not records:
+        return {"batchItemFailures": []}
 
-        response = glue_client.get_job_run(
-            JobName=event["detail"]["jobName"],
-            RunId=event["detail"]["jobRunId"],
-            PredecessorsIncluded=False
-        )
+    registry = lookup_jobs(state_change["detail"]["jobName"] for _, state_change in records)
+    state_changes = {}
+    for message_id, state_change in records:
+        job = registry.get(state_change["detail"]["jobName"])
+        if job:
+            archive_id, table_name = job["archive_id"], job["table"]
+        else:
+            archive_id, table_name = legacy_archive_id(state_change["detail"]["jobName"]), None
+        state_changes.setdefault(archive_id, []).append((message_id, table_name, state_change))
 
-        # Set Job State
-        update_job_state(
-            archive_id,
-            event["detail"]["jobRunId"],
-            event["detail"]["jobName"],
-            event["detail"]["message"],
-            event["detail"]["state"],
-            event["time"],
-            ARCHIVE_TABLE,
-            response["JobRun"]["StartedOn"],
-            response["JobRun"]["CompletedOn"]
-        )
+    bucket_parameter = ssm.get_parameter(
+        Name='/job/s3-bucket-table-data', WithDecryption=True)
+    bucket_name = bucket_parameter['Parameter']['Value']
 
-        if (event["detail"]["state"] == 'FAILED'):
-            table.update_item(
-                Key={'id': archive_id},
-                UpdateExpression="SET job_status= :s",
-                ExpressionAttributeValues={':s': 'Failed'},
-                ReturnValues="UPDATED_NEW"
-            )
-            table.update_item(
-                Key={'id': archive_id},
-                UpdateExpression="SET archive_status= :s",
-                ExpressionAttributeValues={':s': 'Failed'},
-                ReturnValues="UPDATED_NEW"
-            )
-
-        if (event["detail"]["state"] == 'SUCCEEDED'):
-
-            if dynamodb_response["Item"]["job_status"] != "Failed":
-                table.update_item(
-                    Key={'id': archive_id},
-                    UpdateExpression="SET job_status= :s",
-                    ExpressionAttributeValues={':s': 'Succeeded'},
-                    ReturnValues="UPDATED_NEW"
-                )
-
-                table.update_item(
-                    Key={'id': archive_id},
-                    UpdateExpression="SET archive_status= :s",
-                    ExpressionAttributeValues={':s': 'Validating'},
-                    ReturnValues="UPDATED_NEW"
-                )
-
-            return_table = {
-                "table": {
-                    "schema": []
-                }
-            }
+    failed_messages = []
+    for archive_id, archive_state_changes in state_changes.items():
+        try:
+            failed_messages.extend(process_archive_events(archive_id, archive_state_changes, bucket_name))
+        except Exception:
+            print(traceback.format_exc())
+            failed_messages.extend(message_id for message_id, _, _ in archive_state_changes)
 
-            dynamodb_updated_response = table.get_item(Key={"id": archive_id})
-            for table in dynamodb_updated_response["Item"]["table_details"]:
-                if (table["table"] == x[6]):
-                    return_table["table"]["archive_id"] = archive_id
-                    return_table["table"]["schema"] = table["schema"]
-                    return_table["table"]["table"] = table["table"]
-                    return_table["table"]["database"] = dynamodb_updated_response["Item"]["database"]
-                    return_table["table"]["database_engine"] = dynamodb_updated_response["Item"]["database_engine"]
-                    return_table["table"]["oracle_owner"] = dynamodb_updated_response["Item"]["oracle_owner"]
-
-            step_functions_client.start_execution(
-                stateMachineArn=VALIDATION_STATE_MACHINE,
-                name=str(uuid.uuid4()),
-                input=json.dumps(return_table),
-            )
-
-    return event
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_messages]}
@@ -0,0 +1,325 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import json
+import logging
+import os
+import time
+import traceback
+from datetime import datetime, timezone
+
+import boto3
+
+REGION = os.getenv("REGION")
+# Stop waiting for a query when less than this is left of the invocation
+RESUME_THRESHOLD_MS = int(os.getenv("RESUME_THRESHOLD_MS", "60000"))
+# Athena writes at most 100 partitions per CTAS or INSERT INTO query
+PARTITIONS_PER_QUERY = 100
+# The partition values are kept on the lineage item while the view is materialized
+MAX_PARTITIONS = int(os.getenv("MAX_PARTITIONS", "1000"))
+POLL_SECONDS = 2
+MATERIALIZED_VIEW_PREFIX = "mview#"
+NUMERIC_TYPES = ("tinyint", "smallint", "int", "integer", "bigint", "float", "real", "double", "decimal")
+
+athena = boto3.client('athena')
+glue = boto3.client('glue')
+s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+ssm = boto3.client('ssm')
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+logger = logging.getLogger()
+
+if logger.hasHandlers():
+    logger.setLevel(LOG_LEVEL)
+else:
+    logging.basicConfig(level=LOG_LEVEL)
+
+
+class StaleRunError(Exception):
+    """Raised when a newer request has replaced the refresh being processed."""
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_literal(value, column_type):
+    """
+    Returns a value read from Athena's results as a SQL literal of the column type.
+    """
+
+    base_type = column_type.lower().split("(")[0]
+    if base_type in NUMERIC_TYPES or base_type == "boolean":
+        return value
+    if base_type in ("date", "timestamp"):
+        return f"{base_type.upper()} '{value}'"
+    return "'" + value.replace("'", "''") + "'"
+
+
+def update_job(table, key, run_id, update_expression, expression_values):
+    """
+    Updates the lineage item if the refresh still belongs to this run.
+
+    Returns:
+    dict: The refresh after the update.
+    """
+
+    update_args = {
+        'Key': key,
+        'UpdateExpression': update_expression,
+        'ConditionExpression': "materialize_job.run_id = :r",
+        'ExpressionAttributeValues': {**expression_values, ':r': run_id},
+        'ReturnValues': "ALL_NEW"
+    }
+    names = {name: name[1:] for name in ('#status', '#location') if name in update_expression}
+    if names:
+        update_args['ExpressionAttributeNames'] = names
+    try:
+        response = table.update_item(**update_args)
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        raise StaleRunError(run_id)
+    return response["Attributes"].get("materialize_job", {})
+
+
+def run_query(table, key, run_id, job, statement, database, bucket_name, context):
+    """
+    Runs a query of the refresh, or waits for the one started by an earlier invocation.
+
+    Returns:
+    dict: The query execution, or None if the function ran out of time before the query finished.
+    """
+
+    query_execution_id = job.get("query_execution_id")
+    if not query_execution_id:
+        query_execution_id = athena.start_query_execution(
+            QueryString=statement,
+            QueryExecutionContext={'Database': database},
+            ResultConfiguration={'OutputLocation': f's3://{bucket_name}'},
+            WorkGroup='sdas'
+        )["QueryExecutionId"]
+        job.update(update_job(table, key, run_id, "SET materialize_job.query_execution_id = :q",
+                              {':q': query_execution_id}))
+        logger.info(f"Started query {query_execution_id}: {statement}")
+
+    while True:
+        execution = athena.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]
+        state = execution["Status"]["State"]
+        if state == "SUCCEEDED":
+            return execution
+        if state in ("FAILED", "CANCELLED"):
+            raise RuntimeError(execution["Status"].get("StateChangeReason", f"Query {state.lower()}"))
+        if context.get_remaining_time_in_millis() < RESUME_THRESHOLD_MS:
+            return None
+        time.sleep(POLL_SECONDS)
+
+
+def partition_batches(query_execution_id, partitioned_by, column_types):
+    """
+    Turns the distinct partition values of the view into the WHERE clauses of the queries that
+    write the table, each covering at most PARTITIONS_PER_QUERY partitions.
+    """
+
+    predicates = []
+    paginator = athena.get_paginator("get_query_results")
+    first_page = True
+    for page in paginator.paginate(QueryExecutionId=query_execution_id):
+        rows = page["ResultSet"]["Rows"]
+        # The first row of the first page holds the column names
+        if first_page:
+            rows = rows[1:]
+            first_page = False
+        for row in rows:
+            values = [datum.get("VarCharValue") for datum in row["Data"]]
+            predicates.append("(" + " AND ".join(
+                f"{quote(column)} IS NULL" if value is None
+                else f"{quote(column)} = {sql_literal(value, column_types[column])}"
+                for column, value in zip(partitioned_by, values)
+            ) + ")")
+
+    if len(predicates) > MAX_PARTITIONS:
+        raise ValueError(f"The view has {len(predicates)} partitions, at most {MAX_PARTITIONS} are supported")
+    batches = [" OR ".join(predicates[start:start + PARTITIONS_PER_QUERY])
+               for start in range(0, len(predicates), PARTITIONS_PER_QUERY)]
+    # An empty view is still materialized as an empty table
+    return batches or [""]
+
+
+def write_statement(database, table_name, view_name, columns, partitioned_by, predicate, create):
+    """
+    Returns the CTAS query that creates the table from the view, or the INSERT INTO query that
+    adds to it. Partition columns go last, as Athena requires.
+    """
+
+    ordered = [name for name, _ in columns if name not in partitioned_by] + list(partitioned_by)
+    select = f'SELECT {", ".join(quote(name) for name in ordered)} FROM {quote(database)}.{quote(view_name)}'
+    if predicate:
+        select += f" WHERE {predicate}"
+
+    if not create:
+        return f"INSERT INTO {quote(database)}.{quote(table_name)} {select}"
+
+    properties = ["format = 'PARQUET'", "write_compression = 'ZSTD'"]
+    if partitioned_by:
+        properties.append("partitioned_by = ARRAY[" + ", ".join(f"'{name}'" for name in partitioned_by) + "]")
+    return f'CREATE TABLE {quote(database)}.{quote(table_name)} WITH ({", ".join(properties)}) AS {select}'
+
+
+def drop_table(database, table_name):
+    """
+    Deletes a materialized table and its data.
+    """
+
+    try:
+        location = glue.get_table(DatabaseName=database, Name=table_name)["Table"]["StorageDescriptor"]["Location"]
+    except glue.exceptions.EntityNotFoundException:
+        return
+    glue.delete_table(DatabaseName=database, Name=table_name)
+
+    bucket_name, prefix = location.replace("s3://", "").split("/", 1)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix.rstrip("/") + "/"):
+        objects = [{'Key': item["Key"]} for item in page.get("Contents", [])]
+        if objects:
+            s3_client.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+
+
+def lambda_handler(event, context):
+    """
+    Materializes a view of an archive into a new version of its table in the background.
+
+    The new version is written with a CTAS query, followed by INSERT INTO queries when the view
+    has more partitions than Athena writes in one query. When it is complete, the lineage item
+    points the view at the new table, with the archive run and view definition it was built
+    from, and the previous version is dropped. The progress is kept on the lineage item; the
+    function re-invokes itself before it runs out of time and resumes from there.
+
+    :param event: {"archive_id": str, "view_name": str, "run_id": str}
+    :type event: dict
+    :param context: A dictionary with information about the Lambda execution environment.
+    :type context: dict
+    :return: The input event dictionary.
+    :rtype: dict
+    """
+
+    logger.info(json.dumps(event))
+
+    archive_id = event["archive_id"]
+    view_name = event["view_name"]
+    run_id = event["run_id"]
+
+    bucket_parameter = ssm.get_parameter(
+        Name='/athena/s3-athena-temp-bucket', WithDecryption=True)
+    bucket_name = bucket_parameter['Parameter']['Value']
+
+    parameter = ssm.get_parameter(
+        Name='/archive/dynamodb-table', WithDecryption=True)
+    archives_table = dynamodb.Table(parameter['Parameter']['Value'])
+
+    details_parameter = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
+    table = dynamodb.Table(details_parameter['Parameter']['Value'])
+
+    key = {'archive_id': archive_id, 'item_key': f'{MATERIALIZED_VIEW_PREFIX}{view_name}'}
+    lineage = table.get_item(Key=key, ConsistentRead=True).get("Item", {})
+    job = lineage.get("materialize_job", {})
+    if job.get("run_id") != run_id or job.get("status") != "InProgress":
+        logger.info(f"Run {run_id} of view {view_name} was superseded, stopping")
+        return event
+
+    archive = archives_table.get_item(
+        Key={'id': archive_id},
+        ProjectionExpression="#database",
+        ExpressionAttributeNames={'#database': 'database'}
+    ).get("Item", {})
+    database = f'{archive_id}-{archive["database"]}-database'
+    table_name = f'{view_name}__mv_{run_id[:8]}'
+
+    try:
+        view = glue.get_table(DatabaseName=database, Name=view_name)["Table"]
+        columns = [(column["Name"], column["Type"]) for column in view["StorageDescriptor"]["Columns"]]
+        partitioned_by = list(job.get("partitioned_by", []))
+
+        if "batches" not in job:
+            batches = [""]
+            if partitioned_by:
+                statement = f'SELECT DISTINCT {", ".join(quote(name) for name in partitioned_by)} ' \
+                            f'FROM {quote(database)}.{quote(view_name)}'
+                execution = run_query(table, key, run_id, job, statement, database, bucket_name, context)
+                if execution is None:
+                    lambda_client.invoke(
+                        FunctionName=context.invoked_function_arn,
+                        InvocationType="Event",
+                        Payload=json.dumps(event)
+                    )
+                    return event
+                batches = partition_batches(execution["QueryExecutionId"], partitioned_by, dict(columns))
+            job = update_job(table, key, run_id,
+                             "SET materialize_job.batches = :b, materialize_job.batches_done = :z "
+                             "REMOVE materialize_job.query_execution_id",
+                             {':b': batches, ':z': 0})
+
+        while int(job["batches_done"]) < len(job["batches"]):
+            batch = int(job["batches_done"])
+            statement = write_statement(database, table_name, view_name, columns, partitioned_by,
+                                        job["batches"][batch], create=batch == 0)
+            execution = run_query(table, key, run_id, job, statement, database, bucket_name, context)
+            if execution is None:
+                lambda_client.invoke(
+                    FunctionName=context.invoked_function_arn,
+                    InvocationType="Event",
+                    Payload=json.dumps(event)
+                )
+                return event
+            job = update_job(table, key, run_id,
+                             "SET materialize_job.batches_done = :d REMOVE materialize_job.query_execution_id",
+                             {':d': batch + 1})
+
+        location = glue.get_table(DatabaseName=database, Name=table_name)["Table"]["StorageDescriptor"]["Location"]
+        update_job(table, key, run_id,
+                   "SET table_name = :t, #location = :l, partitioned_by = :p, archive_run = :a, "
+                   "view_hash = :h, materialized_at = :m REMOVE materialize_job",
+                   {
+                       ':t': table_name,
+                       ':l': location,
+                       ':p': partitioned_by,
+                       ':a': job["archive_run"],
+                       ':h': job["view_hash"],
+                       ':m': datetime.now(timezone.utc).isoformat()
+                   })
+        logger.info(f"Materialized view {view_name} of archive {archive_id} as {table_name}")
+
+        previous_table = lineage.get("table_name")
+        if previous_table and previous_table != table_name:
+            drop_table(database, previous_table)
+
+    except StaleRunError:
+        # The view was deleted or a newer refresh took over; the lineage never pointed at
+        # this run's table
+        logger.info(f"Run {run_id} of view {view_name} was superseded, stopping")
+        drop_table(database, table_name)
+    except Exception as ex:
+        logger.error(traceback.format_exc())
+        try:
+            update_job(table, key, run_id,
+                       "SET materialize_job.#status = :s, materialize_job.message = :e",
+                       {':s': 'Failed', ':e': str(ex)})
+            drop_table(database, table_name)
+        except StaleRunError:
+            pass
+        raise
+
+    return event
@@ -0,0 +1,117 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import os
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+REGION = os.getenv("REGION")
+ARCHIVE_TABLE = os.environ["ARCHIVE_TABLE"]
+ARCHIVE_DETAILS_TABLE = os.environ["ARCHIVE_DETAILS_TABLE"]
+
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+
+
+def latest_job(jobs, job_name):
+    """
+    Returns the most recent of an archive's inline job entries for a Glue job, or None.
+    """
+
+    runs = [job for job in jobs.values() if job.get("job_name") == job_name]
+    return max(runs, key=lambda job: job.get("started_on") or job.get("timestamp", ""), default=None)
+
+
+def migrate_archive(archive_table, details_table, archive):
+    """
+    Moves the inline table_details and jobs attributes of an archive created before the archive
+    details table existed into its table# and job# items, then removes them from the archive.
+
+    Items that already exist are kept, so an archive whose migration was interrupted is migrated
+    again without overwriting the state a pipeline step wrote in the meantime.
+    """
+
+    table_details = archive.get("table_details", [])
+    jobs = archive.get("jobs", {})
+
+    items = []
+    for position, table_detail in enumerate(table_details):
+        item = {
+            **table_detail,
+            "archive_id": archive["id"],
+            "item_key": f'table#{table_detail["table"]}',
+            "position": position,
+        }
+        # The table's last run decides whether a resumed run extracts it again
+        job = latest_job(jobs, f'{archive["id"]}-{archive.get("database", "")}-{table_detail["table"]}')
+        if job:
+            item["job_run_id"] = job["job_run_id"]
+            item["job_state"] = job.get("state", "")
+        items.append(item)
+    for job_run_id, job in jobs.items():
+        items.append({
+            **job,
+            "archive_id": archive["id"],
+            "item_key": f'job#{job_run_id}',
+            "job_run_id": job_run_id,
+        })
+
+    for item in items:
+        try:
+            details_table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(item_key)"
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+    archive_table.update_item(
+        Key={"id": archive["id"]},
+        UpdateExpression="SET table_count = if_not_exists(table_count, :c) REMOVE table_details, jobs",
+        ExpressionAttributeValues={":c": len(table_details)}
+    )
+    return len(items)
+
+
+def lambda_handler(event, context):
+    """
+    Backfills the archive details table from the archives created before it existed. Runs as a
+    custom resource on every deployment; archives that were migrated have no inline attributes
+    left and are not read again.
+    """
+
+    if event.get("RequestType") == "Delete":
+        return {"PhysicalResourceId": event.get("PhysicalResourceId", "archive-details-migration")}
+
+    archive_table = dynamodb.Table(ARCHIVE_TABLE)
+    details_table = dynamodb.Table(ARCHIVE_DETAILS_TABLE)
+
+    archives = 0
+    items = 0
+    scan_args = {
+        "FilterExpression": Attr("table_details").exists() | Attr("jobs").exists(),
+        "ProjectionExpression": "id, #database, table_details, jobs",
+        "ExpressionAttributeNames": {"#database": "database"},
+    }
+    while True:
+        response = archive_table.scan(**scan_args)
+        for archive in response["Items"]:
+            items += migrate_archive(archive_table, details_table, archive)
+            archives += 1
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    print(f"Migrated {archives} archives to {items} archive details items")
+    return {"PhysicalResourceId": "archive-details-migration"}
@@ -16,56 +16,204 @@ permissions and limitations under the License.
 import boto3
 import json
 import os
+import traceback
+import uuid
+from datetime import datetime, timezone
 
 REGION = os.getenv("REGION")
+ARCHIVE_OBJECTS_FUNCTION = os.getenv("ARCHIVE_OBJECTS_FUNCTION")
+# Tags selecting the shared expiration and storage tier lifecycle rules
+# (api/archive/expiration/lifecycle.py)
+EXPIRATION_TAG_KEY = "sdas-expiration-date"
+STORAGE_TIER_TAG_KEY = "sdas-storage-tier"
+
 ssm = boto3.client('ssm')
-sqs_client = boto3.client('sqs')
+lambda_client = boto3.client('lambda')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 
 
+def lifecycle_tags(archive):
+    """
+    Returns the lifecycle tags the archive's objects should carry, by tag key.
+    """
+
+    tags = {}
+    if archive.get("delete_data") is True and archive.get("expiration_date"):
+        tags[EXPIRATION_TAG_KEY] = archive["expiration_date"]
+    storage_class = archive.get("storage_tier", {}).get("current")
+    if storage_class and storage_class != "STANDARD":
+        tags[STORAGE_TIER_TAG_KEY] = storage_class
+    return tags
+
+
+def retag_archive(table, archive_id, archive):
+    """
+    Tags the objects of an archive that finished a run with its lifecycle tags in the background.
+
+    Tags are set on the objects that exist when expiration or tiering is configured. The objects
+    a later run writes (table files, chunk plans and markers, validation results) are untagged
+    and would be missed by the lifecycle rules until they are tagged here.
+    """
+
+    tags = lifecycle_tags(archive)
+    if not tags:
+        return
+
+    run_id = str(uuid.uuid4())
+    table.update_item(
+        Key={'id': archive_id},
+        UpdateExpression="SET lifecycle_tag_job = :j",
+        ExpressionAttributeValues={
+            ':j': {
+                "run_id": run_id,
+                "tags": tags,
+                "status": "InProgress",
+                "objects_processed": 0,
+                "objects_failed": 0,
+                "started_at": datetime.now(timezone.utc).isoformat()
+            }
+        }
+    )
+    lambda_client.invoke(
+        FunctionName=ARCHIVE_OBJECTS_FUNCTION,
+        InvocationType="Event",  # Asynchronous invocation
+        Payload=json.dumps({
+            "archive_id": archive_id,
+            "run_id": run_id,
+            "job": "lifecycle_tag_job",
+            "operation": "tag",
+            "tags": tags
+        })
+    )
+
+
+def count_validation(table, lookup_table, archive_id, query_execution_id):
+    """
+    Adds one completed validation to the archive's counter, once per validation query.
+
+    The validation's query lookup item is marked counted in the same transaction, so a message
+    delivered again is not counted again. Messages sent before they carried the query execution
+    ID are counted without the marker.
+
+    Returns:
+    bool: True if the validation was counted by this call.
+    """
+
+    if query_execution_id is None:
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="ADD counters.validation.validation_completed :one",
+            ExpressionAttributeValues={':one': 1}
+        )
+        return True
+
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {"Update": {
+                "TableName": lookup_table.name,
+                "Key": {'id': query_execution_id},
+                "UpdateExpression": "SET validation_counted = :t",
+                "ConditionExpression": "attribute_exists(id) AND attribute_not_exists(validation_counted)",
+                "ExpressionAttributeValues": {':t': True}
+            }},
+            {"Update": {
+                "TableName": table.name,
+                "Key": {'id': archive_id},
+                "UpdateExpression": "ADD counters.validation.validation_completed :one",
+                "ExpressionAttributeValues": {':one': 1}
+            }}
+        ])
+    except dynamodb.meta.client.exceptions.TransactionCanceledException as ex:
+        reasons = ex.response.get("CancellationReasons", [])
+        if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+            print(f"Validation {query_execution_id} of archive {archive_id} was already counted")
+            return False
+        raise
+    return True
+
+
+def complete_validations(table, lookup_table, archive_id, query_execution_ids):
+    """
+    Counts the validations completed for an archive, and marks the archive Archived once all of
+    its validations have completed.
+
+    The counters are reset when a run starts. The archive is finished under a condition that
+    records the validation count it was finished at: it is archived once per run, and again only
+    after a later validation execution of the same run adds validations. Retagging is recorded as
+    pending in the same write and cleared once it was started, so a retag that failed is retried
+    when the messages are redelivered, without counting them again.
+    """
+
+    counted = sum(count_validation(table, lookup_table, archive_id, query_execution_id)
+                  for query_execution_id in query_execution_ids)
+
+    archive = table.get_item(Key={'id': archive_id}, ConsistentRead=True)["Item"]
+    validation_count = archive["counters"]["validation"]["validation_count"]
+    validation_completed = archive["counters"]["validation"]["validation_completed"]
+
+    # Check if validation is complete. The tables of a stopped archive that finished validating
+    # do not make it Archived; it is resumed with the tables that were skipped.
+    if validation_completed >= validation_count:
+        try:
+            archive = table.update_item(
+                Key={'id': archive_id},
+                UpdateExpression="SET archive_status= :s, counters.validation.archived_count = :c, "
+                                 "lifecycle_retag_pending = :t",
+                ConditionExpression="archive_status <> :stopped AND "
+                                    "(attribute_not_exists(counters.validation.archived_count) OR "
+                                    "counters.validation.archived_count < :c)",
+                ExpressionAttributeValues={
+                    ':s': 'Archived',
+                    ':stopped': 'Stopped',
+                    ':c': validation_count,
+                    ':t': True
+                },
+                ReturnValues="ALL_NEW"
+            )["Attributes"]
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            print(f"Archive {archive_id} was already archived or was stopped, keeping its status")
+
+    if archive.get("lifecycle_retag_pending"):
+        retag_archive(table, archive_id, archive)
+        table.update_item(
+            Key={'id': archive_id},
+            UpdateExpression="REMOVE lifecycle_retag_pending"
+        )
+
+    print(f"Archive {archive_id}: {counted} counted, "
+          f"{validation_completed} of {validation_count} validations completed")
+
+
 def lambda_handler(event, context):
+    """
+    Counts the validations completed per archive.
+
+    The queue is a FIFO queue grouped by archive. The messages of a batch are counted per archive.
+    Lambda deletes the messages of a successful batch; the messages of archives whose update
+    failed are returned as partial batch failures and redelivered in order. Validations counted
+    before the failure are not counted again.
+    """
+
     dynamodb_parameter = ssm.get_parameter(
         Name='/archive/dynamodb-table', WithDecryption=True)
     table = dynamodb.Table(dynamodb_parameter['Parameter']['Value'])
+    lookup_parameter = ssm.get_parameter(
+        Name='/archive/query-lookup-dynamodb-table', WithDecryption=True)
+    lookup_table = dynamodb.Table(lookup_parameter['Parameter']['Value'])
 
-    sqs_parameter = ssm.get_parameter(
-        Name='/sqs/validation', WithDecryption=True)
-    sqs_parameter_value = sqs_parameter['Parameter']['Value']
-
+    messages = {}
     for message in event["Records"]:
         message_body = json.loads(message["body"])
-
-        # Fetch current state from DynamoDB
-        dynamodb_response = table.get_item(Key={"id": message_body["archive_id"]})
-        validation_count = dynamodb_response["Item"]["counters"]["validation"]["validation_count"]
-
-        # Atomically increment the validation_completed counter
-        update_response = table.update_item(
-            Key={'id': message_body["archive_id"]},
-            UpdateExpression="ADD counters.validation.validation_completed :inc",
-            ExpressionAttributeValues={':inc': 1},
-            ReturnValues="UPDATED_NEW"
-        )
-
-        # Get the updated validation_completed count
-        validation_completed_increment = update_response["Attributes"]["counters"]["validation"]["validation_completed"]
-
-        # Check if validation is complete
-        if validation_completed_increment == validation_count:
-            table.update_item(
-                Key={'id': message_body["archive_id"]},
-                UpdateExpression="SET archive_status= :s",
-                ExpressionAttributeValues={':s': 'Archived'},
-                ReturnValues="UPDATED_NEW"
-            )
-
-        print("message_body:", message_body)
-        print("receiptHandle:", message["receiptHandle"])
-
-        # Delete the SQS message after processing
-        sqs_client.delete_message(
-            QueueUrl=sqs_parameter_value,
-            ReceiptHandle=message["receiptHandle"]
-        )
-
-    return event
+        messages.setdefault(message_body["archive_id"], []).append(
+            (message["messageId"], message_body.get("query_execution_id")))
+
+    failed_messages = []
+    for archive_id, archive_messages in messages.items():
+        try:
+            complete_validations(table, lookup_table, archive_id,
+                                 [query_execution_id for _, query_execution_id in archive_messages])
+        except Exception:
+            print(traceback.format_exc())
+            failed_messages.extend(message_id for message_id, _ in archive_messages)
+
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_messages]}
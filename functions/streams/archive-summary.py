@@ -0,0 +1,167 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import os
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+REGION = os.getenv("REGION")
+ARCHIVE_TABLE = os.environ["ARCHIVE_TABLE"]
+SUMMARY_TABLE = os.environ["SUMMARY_TABLE"]
+SUMMARY_ID = "summary"
+
+dynamodb = boto3.resource('dynamodb', region_name=REGION)
+deserializer = TypeDeserializer()
+
+
+def deserialize_image(image):
+    """
+    Converts a DynamoDB stream image from the low-level attribute value format to plain Python values.
+
+    Args:
+    image (dict): The NewImage or OldImage of a stream record, or None.
+
+    Returns:
+    dict: The deserialized item, or None if no image was supplied.
+    """
+
+    if not image:
+        return None
+    return {key: deserializer.deserialize(value) for key, value in image.items()}
+
+
+def archive_contribution(item):
+    """
+    Returns the amount a single archive item contributes to each summary counter.
+
+    Counters are flat attribute names so that they can be incremented with ADD
+    without the parent map having to exist first.
+
+    Args:
+    item (dict): A deserialized archive item, or None.
+
+    Returns:
+    dict: Mapping of summary attribute name to the archive's contribution.
+    """
+
+    if not item:
+        return {}
+
+    table_count = item.get("table_count")
+    if table_count is None:
+        table_count = len(item.get("table_details", []))
+
+    return {
+        "archives": 1,
+        "tables": int(table_count),
+        "rows": int(item.get("rows_archived", 0)),
+        "bytes": int(item.get("bytes_archived", 0)),
+        f'status#{item.get("archive_status", "")}': 1,
+        f'engine#{item.get("database_engine", "")}': 1,
+    }
+
+
+def apply_deltas(deltas):
+    """
+    Applies the accumulated counter deltas to the summary item in a single atomic update.
+
+    Args:
+    deltas (dict): Mapping of summary attribute name to the signed amount to add.
+
+    Returns:
+    None
+    """
+
+    deltas = {key: value for key, value in deltas.items() if value != 0}
+    if not deltas:
+        return
+
+    names = {}
+    values = {}
+    clauses = []
+    for index, (key, value) in enumerate(deltas.items()):
+        names[f"#a{index}"] = key
+        values[f":v{index}"] = value
+        clauses.append(f"#a{index} :v{index}")
+
+    table = dynamodb.Table(SUMMARY_TABLE)
+    table.update_item(
+        Key={"id": SUMMARY_ID},
+        UpdateExpression="ADD " + ", ".join(clauses),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def rebuild_summary():
+    """
+    Recomputes the summary item from a full scan of the archive table.
+
+    This is only needed to backfill archives created before the stream was enabled,
+    or to repair the counters after a manual change to the table.
+
+    Returns:
+    dict: The rebuilt summary item.
+    """
+
+    archive_table = dynamodb.Table(ARCHIVE_TABLE)
+    totals = {}
+
+    response = archive_table.scan()
+    while True:
+        for item in response["Items"]:
+            for key, value in archive_contribution(item).items():
+                totals[key] = totals.get(key, 0) + value
+        if "LastEvaluatedKey" not in response:
+            break
+        response = archive_table.scan(ExclusiveStartKey=response["LastEvaluatedKey"])
+
+    summary = {"id": SUMMARY_ID, **totals}
+    dynamodb.Table(SUMMARY_TABLE).put_item(Item=summary)
+    return summary
+
+
+def lambda_handler(event, context):
+    """
+    Lambda function that keeps the archive summary item up to date from the archive table stream.
+
+    Each stream record contributes the difference between the new and the old image of the
+    archive, so inserts, updates and deletes are all handled the same way. The deltas of the
+    whole batch are coalesced into one update of the summary item.
+
+    :param event: A DynamoDB stream batch, or {"rebuild": true} to recompute the summary with a scan.
+    :type event: dict
+    :param context: A dictionary with information about the Lambda execution environment.
+    :type context: dict
+    :return: The number of processed records.
+    :rtype: dict
+    """
+
+    if event.get("rebuild"):
+        return rebuild_summary()
+
+    deltas = {}
+    for record in event.get("Records", []):
+        old_item = deserialize_image(record["dynamodb"].get("OldImage"))
+        new_item = deserialize_image(record["dynamodb"].get("NewImage"))
+
+        for key, value in archive_contribution(new_item).items():
+            deltas[key] = deltas.get(key, 0) + value
+        for key, value in archive_contribution(old_item).items():
+            deltas[key] = deltas.get(key, 0) - value
+
+    apply_deltas(deltas)
+
+    return {"processed": len(event.get("Records", []))}
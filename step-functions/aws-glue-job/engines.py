@@ -0,0 +1,112 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class EngineDriver:
+    """
+    Describes how the archive pipeline connects to and reads from a source database engine.
+
+    Attributes:
+    jdbc_url (str): Template for the Glue connection URL, formatted with hostname, port and database.
+    script (str): The Glue script under scripts/ in the artifact bucket.
+    job_arguments (dict): Extra default arguments of the Glue job.
+    table_arguments (dict): Per-table job run arguments, mapped to the key of the table event that holds the value.
+    read_options (dict): JDBC read options passed to the Glue script, e.g. fetchsize or hashpartitions.
+    identifier_quote (str): Template quoting a column name in the engine's SQL dialect.
+    """
+
+    jdbc_url: str
+    script: str
+    job_arguments: dict = field(default_factory=dict)
+    table_arguments: dict = field(default_factory=dict)
+    read_options: dict = field(default_factory=dict)
+    identifier_quote: str = '"{}"'
+
+    def connection_url(self, hostname, port, database):
+        return self.jdbc_url.format(hostname=hostname, port=port, database=database)
+
+    def resolve_read_options(self, *overrides):
+        """
+        Returns the engine's read options with the overrides applied in order, as the
+        string values Glue expects.
+        """
+
+        options = dict(self.read_options)
+        for override in overrides:
+            options.update(override or {})
+        return {key: str(value) for key, value in options.items()}
+
+    def quote_identifier(self, name):
+        return self.identifier_quote.format(name)
+
+
+# Rows fetched per round trip. Without it MySQL buffers the whole result set in the executor
+# (unless the connection uses cursor fetch) and Oracle fetches 10 rows per round trip.
+DEFAULT_FETCH_SIZE = "10000"
+
+ENGINES = {
+    "mysql": EngineDriver(
+        jdbc_url="jdbc:mysql://{hostname}:{port}/{database}?useCursorFetch=true",
+        script="mysql-1-0-0.py",
+        read_options={"fetchsize": DEFAULT_FETCH_SIZE},
+        identifier_quote="`{}`",
+    ),
+    "mssql": EngineDriver(
+        jdbc_url="jdbc:sqlserver://{hostname}:{port};database={database}",
+        script="mssql-1-0-0.py",
+        job_arguments={"--disable-proxy-v2": "true"},
+        table_arguments={"--MSSQL_SCHEMA": "mssql_schema"},
+        read_options={"fetchsize": DEFAULT_FETCH_SIZE},
+        identifier_quote="[{}]",
+    ),
+    "oracle": EngineDriver(
+        jdbc_url="jdbc:oracle://{hostname}:{port}/{database}",
+        script="oracle-1-0-4.py",
+        table_arguments={"--OWNER": "oracle_owner"},
+        read_options={"fetchsize": DEFAULT_FETCH_SIZE},
+    ),
+    "postgresql": EngineDriver(
+        jdbc_url="jdbc:postgresql://{hostname}:{port}/{database}",
+        script="postgresql-1-0-0.py",
+        job_arguments={"--disable-proxy-v2": "true"},
+        read_options={"fetchsize": DEFAULT_FETCH_SIZE},
+    ),
+}
+
+
+def get_engine(database_engine):
+    """
+    Returns the driver of a database engine.
+
+    Raises:
+    ValueError: If the engine is not supported.
+    """
+
+    try:
+        return ENGINES[database_engine]
+    except KeyError:
+        raise ValueError(f"Unsupported database engine: {database_engine}")
+
+
+def archived_columns(schema):
+    """
+    Returns the columns of a table schema that are archived, leaving out the ones that were
+    deselected (existing set to false).
+    """
+
+    return [column for column in schema if column.get("existing", True)]
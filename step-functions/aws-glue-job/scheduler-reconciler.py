@@ -0,0 +1,96 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import boto3
+from botocore.config import Config
+from datetime import datetime, timezone
+import os
+import scheduler
+
+REGION = os.environ["REGION"]
+
+client = boto3.client(
+    "glue",
+    region_name=REGION,
+    config=Config(connect_timeout=5, read_timeout=60,
+                  retries={"max_attempts": 20}),
+)
+dynamodb = boto3.resource("dynamodb", region_name=REGION)
+ssm = boto3.client("ssm")
+
+
+def find_run(job_name, started_after):
+    """
+    Returns the newest run of a job started after its slot was acquired, or None. Such a run was
+    started by the slot's holder, which failed before recording it on the slot.
+    """
+
+    runs = []
+    paginator = client.get_paginator("get_job_runs")
+    try:
+        for page in paginator.paginate(JobName=job_name):
+            runs.extend(run for run in page["JobRuns"] if run["StartedOn"] >= started_after)
+    except client.exceptions.EntityNotFoundException:
+        return None
+    return max(runs, key=lambda run: run["StartedOn"], default=None)
+
+
+def reconcile_slot(summary_table, slot, now):
+    """
+    Frees a slot whose run ended without its state change being handled, or whose lease expired
+    without a run being started.
+
+    Returns:
+    bool: True if the slot was released.
+    """
+
+    if slot.get("job_run_id"):
+        try:
+            run_state = client.get_job_run(
+                JobName=slot["job_name"], RunId=slot["job_run_id"])["JobRun"]["JobRunState"]
+        except client.exceptions.EntityNotFoundException:
+            run_state = None
+        if run_state in scheduler.TERMINAL_STATES or run_state is None:
+            return scheduler.release_slot(summary_table, slot["id"]) is not None
+        return False
+
+    if datetime.fromisoformat(slot["lease_expires_at"]) > now:
+        return False
+
+    run = find_run(slot["job_name"], datetime.fromisoformat(slot["acquired_at"]))
+    if run and run["JobRunState"] not in scheduler.TERMINAL_STATES:
+        scheduler.bind_slot(summary_table, slot["id"], run["Id"])
+        return False
+    return scheduler.release_slot(summary_table, slot["id"]) is not None
+
+
+def lambda_handler(event, context):
+    summary_parameter = ssm.get_parameter(
+        Name="/archive/summary-dynamodb-table", WithDecryption=True)
+    summary_table = dynamodb.Table(summary_parameter["Parameter"]["Value"])
+
+    now = datetime.now(timezone.utc)
+    released = []
+    for slot in scheduler.list_slots(summary_table):
+        try:
+            if reconcile_slot(summary_table, slot, now):
+                released.append(slot["id"])
+        except Exception as ex:
+            # One slot that cannot be checked does not keep the others from being freed
+            print(f'Could not reconcile {slot["id"]}: {ex}')
+
+    dropped = scheduler.sweep_queue(summary_table, now)
+    print(f"Released {len(released)} slots, dropped {len(dropped)} abandoned queue entries")
+    return {"released": released, "dropped": dropped}
@@ -15,13 +15,105 @@ permissions and limitations under the License.
 
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from boto3.dynamodb.conditions import Key
+from engines import archived_columns
 
 REGION = os.getenv("REGION")
-client = boto3.client('glue', region_name=REGION)
+# Catalog writes are throttled per account; adaptive retries back off on throttling
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+client = boto3.client('glue', region_name=REGION, config=Config(
+    max_pool_connections=MAX_WORKERS, retries={'max_attempts': 10, 'mode': 'adaptive'}))
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 ssm = boto3.client('ssm')
 
 
+def get_table_details(details_table, archive_id):
+    # Query the per-table child items of the archive in their original order
+    table_details = []
+    query_args = {
+        "KeyConditionExpression": Key("archive_id").eq(archive_id) & Key("item_key").begins_with("table#")
+    }
+    while True:
+        response = details_table.query(**query_args)
+        table_details.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            break
+        query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    table_details.sort(key=lambda item: item.get("position", 0))
+    return table_details
+
+
+def table_done(tbl):
+    # A table is done when its last run succeeded and the count validation of its archived rows
+    # completed without a mismatch (a warning for an unbounded table counts as completed); a
+    # validation that is missing, still running or never compared with the source is redone
+    count_validation = tbl.get("count_validation", {})
+    return tbl.get("job_state") == "SUCCEEDED" \
+        and count_validation.get("state") == "SUCCEEDED" \
+        and "matches_source" in count_validation
+
+
+def get_existing_tables(database_name):
+    # List the database's tables once instead of probing each table with get_table
+    existing = {}
+    paginator = client.get_paginator('get_tables')
+    try:
+        for page in paginator.paginate(DatabaseName=database_name):
+            for table in page["TableList"]:
+                existing[table["Name"]] = table
+    except client.exceptions.EntityNotFoundException:
+        pass
+    return existing
+
+
+def build_table_input(table_name, columns, location):
+    return {
+        'Name': table_name,
+        'Description': 'TO ADD',
+        'StorageDescriptor': {
+            'Columns': columns,
+            'Location': location,
+            'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+            'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+            'Compressed': False,
+            'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
+        },
+        'TableType': "EXTERNAL_TABLE",
+        'Parameters': {
+            'classification': 'parquet',
+            'typeOfData': 'file',
+            # Lets Athena read objects restored from cold storage tiers
+            'read_restored_glacier_objects': 'true',
+        }
+    }
+
+
+def register_table(database_name, table_input, existing_table):
+    # Create missing tables and update the ones whose columns, location or parameters changed
+    if existing_table is None:
+        client.create_table(DatabaseName=database_name, TableInput=table_input)
+        return "created"
+
+    existing_descriptor = existing_table.get("StorageDescriptor", {})
+    existing_columns = [
+        {'Name': column["Name"], 'Type': column["Type"], 'Comment': column.get("Comment", '')}
+        for column in existing_descriptor.get("Columns", [])
+    ]
+    existing_parameters = existing_table.get("Parameters", {})
+    if existing_columns == table_input["StorageDescriptor"]["Columns"] \
+            and existing_descriptor.get("Location") == table_input["StorageDescriptor"]["Location"] \
+            and all(existing_parameters.get(key) == value for key, value in table_input["Parameters"].items()):
+        return "unchanged"
+
+    # Parameters set by other services (e.g. Athena statistics) are kept
+    client.update_table(DatabaseName=database_name, TableInput={
+        **table_input, 'Parameters': {**existing_parameters, **table_input["Parameters"]}})
+    return "updated"
+
+
 def lambda_handler(event, context):
 
     # Get SSM Parameter for DynamoDB Table name
@@ -31,51 +123,58 @@ def lambda_handler(event, context):
     # Get SSM Parameter for S3 Bucket name
     bucketParameter = ssm.get_parameter(
         Name='/job/s3-bucket-table-data', WithDecryption=True)
+    # Get SSM Parameter for DynamoDB Archive Details Table name
+    details_parameter = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
     table = dynamodb.Table(parameter['Parameter']['Value'])
+    details_table = dynamodb.Table(details_parameter['Parameter']['Value'])
 
     try:
-        for tbl in event["Item"]["table_details"]:
+        table_details = get_table_details(details_table, event["Item"]["id"])
+        if event.get("resume"):
+            # Only re-extract the tables that failed, never ran or were skipped when the
+            # maintenance window ended
+            table_details = [tbl for tbl in table_details if not table_done(tbl)]
+            print(f'Resuming archive {event["Item"]["id"]} with {len(table_details)} tables')
+            if not table_details:
+                # No run or validation will finish and update the archive, so it is archived here
+                table.update_item(
+                    Key={'id': event["Item"]["id"]},
+                    UpdateExpression="SET archive_status= :s, job_status= :j",
+                    ExpressionAttributeValues={':s': 'Archived', ':j': 'Succeeded'},
+                    ReturnValues="UPDATED_NEW"
+                )
+        database_name = f'{event["Item"]["id"]}-{event["Item"]["database"]}-database'
+        bucketName = bucketParameter['Parameter']['Value']
+        existing_tables = get_existing_tables(database_name)
+
+        registrations = []
+        for tbl in table_details:
             columns = []
-            for schema in tbl["schema"]:
-                print(schema)
+            for schema in archived_columns(tbl["schema"]):
                 columns.append({'Name': schema["key"], 'Type': schema["value"],
                                 'Comment': ''})
-            try:
-                client.get_table(
-                    DatabaseName=f'{event["Item"]["id"]}-{event["Item"]["database"]}-database',
-                    Name=f'{event["Item"]["id"]}-{event["Item"]["database"]}-{tbl["table"]}-table',
-                )
+            table_name = f'{event["Item"]["id"]}-{event["Item"]["database"]}-{tbl["table"]}-table'
+            table_input = build_table_input(
+                table_name,
+                columns,
+                f's3://{bucketName}/{event["Item"]["id"]}/{event["Item"]["database"]}/{tbl["table"]}'
+            )
+            # The catalog lower-cases table names
+            registrations.append((table_input, existing_tables.get(table_name.lower())))
 
-            except:
-                bucketName = bucketParameter['Parameter']['Value']
-                client.create_table(
-                    DatabaseName=f'{event["Item"]["id"]}-{event["Item"]["database"]}-database',
-                    TableInput={
-                        'Name': f'{event["Item"]["id"]}-{event["Item"]["database"]}-{tbl["table"]}-table',
-                        'Description': 'TO ADD',
-                        'StorageDescriptor': {
-                            'Columns': columns,
-                            'Location': f's3://{bucketName}/{event["Item"]["id"]}/{event["Item"]["database"]}/{tbl["table"]}',
-                            'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-                            'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-                            'Compressed': False,
-                            'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
-                        },
-                        'TableType': "EXTERNAL_TABLE",
-                        'Parameters': {
-                            'classification': 'parquet',
-                            'typeOfData': 'file',
-                        }
-                    }
-                )
             tbl["archive_id"] = event["Item"]["id"]
             tbl["database"] = event["Item"]["database"]
             tbl["database_engine"] = event["Item"]["database_engine"]
             tbl["oracle_owner"] = event["Item"]["oracle_owner"]
-            tbl["oracle_owner"] = event["Item"]["oracle_owner"]
             tbl["glue_capacity"] = event["Item"]["configuration"]["glue"]["glue_capacity"]
             tbl["glue_worker"] = event["Item"]["configuration"]["glue"]["glue_worker"]
 
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(executor.map(
+                lambda registration: register_table(database_name, *registration), registrations))
+        print({result: results.count(result) for result in set(results)})
+
     except:
         table.update_item(
             Key={'id': event["Item"]["id"]},
@@ -85,4 +184,9 @@ def lambda_handler(event, context):
         )
         raise
 
-    return {"Payload": event["Item"]["table_details"]}
+    return {"Payload": [
+        {key: value for key, value in tbl.items()
+         if key not in ("item_key", "position", "run_input", "run_attempts", "job_state", "job_run_id",
+                        "retried_run_id")}
+        for tbl in table_details
+    ]}
@@ -17,8 +17,13 @@ import boto3
 from botocore.config import Config
 import json
 import os
+import time
+from engines import archived_columns, get_engine
+import scheduler
 
 REGION = os.environ["REGION"]
+# Days a job registry item is kept; the handler of the job's state changes looks it up
+JOB_REGISTRY_TTL_DAYS = 30
 
 client = boto3.client(
     "glue",
@@ -45,176 +50,192 @@ def lambda_handler(event, context):
     temp_dir_parameter = ssm.get_parameter(
         Name="/glue/temp-dir", WithDecryption=True)
 
+    details_parameter = ssm.get_parameter(
+        Name="/archive/details-dynamodb-table", WithDecryption=True)
+    summary_parameter = ssm.get_parameter(
+        Name="/archive/summary-dynamodb-table", WithDecryption=True)
+    glue_jobs_parameter = ssm.get_parameter(
+        Name="/archive/glue-jobs-dynamodb-table", WithDecryption=True)
+
     table = dynamodb.Table(parameter["Parameter"]["Value"])
+    details_table = dynamodb.Table(details_parameter["Parameter"]["Value"])
+    summary_table = dynamodb.Table(summary_parameter["Parameter"]["Value"])
+    glue_jobs_table = dynamodb.Table(glue_jobs_parameter["Parameter"]["Value"])
     temp_dir_parameter_value = temp_dir_parameter["Parameter"]["Value"]
     dynamodb_response = table.get_item(Key={"id": event["archive_id"]})
+    target_file_size_mb = str(dynamodb_response["Item"]["configuration"]["glue"].get(
+        "target_file_size_mb", 256))
 
     try:
 
+        # New table runs only start inside the archive's maintenance window
+        window = dynamodb_response["Item"]["configuration"].get("window")
+        if window and not scheduler.window_open(window):
+            if window.get("on_close") == "stop":
+                table.update_item(
+                    Key={"id": event["archive_id"]},
+                    UpdateExpression="SET archive_status= :s",
+                    ExpressionAttributeValues={":s": "Stopped"},
+                )
+                # The state machine ends the table's iteration; a resumed run picks the table up
+                details_table.update_item(
+                    Key={"archive_id": event["archive_id"], "item_key": f'table#{event["table"]}'},
+                    UpdateExpression="SET job_state = :s",
+                    ConditionExpression="attribute_exists(item_key)",
+                    ExpressionAttributeValues={":s": "SKIPPED"},
+                )
+                raise scheduler.MaintenanceWindowEnded(
+                    f'Maintenance window of {event["archive_id"]} closed, not starting {event["table"]}')
+            raise scheduler.MaintenanceWindowClosed(
+                f'Waiting for the maintenance window of {event["archive_id"]} to start {event["table"]}')
+
+        engine = get_engine(event["database_engine"])
+        columns = archived_columns(event["table_details"])
+
         mappings = []
 
-        for schema in event["table_details"]:
+        for schema in columns:
             value = adjust_data_type(schema["value"])
             mappings.append(
                 [schema["key"], value, schema["key"], value]
             )
 
-        if event["database_engine"] == "mysql":
-            response = client.start_job_run(
-                JobName=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Arguments={
-                    "--job-language": "python",
-                    "--job-bookmark-option": "job-bookmark-disable",
-                    "--TempDir": f"s3://{temp_dir_parameter_value}/temporary/",
-                    "--enable-job-insights": "false",
-                    "--TABLE": event["table"],
-                    "--BUCKET": bucketParameter["Parameter"]["Value"],
-                    "--DATABASE": event["database"],
-                    "--ARCHIVE_ID": event["archive_id"],
-                    "--CONNECTION": f'{event["archive_id"]}-{event["database"]}-connection',
-                    "--MAPPINGS": json.dumps(mappings),
-                },
-                Timeout=2880,
-                WorkerType=dynamodb_response["Item"]["configuration"]["glue"][
-                    "glue_worker"
-                ],
-                NumberOfWorkers=int(
-                    dynamodb_response["Item"]["configuration"]["glue"]["glue_capacity"]
-                ),
-            )
-
-            table.update_item(
-                Key={"id": event["archive_id"]},
-                UpdateExpression=f'set jobs.{response["JobRunId"]} = :newJob',
-                ExpressionAttributeValues={
-                    ":newJob": {
-                        "job_run_id": response["JobRunId"],
-                        "state": "RUNNING",
-                        "timestamp": response["ResponseMetadata"]["HTTPHeaders"][
-                            "date"
-                        ],
-                        "message": "",
-                    }
-                },
-            )
-        elif event["database_engine"] == "mssql":
-            response = client.start_job_run(
-                JobName=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Arguments={
-                    "--job-language": "python",
-                    "--job-bookmark-option": "job-bookmark-disable",
-                    "--TempDir": f"s3://{temp_dir_parameter_value}/temporary/",
-                    "--enable-job-insights": "false",
-                    "--TABLE": event["table"],
-                    "--MSSQL_SCHEMA": event["mssql_schema"],
-                    "--BUCKET": bucketParameter["Parameter"]["Value"],
-                    "--DATABASE": event["database"],
-                    "--ARCHIVE_ID": event["archive_id"],
-                    "--CONNECTION": f'{event["archive_id"]}-{event["database"]}-connection',
-                    "--MAPPINGS": json.dumps(mappings),
-                },
-                Timeout=2880,
-                WorkerType=dynamodb_response["Item"]["configuration"]["glue"][
-                    "glue_worker"
-                ],
-                NumberOfWorkers=int(
-                    dynamodb_response["Item"]["configuration"]["glue"]["glue_capacity"]
-                ),
-            )
-
-            table.update_item(
-                Key={"id": event["archive_id"]},
-                UpdateExpression=f'set jobs.{response["JobRunId"]} = :newJob',
-                ExpressionAttributeValues={
-                    ":newJob": {
-                        "job_name": f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                        "job_run_id": response["JobRunId"],
-                        "state": "RUNNING",
-                        "timestamp": response["ResponseMetadata"]["HTTPHeaders"][
-                            "date"
-                        ],
-                    }
-                },
-            )
-
-        elif event["database_engine"] == "oracle":
+        job_name = f'{event["archive_id"]}-{event["database"]}-{event["table"]}'
+        arguments = {
+            "--job-language": "python",
+            "--job-bookmark-option": "job-bookmark-disable",
+            "--TempDir": f"s3://{temp_dir_parameter_value}/temporary/",
+            "--enable-job-insights": "false",
+            "--TABLE": event["table"],
+            "--BUCKET": bucketParameter["Parameter"]["Value"],
+            "--DATABASE": event["database"],
+            "--ARCHIVE_ID": event["archive_id"],
+            "--CONNECTION": f'{event["archive_id"]}-{event["database"]}-connection',
+            "--MAPPINGS": json.dumps(mappings),
+            "--TARGET_FILE_SIZE_MB": target_file_size_mb,
+        }
+        for argument, event_key in engine.table_arguments.items():
+            arguments[argument] = event[event_key]
+
+        table_details = details_table.get_item(
+            Key={"archive_id": event["archive_id"], "item_key": f'table#{event["table"]}'},
+            ProjectionExpression="read_options, row_filter, chunking"
+        ).get("Item", {})
+
+        # Read options of the engine, overridden by the archive configuration and then by the table
+        read_options = engine.resolve_read_options(
+            dynamodb_response["Item"]["configuration"]["glue"].get("read_options"),
+            table_details.get("read_options")
+        )
+
+        # Keep the parallel readers within the connection budget of the source database
+        source = scheduler.get_source(
+            summary_table, dynamodb_response["Item"]["hostname"], dynamodb_response["Item"]["port"])
+        connections = scheduler.limit_partitions(read_options, source)
+
+        if read_options:
+            arguments["--READ_OPTIONS"] = json.dumps(read_options)
+
+        # Read only the selected columns from the source when some were left out
+        if len(columns) < len(event["table_details"]):
+            arguments["--COLUMNS"] = json.dumps(
+                [engine.quote_identifier(schema["key"]) for schema in columns])
+
+        # Archive only the rows matching the table's predicate
+        if table_details.get("row_filter"):
+            arguments["--ROW_FILTER"] = table_details["row_filter"]
+
+        # Extract very large tables in key-range chunks that are restartable on their own; the
+        # chunks read in parallel share the connection budget of the source
+        chunking = table_details.get("chunking")
+        if chunking:
+            parallelism = scheduler.limit_chunk_parallelism(
+                int(chunking.get("parallelism", 1)), connections, source)
+            connections *= parallelism
+            arguments["--CHUNK_COLUMN"] = engine.quote_identifier(chunking["column"])
+            arguments["--CHUNK_COUNT"] = str(chunking.get("chunks", scheduler.DEFAULT_CHUNK_COUNT))
+            arguments["--CHUNK_PARALLELISM"] = str(parallelism)
+
+        worker_type = dynamodb_response["Item"]["configuration"]["glue"]["glue_worker"]
+        number_of_workers = int(
+            dynamodb_response["Item"]["configuration"]["glue"]["glue_capacity"]
+        )
+
+        # Register the job so its state changes map to the archive and table without parsing
+        # the job name, which is ambiguous when the database or table name has a hyphen
+        glue_jobs_table.put_item(
+            Item={
+                "job_name": job_name,
+                "archive_id": event["archive_id"],
+                "database": event["database"],
+                "table": event["table"],
+                "ttl": int(time.time()) + JOB_REGISTRY_TTL_DAYS * 24 * 3600,
+            }
+        )
+
+        # A slot left by an earlier invocation of this step for the same attempt is reused if
+        # its run never started, and freed if its run already ended
+        attempt = int(event.get("attempt", 1))
+        slot = scheduler.get_slot(summary_table, job_name, attempt)
+        if slot and slot.get("job_run_id"):
+            run_state = client.get_job_run(
+                JobName=job_name, RunId=slot["job_run_id"])["JobRun"]["JobRunState"]
+            if run_state not in scheduler.TERMINAL_STATES:
+                print(f'Run {slot["job_run_id"]} of {job_name} is already running')
+                return {"Payload": event}
+            scheduler.release_slot(summary_table, slot["id"], run_state)
+            slot = None
+
+        if slot and scheduler.renew_lease(summary_table, slot["id"]):
+            slot_id = slot["id"]
+        else:
+            # Wait for the DPU budget shared by all archives and the budget of the source database;
+            # raises GlueCapacityUnavailable, which the state machine retries with backoff
+            dpu = scheduler.run_dpu(worker_type, number_of_workers)
+            slot_id = scheduler.acquire(
+                summary_table, job_name, attempt, event["archive_id"], dpu, source, connections)
+
+        try:
             response = client.start_job_run(
-                JobName=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Arguments={
-                    "--job-language": "python",
-                    "--job-bookmark-option": "job-bookmark-disable",
-                    "--TempDir": f"s3://{temp_dir_parameter_value}/temporary/",
-                    "--enable-job-insights": "false",
-                    "--OWNER": event["oracle_owner"],
-                    "--TABLE": event["table"],
-                    "--BUCKET": bucketParameter["Parameter"]["Value"],
-                    "--DATABASE": event["database"],
-                    "--CONNECTION": f'{event["archive_id"]}-{event["database"]}-connection',
-                    "--ARCHIVE_ID": event["archive_id"],
-                    "--MAPPINGS": json.dumps(mappings),
-                },
+                JobName=job_name,
+                Arguments=arguments,
                 Timeout=2880,
-                WorkerType=dynamodb_response["Item"]["configuration"]["glue"][
-                    "glue_worker"
-                ],
-                NumberOfWorkers=int(
-                    dynamodb_response["Item"]["configuration"]["glue"]["glue_capacity"]
-                ),
-            )
-
-            table.update_item(
-                Key={"id": event["archive_id"]},
-                UpdateExpression=f'set jobs.{response["JobRunId"]} = :newJob',
-                ExpressionAttributeValues={
-                    ":newJob": {
-                        "job_run_id": response["JobRunId"],
-                        "state": "RUNNING",
-                        "timestamp": response["ResponseMetadata"]["HTTPHeaders"][
-                            "date"
-                        ],
-                        "message": "",
-                    }
-                },
+                WorkerType=worker_type,
+                NumberOfWorkers=number_of_workers,
             )
-
-        elif event["database_engine"] == "postgresql":
-            response = client.start_job_run(
-                JobName=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Arguments={
-                    "--job-language": "python",
-                    "--job-bookmark-option": "job-bookmark-disable",
-                    "--TempDir": f"s3://{temp_dir_parameter_value}/temporary/",
-                    "--enable-job-insights": "false",
-                    "--TABLE": event["table"],
-                    "--BUCKET": bucketParameter["Parameter"]["Value"],
-                    "--DATABASE": event["database"],
-                    "--ARCHIVE_ID": event["archive_id"],
-                    "--CONNECTION": f'{event["archive_id"]}-{event["database"]}-connection',
-                    "--MAPPINGS": json.dumps(mappings),
-                },
-                Timeout=2880,
-                WorkerType=dynamodb_response["Item"]["configuration"]["glue"][
-                    "glue_worker"
+        except Exception:
+            scheduler.release_slot(summary_table, slot_id)
+            raise
+        scheduler.bind_slot(summary_table, slot_id, response["JobRunId"])
+
+        details_table.put_item(
+            Item={
+                "archive_id": event["archive_id"],
+                "item_key": f'job#{response["JobRunId"]}',
+                "job_name": job_name,
+                "job_run_id": response["JobRunId"],
+                "state": "RUNNING",
+                "timestamp": response["ResponseMetadata"]["HTTPHeaders"][
+                    "date"
                 ],
-                NumberOfWorkers=int(
-                    dynamodb_response["Item"]["configuration"]["glue"]["glue_capacity"]
-                ),
-            )
-
-            table.update_item(
-                Key={"id": event["archive_id"]},
-                UpdateExpression=f'set jobs.{response["JobRunId"]} = :newJob',
-                ExpressionAttributeValues={
-                    ":newJob": {
-                        "job_name": f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                        "job_run_id": response["JobRunId"],
-                        "state": "RUNNING",
-                        "timestamp": response["ResponseMetadata"]["HTTPHeaders"][
-                            "date"
-                        ],
-                    }
-                },
-            )
+                "message": "",
+                # Released by the job state change handler when the run ends, or by the
+                # scheduler reconciler if the end is never recorded
+                "scheduler_slot": slot_id,
+            }
+        )
+
+        # Keep the run's input on the table so that a failed run can be retried on its own
+        details_table.update_item(
+            Key={"archive_id": event["archive_id"], "item_key": f'table#{event["table"]}'},
+            UpdateExpression="SET run_input = :i, run_attempts = :a, job_run_id = :r, job_state = :s",
+            ExpressionAttributeValues={
+                ":i": {key: value for key, value in event.items() if key not in ("attempt", "retry_delay")},
+                ":a": int(event.get("attempt", 1)),
+                ":r": response["JobRunId"],
+                ":s": "RUNNING",
+            }
+        )
     except Exception as ex:
         print(ex)
         print("error")
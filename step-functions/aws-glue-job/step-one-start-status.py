@@ -31,10 +31,25 @@ def lambda_handler(event, context):
         # Get record from DynamoDB Table
         table = dynamodb.Table(parameter["Parameter"]["Value"])
 
+        # A resumed archive starts over from the tables that did not succeed, so the
+        # failure of the previous run no longer applies
+        update_expression = "SET archive_status= :s"
+        expression_values = {":s": "Archiving", ":one": 1}
+        if event.get("resume"):
+            update_expression += ", job_status= :j"
+            expression_values[":j"] = ""
+        # Each run counts its own validations; left over counters would finish the archive
+        # before the run's validations completed
+        update_expression += ", counters.validation = :counters"
+        expression_values[":counters"] = {"validation_count": 0, "validation_completed": 0}
+        # Materialized views record the run they were built from and are refreshed after
+        # the next one
+        update_expression += " ADD run_count :one"
+
         table.update_item(
             Key={"id": event["archive_id"]},
-            UpdateExpression="SET archive_status= :s",
-            ExpressionAttributeValues={":s": "Archiving"},
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=expression_values,
             ReturnValues="UPDATED_NEW",
         )
 
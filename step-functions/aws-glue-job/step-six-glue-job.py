@@ -16,6 +16,7 @@ permissions and limitations under the License.
 import boto3
 import os
 from botocore.config import Config
+from engines import get_engine
 
 REGION = os.environ["REGION"]
 ARTIFACT_BUCKET_NAME = os.environ["ARTIFACT_BUCKET_NAME"]
@@ -29,101 +30,34 @@ dynamodb = boto3.resource('dynamodb', region_name=REGION)
 
 def lambda_handler(event, context):
     try:
-        if event["database_engine"] == "mysql":
-            client.create_job(
-                Name=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Role=AWS_GLUE_ROLE,
-                Command={
-                    'Name': 'glueetl',
-                    'ScriptLocation': f's3://{ARTIFACT_BUCKET_NAME}/scripts/mysql-1-0-0.py',
-                    'PythonVersion': '3'
-                },
-                DefaultArguments={
-                    '--TempDir': f's3://{TEMP_GLUE_BUCKET_NAME}/temp/',
-                    '--job-bookmark-option': 'job-bookmark-disable'
-                },
-                MaxRetries=0,
-                GlueVersion='3.0',
-                NumberOfWorkers=int(event["glue_capacity"]),
-                WorkerType=event["glue_worker"],
-                Connections={
-                    'Connections': [
-                        f'{event["archive_id"]}-{event["database"]}-connection',
-                    ]
-                }
-            )
-        elif event["database_engine"] == "mssql":
-            client.create_job(
-                Name=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Role=AWS_GLUE_ROLE,
-                Command={
-                    'Name': 'glueetl',
-                    'ScriptLocation': f's3://{ARTIFACT_BUCKET_NAME}/scripts/mssql-1-0-0.py',
-                    'PythonVersion': '3'
-                },
-                DefaultArguments={
-                    '--TempDir': f's3://{TEMP_GLUE_BUCKET_NAME}/temp/',
-                    '--job-bookmark-option': 'job-bookmark-disable',
-                    '--disable-proxy-v2': 'true'
-                },
-                MaxRetries=0,
-                GlueVersion='3.0',
-                NumberOfWorkers=int(event["glue_capacity"]),
-                WorkerType=event["glue_worker"],
-                Connections={
-                    'Connections': [
-                        f'{event["archive_id"]}-{event["database"]}-connection',
-                    ]
-                }
-            )
-        elif event["database_engine"] == "oracle":
-            client.create_job(
-                Name=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Role=AWS_GLUE_ROLE,
-                Command={
-                    'Name': 'glueetl',
-                    'ScriptLocation': f's3://{ARTIFACT_BUCKET_NAME}/scripts/oracle-1-0-4.py',
-                    'PythonVersion': '3'
-                },
-                DefaultArguments={
-                    '--TempDir': f's3://{TEMP_GLUE_BUCKET_NAME}/temp/',
-                    '--job-bookmark-option': 'job-bookmark-disable'
-                },
-                MaxRetries=0,
-                GlueVersion='3.0',
-                NumberOfWorkers=int(event["glue_capacity"]),
-                WorkerType=event["glue_worker"],
-                Connections={
-                    'Connections': [
-                        f'{event["archive_id"]}-{event["database"]}-connection',
-                    ]
-                }
-            )
-        elif event["database_engine"] == "postgresql":
-            client.create_job(
-                Name=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
-                Role=AWS_GLUE_ROLE,
-                Command={
-                    'Name': 'glueetl',
-                    'ScriptLocation': f's3://{ARTIFACT_BUCKET_NAME}/scripts/postgresql-1-0-0.py',
-                    'PythonVersion': '3'
-                },
-                DefaultArguments={
-                    '--TempDir': f's3://{TEMP_GLUE_BUCKET_NAME}/temp/',
-                    '--job-bookmark-option': 'job-bookmark-disable',
-                    '--disable-proxy-v2': 'true'
-                },
-                MaxRetries=0,
-                GlueVersion='3.0',
-                NumberOfWorkers=int(event["glue_capacity"]),
-                WorkerType=event["glue_worker"],
-                Connections={
-                    'Connections': [
-                        f'{event["archive_id"]}-{event["database"]}-connection',
-                    ]
-                }
-            )
+        engine = get_engine(event["database_engine"])
+        client.create_job(
+            Name=f'{event["archive_id"]}-{event["database"]}-{event["table"]}',
+            Role=AWS_GLUE_ROLE,
+            Command={
+                'Name': 'glueetl',
+                'ScriptLocation': f's3://{ARTIFACT_BUCKET_NAME}/scripts/{engine.script}',
+                'PythonVersion': '3'
+            },
+            DefaultArguments={
+                '--TempDir': f's3://{TEMP_GLUE_BUCKET_NAME}/temp/',
+                '--job-bookmark-option': 'job-bookmark-disable',
+                **engine.job_arguments
+            },
+            MaxRetries=0,
+            GlueVersion='3.0',
+            NumberOfWorkers=int(event["glue_capacity"]),
+            WorkerType=event["glue_worker"],
+            Connections={
+                'Connections': [
+                    f'{event["archive_id"]}-{event["database"]}-connection',
+                ]
+            }
+        )
 
+    except client.exceptions.AlreadyExistsException:
+        # Resumed archives keep the jobs of their earlier run
+        print(f'Job {event["archive_id"]}-{event["database"]}-{event["table"]} already exists')
     except Exception as ex:
         print(ex)
         print('error')
@@ -15,6 +15,7 @@ permissions and limitations under the License.
 
 import boto3
 import os
+from engines import get_engine
 
 AVAILABILITY_ZONE = os.environ["AVAILABILITY_ZONE"]
 SUBNET_ID = os.environ["SUBNET_ID"]
@@ -50,94 +51,29 @@ def lambda_handler(event, context):
             secret_value = secret_client.get_secret_value(
                 SecretId=dynamodb_response["Item"]["secret_arn"])
             print(secret_value["SecretString"])
-            if dynamodb_response["Item"]["database_engine"] == "mysql":
-                glue_client.create_connection(
-                    ConnectionInput={
-                        'Name': f'{dynamodb_response["Item"]["id"]}-{dynamodb_response["Item"]["database"]}-connection',
-                        'Description': f'Connection for archive ID: {dynamodb_response["Item"]["id"]}',
-                        'ConnectionType': 'JDBC',
-                        'ConnectionProperties': {
-                            'USERNAME': dynamodb_response["Item"]["username"],
-                            'JDBC_ENFORCE_SSL': 'false',
-                            'PASSWORD': secret_value["SecretString"],
-                            'JDBC_CONNECTION_URL': f'jdbc:mysql://{dynamodb_response["Item"]["hostname"]}:{dynamodb_response["Item"]["port"]}/{dynamodb_response["Item"]["database"]}'
-                        },
-                        'PhysicalConnectionRequirements': {
-                            'SubnetId': SUBNET_ID,
-                            'SecurityGroupIdList': [
-                                RDS_SECURITY_GROUP,
-                                VPC_DEFAULT_SECURITY_GROUP,
-                            ],
-                            'AvailabilityZone': AVAILABILITY_ZONE
-                        }
+            item = dynamodb_response["Item"]
+            engine = get_engine(item["database_engine"])
+            glue_client.create_connection(
+                ConnectionInput={
+                    'Name': f'{item["id"]}-{item["database"]}-connection',
+                    'Description': f'Connection for archive ID: {item["id"]}',
+                    'ConnectionType': 'JDBC',
+                    'ConnectionProperties': {
+                        'USERNAME': item["username"],
+                        'JDBC_ENFORCE_SSL': 'false',
+                        'PASSWORD': secret_value["SecretString"],
+                        'JDBC_CONNECTION_URL': engine.connection_url(item["hostname"], item["port"], item["database"])
+                    },
+                    'PhysicalConnectionRequirements': {
+                        'SubnetId': SUBNET_ID,
+                        'SecurityGroupIdList': [
+                            RDS_SECURITY_GROUP,
+                            VPC_DEFAULT_SECURITY_GROUP,
+                        ],
+                        'AvailabilityZone': AVAILABILITY_ZONE
                     }
-                )
-            elif dynamodb_response["Item"]["database_engine"] == "mssql":
-                glue_client.create_connection(
-                    ConnectionInput={
-                        'Name': f'{dynamodb_response["Item"]["id"]}-{dynamodb_response["Item"]["database"]}-connection',
-                        'Description': f'Connection for archive ID: {dynamodb_response["Item"]["id"]}',
-                        'ConnectionType': 'JDBC',
-                        'ConnectionProperties': {
-                            'USERNAME': dynamodb_response["Item"]["username"],
-                            'JDBC_ENFORCE_SSL': 'false',
-                            'PASSWORD': secret_value["SecretString"],
-                            'JDBC_CONNECTION_URL': f'jdbc:sqlserver://{dynamodb_response["Item"]["hostname"]}:{dynamodb_response["Item"]["port"]};database={dynamodb_response["Item"]["database"]}'
-                        },
-                        'PhysicalConnectionRequirements': {
-                            'SubnetId': SUBNET_ID,
-                            'SecurityGroupIdList': [
-                                RDS_SECURITY_GROUP,
-                                VPC_DEFAULT_SECURITY_GROUP,
-                            ],
-                            'AvailabilityZone': AVAILABILITY_ZONE
-                        }
-                    }
-                )
-            elif dynamodb_response["Item"]["database_engine"] == "oracle":
-                glue_client.create_connection(
-                    ConnectionInput={
-                        'Name': f'{dynamodb_response["Item"]["id"]}-{dynamodb_response["Item"]["database"]}-connection',
-                        'Description': f'Connection for archive ID: {dynamodb_response["Item"]["id"]}',
-                        'ConnectionType': 'JDBC',
-                        'ConnectionProperties': {
-                            'USERNAME': dynamodb_response["Item"]["username"],
-                            'JDBC_ENFORCE_SSL': 'false',
-                            'PASSWORD': secret_value["SecretString"],
-                            'JDBC_CONNECTION_URL': f'jdbc:oracle://{dynamodb_response["Item"]["hostname"]}:{dynamodb_response["Item"]["port"]}/{dynamodb_response["Item"]["database"]}'
-                        },
-                        'PhysicalConnectionRequirements': {
-                            'SubnetId': SUBNET_ID,
-                            'SecurityGroupIdList': [
-                                RDS_SECURITY_GROUP,
-                                VPC_DEFAULT_SECURITY_GROUP,
-                            ],
-                            'AvailabilityZone': AVAILABILITY_ZONE
-                        }
-                    }
-                )
-            elif dynamodb_response["Item"]["database_engine"] == "postgresql":
-                glue_client.create_connection(
-                    ConnectionInput={
-                        'Name': f'{dynamodb_response["Item"]["id"]}-{dynamodb_response["Item"]["database"]}-connection',
-                        'Description': f'Connection for archive ID: {dynamodb_response["Item"]["id"]}',
-                        'ConnectionType': 'JDBC',
-                        'ConnectionProperties': {
-                            'USERNAME': dynamodb_response["Item"]["username"],
-                            'JDBC_ENFORCE_SSL': 'false',
-                            'PASSWORD': secret_value["SecretString"],
-                            'JDBC_CONNECTION_URL': f'jdbc:postgresql://{dynamodb_response["Item"]["hostname"]}:{dynamodb_response["Item"]["port"]}/{dynamodb_response["Item"]["database"]}'
-                        },
-                        'PhysicalConnectionRequirements': {
-                            'SubnetId': SUBNET_ID,
-                            'SecurityGroupIdList': [
-                                RDS_SECURITY_GROUP,
-                                VPC_DEFAULT_SECURITY_GROUP,
-                            ],
-                            'AvailabilityZone': AVAILABILITY_ZONE
-                        }
-                    }
-                )
+                }
+            )
         except:
             table.update_item(
                 Key={'id': event["archive_id"]},
@@ -147,4 +83,5 @@ def lambda_handler(event, context):
             )
             raise
 
+    dynamodb_response["resume"] = bool(event.get("resume"))
     return dynamodb_response
@@ -0,0 +1,464 @@
+"""
+Copyright 2025 Amazon.com, Inc. and its affiliates. All Rights Reserved.
+
+Licensed under the Amazon Software License (the "License").
+You may not use this file except in compliance with the License.
+A copy of the License is located at
+
+  http://aws.amazon.com/asl/
+
+or in the "license" file accompanying this file. This file is distributed
+on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+express or implied. See the License for the specific language governing
+permissions and limitations under the License.
+"""
+
+import math
+import os
+import time as clock
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+# The scheduler state lives in the archive summary table, next to the archive counters. The
+# "glue-scheduler" item holds the DPUs and runs in use across all archives and the set of job
+# runs waiting for capacity, whose size is the queue depth, with the time each was last queued.
+# A "source#<hostname>:<port>" item per source database holds the runs and JDBC connections in
+# use against it. A "slot#<job name>#<attempt>" item per admitted run holds what the run
+# reserved until the run's end is recorded.
+SCHEDULER_ID = "glue-scheduler"
+SOURCE_ID_PREFIX = "source#"
+SLOT_ID_PREFIX = "slot#"
+# A slot whose run is not recorded on it within the lease is checked against Glue by the reconciler
+SLOT_LEASE_SECONDS = int(os.getenv("SLOT_LEASE_SECONDS", "900"))
+# Slot items outlive the longest Glue run (2880 minutes) before DynamoDB removes them
+SLOT_TTL_SECONDS = 3 * 24 * 3600
+# Waiting runs queue again at least every 10 minutes; names not queued for longer are abandoned
+QUEUE_ABANDON_SECONDS = int(os.getenv("QUEUE_ABANDON_SECONDS", "1800"))
+TERMINAL_STATES = ("SUCCEEDED", "FAILED", "TIMEOUT", "STOPPED", "ERROR")
+# Run outcomes that point at an overloaded source database, and that are retried
+SOURCE_OVERLOAD_STATES = ("FAILED", "TIMEOUT", "ERROR")
+MAX_DPU = int(os.getenv("GLUE_MAX_DPU", "100"))
+MAX_CONCURRENT_RUNS = int(os.getenv("GLUE_MAX_CONCURRENT_RUNS", "30"))
+# Defaults for a new source; max_connections and max_runs can be changed on its item, e.g.
+# raised for a maintenance window
+SOURCE_MAX_CONNECTIONS = int(os.getenv("SOURCE_MAX_CONNECTIONS", "10"))
+SOURCE_MAX_RUNS = int(os.getenv("SOURCE_MAX_RUNS", "4"))
+# Glue reads with 7 partitions when a hash field is given without hashpartitions
+GLUE_DEFAULT_HASH_PARTITIONS = 7
+# Key ranges a chunked table is split into when its chunking does not say
+DEFAULT_CHUNK_COUNT = 16
+
+serializer = TypeSerializer()
+
+DPU_PER_WORKER = {
+    "Standard": 1,
+    "G.025X": 0.25,
+    "G.1X": 1,
+    "G.2X": 2,
+    "G.4X": 4,
+    "G.8X": 8,
+}
+
+
+class GlueCapacityUnavailable(Exception):
+    """
+    Raised when a Glue run does not fit in the remaining DPU or run budget. The state machine
+    retries the step with backoff until capacity is released.
+    """
+
+
+class MaintenanceWindowClosed(Exception):
+    """
+    Raised when a table run would start outside the archive's maintenance window. The state
+    machine retries the step until the window opens again.
+    """
+
+
+class MaintenanceWindowEnded(Exception):
+    """
+    Raised when a table run would start outside the archive's maintenance window and the window
+    stops the archive when it closes. Not retried; the state machine catches it and skips the table.
+    """
+
+
+def window_open(window, now=None):
+    """
+    Returns whether now is inside the maintenance window. Windows whose end is before their
+    start run over midnight.
+    """
+
+    now = now or datetime.now(ZoneInfo(window.get("timezone", "UTC")))
+    start = time.fromisoformat(window["start"])
+    end = time.fromisoformat(window["end"])
+    current = now.time().replace(tzinfo=None)
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def run_dpu(worker_type, number_of_workers):
+    return math.ceil(DPU_PER_WORKER.get(worker_type, 1) * number_of_workers)
+
+
+def source_id(hostname, port):
+    return f"{SOURCE_ID_PREFIX}{hostname}:{port}"
+
+
+def slot_id(job_name, attempt):
+    return f"{SLOT_ID_PREFIX}{job_name}#{attempt}"
+
+
+def get_slot(summary_table, job_name, attempt):
+    return summary_table.get_item(
+        Key={"id": slot_id(job_name, attempt)}, ConsistentRead=True).get("Item")
+
+
+def list_slots(summary_table):
+    slots = []
+    scan_args = {"FilterExpression": Attr("id").begins_with(SLOT_ID_PREFIX), "ConsistentRead": True}
+    while True:
+        response = summary_table.scan(**scan_args)
+        slots.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            return slots
+        scan_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def get_source(summary_table, hostname, port):
+    """
+    Returns the budget and usage of a source database, with the defaults for a new source.
+
+    effective_limit is the number of connections currently allowed. It starts at max_connections,
+    is halved when a run against the source fails and grows back by one with each run that
+    succeeds.
+    """
+
+    item = summary_table.get_item(
+        Key={"id": source_id(hostname, port)}, ConsistentRead=True).get("Item", {})
+    max_connections = int(item.get("max_connections", SOURCE_MAX_CONNECTIONS))
+    return {
+        "id": source_id(hostname, port),
+        "version": int(item.get("version", 0)),
+        "max_connections": max_connections,
+        "max_runs": int(item.get("max_runs", SOURCE_MAX_RUNS)),
+        "effective_limit": int(item.get("effective_limit", max_connections)),
+        "connections_in_use": int(item.get("connections_in_use", 0)),
+        "runs_in_use": int(item.get("runs_in_use", 0)),
+    }
+
+
+def limit_partitions(read_options, source):
+    """
+    Caps the JDBC partitions of a run at the source's connection limit.
+
+    Each partition is read over its own connection. Reads without a hash field or expression
+    use a single connection.
+
+    Returns:
+    int: The number of connections the run opens.
+    """
+
+    if "hashfield" not in read_options and "hashexpression" not in read_options:
+        return 1
+
+    partitions = int(read_options.get("hashpartitions", GLUE_DEFAULT_HASH_PARTITIONS))
+    partitions = max(1, min(partitions, source["effective_limit"]))
+    read_options["hashpartitions"] = str(partitions)
+    return partitions
+
+
+def limit_chunk_parallelism(parallelism, connections, source):
+    """
+    Caps the number of chunks a run extracts at the same time so that their connections fit
+    in the source's connection limit.
+    """
+
+    return max(1, min(parallelism, source["effective_limit"] // connections))
+
+
+def update(table_name, key, update_expression, expression_values, condition_expression):
+    return {
+        "Update": {
+            "TableName": table_name,
+            "Key": {name: serializer.serialize(value) for name, value in key.items()},
+            "UpdateExpression": update_expression,
+            "ConditionExpression": condition_expression,
+            "ExpressionAttributeValues": {
+                name: serializer.serialize(value) for name, value in expression_values.items()
+            },
+        }
+    }
+
+
+def queue(summary_table, job_name, message):
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        summary_table.update_item(
+            Key={"id": SCHEDULER_ID},
+            UpdateExpression="ADD queued :job SET queued_at.#job = :now",
+            ExpressionAttributeNames={"#job": job_name},
+            ExpressionAttributeValues={":job": {job_name}, ":now": now}
+        )
+    except ClientError as ex:
+        if ex.response["Error"]["Code"] != "ValidationException":
+            raise
+        # The map of queue times does not exist yet; a time lost to a concurrent first write
+        # is set by the reconciler
+        summary_table.update_item(
+            Key={"id": SCHEDULER_ID},
+            UpdateExpression="ADD queued :job SET queued_at = :times",
+            ExpressionAttributeValues={":job": {job_name}, ":times": {job_name: now}}
+        )
+    raise GlueCapacityUnavailable(message)
+
+
+def acquire(summary_table, job_name, attempt, archive_id, dpu, source, connections):
+    """
+    Admits a Glue run if it fits in both the shared DPU budget and the budget of its source
+    database, or queues it.
+
+    Both reservations and the run's slot item are written in one transaction. The global budget
+    is checked in its condition; the source budget is checked against the item read by
+    get_source, and the transaction only succeeds if the source item has not changed since. A
+    run larger than the whole DPU budget is admitted only when nothing else is running.
+
+    The slot holds a lease until the started run is recorded on it with bind_slot; the reconciler
+    frees slots whose lease expired without a run, and slots whose run ended unnoticed.
+
+    Returns:
+    str: The ID of the run's slot.
+
+    Raises:
+    GlueCapacityUnavailable: If the run has to wait.
+    """
+
+    if source["runs_in_use"] + 1 > source["max_runs"] \
+            or (source["connections_in_use"] and
+                source["connections_in_use"] + connections > source["effective_limit"]):
+        queue(summary_table, job_name, f'Waiting for {connections} connections to {source["id"]} to start {job_name}')
+
+    now = datetime.now(timezone.utc)
+    try:
+        summary_table.meta.client.transact_write_items(TransactItems=[
+            update(
+                summary_table.name,
+                {"id": SCHEDULER_ID},
+                "ADD dpu_in_use :d, runs_in_use :one DELETE queued :job",
+                {
+                    ":d": dpu,
+                    ":one": 1,
+                    ":job": {job_name},
+                    ":dpu_limit": max(MAX_DPU - dpu, 0),
+                    ":run_limit": MAX_CONCURRENT_RUNS - 1,
+                },
+                "(attribute_not_exists(dpu_in_use) OR dpu_in_use <= :dpu_limit) "
+                "AND (attribute_not_exists(runs_in_use) OR runs_in_use <= :run_limit)"
+            ),
+            update(
+                summary_table.name,
+                {"id": source["id"]},
+                "SET version = :next, max_connections = if_not_exists(max_connections, :max_connections), "
+                "max_runs = if_not_exists(max_runs, :max_runs), "
+                "effective_limit = if_not_exists(effective_limit, :max_connections) "
+                "ADD runs_in_use :one, connections_in_use :c",
+                {
+                    ":next": source["version"] + 1,
+                    ":version": source["version"],
+                    ":max_connections": source["max_connections"],
+                    ":max_runs": source["max_runs"],
+                    ":one": 1,
+                    ":c": connections,
+                },
+                "attribute_not_exists(version) OR version = :version"
+            ),
+            {
+                "Put": {
+                    "TableName": summary_table.name,
+                    "Item": {name: serializer.serialize(value) for name, value in {
+                        "id": slot_id(job_name, attempt),
+                        "job_name": job_name,
+                        "attempt": attempt,
+                        "archive_id": archive_id,
+                        "scheduler_dpu": dpu,
+                        "scheduler_source": source["id"],
+                        "scheduler_connections": connections,
+                        "acquired_at": now.isoformat(),
+                        "lease_expires_at": (now + timedelta(seconds=SLOT_LEASE_SECONDS)).isoformat(),
+                        "ttl": int(clock.time()) + SLOT_TTL_SECONDS,
+                    }.items()},
+                    "ConditionExpression": "attribute_not_exists(id)",
+                }
+            },
+        ])
+    except summary_table.meta.client.exceptions.TransactionCanceledException:
+        queue(summary_table, job_name, f"Waiting for {dpu} DPU to start {job_name}")
+    return slot_id(job_name, attempt)
+
+
+def renew_lease(summary_table, slot):
+    """
+    Extends the lease of a slot whose run has not started yet.
+
+    Returns:
+    bool: False if the slot was released in the meantime.
+    """
+
+    try:
+        summary_table.update_item(
+            Key={"id": slot},
+            UpdateExpression="SET lease_expires_at = :l",
+            ConditionExpression="attribute_exists(id) AND attribute_not_exists(job_run_id)",
+            ExpressionAttributeValues={
+                ":l": (datetime.now(timezone.utc) + timedelta(seconds=SLOT_LEASE_SECONDS)).isoformat()
+            }
+        )
+        return True
+    except summary_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def bind_slot(summary_table, slot, job_run_id):
+    """
+    Records the started run on its slot, which ends the slot's lease.
+    """
+
+    try:
+        summary_table.update_item(
+            Key={"id": slot},
+            UpdateExpression="SET job_run_id = :r REMOVE lease_expires_at",
+            ConditionExpression="attribute_exists(id)",
+            ExpressionAttributeValues={":r": job_run_id}
+        )
+    except summary_table.meta.client.exceptions.ConditionalCheckFailedException:
+        # Only when the run started after the lease expired and the reconciler freed the slot
+        print(f"Slot {slot} was released before run {job_run_id} was recorded on it")
+
+
+def release_slot(summary_table, slot, job_state=None):
+    """
+    Returns the DPUs and connections of a slot to the budgets and deletes it. The delete is
+    conditional, so a slot is released once even when the job state change handler and the
+    reconciler release it at the same time.
+
+    When the state the slot's run ended in is known, the connection limit of its source database
+    is adapted: a failed or timed out run halves it, a successful run raises it by one, up to the
+    source's max_connections (see release_source).
+
+    Returns:
+    dict: The released slot, or None if it was already released.
+    """
+
+    try:
+        released = summary_table.delete_item(
+            Key={"id": slot},
+            ConditionExpression="attribute_exists(id)",
+            ReturnValues="ALL_OLD"
+        )["Attributes"]
+    except summary_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+
+    summary_table.update_item(
+        Key={"id": SCHEDULER_ID},
+        UpdateExpression="ADD dpu_in_use :d, runs_in_use :one",
+        ExpressionAttributeValues={":d": -released["scheduler_dpu"], ":one": -1}
+    )
+    release_source(summary_table, released["scheduler_source"], released["scheduler_connections"], job_state)
+    return released
+
+
+def release_source(summary_table, source, connections, job_state=None):
+    """
+    Returns a run's connections to the budget of its source database and adapts the source's
+    connection limit to the state the run ended in.
+
+    Like acquire, the write is conditional on the version of the source item it read and bumps
+    it, so a release and an acquire that read the item at the same time cannot overwrite each
+    other; the loser reads the item again. A limit another run changed in the meantime is not
+    adapted again, so runs that fail together halve it once.
+    """
+
+    seen_limit = None
+    while True:
+        item = summary_table.get_item(Key={"id": source}, ConsistentRead=True).get("Item", {})
+        version = int(item.get("version", 0))
+        max_connections = int(item.get("max_connections", SOURCE_MAX_CONNECTIONS))
+        limit = int(item.get("effective_limit", max_connections))
+        if seen_limit is None:
+            seen_limit = limit
+        if limit == seen_limit:
+            if job_state in SOURCE_OVERLOAD_STATES:
+                limit = max(1, limit // 2)
+            elif job_state == "SUCCEEDED":
+                limit = min(max_connections, limit + 1)
+
+        try:
+            summary_table.update_item(
+                Key={"id": source},
+                UpdateExpression="SET version = :next, effective_limit = :limit "
+                                 "ADD runs_in_use :one, connections_in_use :c",
+                ConditionExpression="attribute_not_exists(version) OR version = :version",
+                ExpressionAttributeValues={
+                    ":next": version + 1,
+                    ":version": version,
+                    ":limit": limit,
+                    ":one": -1,
+                    ":c": -connections,
+                }
+            )
+            return
+        except summary_table.meta.client.exceptions.ConditionalCheckFailedException:
+            continue
+
+
+def sweep_queue(summary_table, now=None):
+    """
+    Drops the names of runs that stopped waiting without being admitted, e.g. because their
+    execution was aborted or ran out of retries, from the queued set.
+
+    Returns:
+    list: The dropped job names.
+    """
+
+    now = now or datetime.now(timezone.utc)
+    item = summary_table.get_item(Key={"id": SCHEDULER_ID}, ConsistentRead=True).get("Item", {})
+    queued = item.get("queued", set())
+    queued_at = item.get("queued_at", {})
+    abandon_before = (now - timedelta(seconds=QUEUE_ABANDON_SECONDS)).isoformat()
+
+    abandoned = {name for name in queued if name in queued_at and queued_at[name] < abandon_before}
+    # Admitted runs leave their queue time behind
+    stale_times = [name for name in queued_at if name not in queued or name in abandoned]
+    untimed = [name for name in queued if name not in queued_at]
+    if not (abandoned or stale_times or untimed):
+        return []
+
+    names = {}
+    values = {}
+    set_clauses = []
+    if untimed and not queued_at:
+        set_clauses.append("queued_at = :times")
+        values[":times"] = {name: now.isoformat() for name in untimed}
+    for index, name in enumerate(untimed if queued_at else []):
+        names[f"#u{index}"] = name
+        set_clauses.append(f"queued_at.#u{index} = :now")
+        values[":now"] = now.isoformat()
+    update_expression = "SET " + ", ".join(set_clauses) if set_clauses else ""
+    if stale_times:
+        for index, name in enumerate(stale_times):
+            names[f"#s{index}"] = name
+        update_expression += " REMOVE " + ", ".join(f"queued_at.#s{index}" for index in range(len(stale_times)))
+    if abandoned:
+        update_expression += " DELETE queued :abandoned"
+        values[":abandoned"] = abandoned
+
+    update_args = {"Key": {"id": SCHEDULER_ID}, "UpdateExpression": update_expression.strip()}
+    if names:
+        update_args["ExpressionAttributeNames"] = names
+    if values:
+        update_args["ExpressionAttributeValues"] = values
+    summary_table.update_item(**update_args)
+    return sorted(abandoned)
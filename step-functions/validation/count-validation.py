@@ -15,23 +15,43 @@ permissions and limitations under the License.
 
 
 import boto3
+import json
 import os
 
 REGION = os.getenv("REGION")
 CLIENT = boto3.client("athena")
+s3 = boto3.client('s3')
 ssm = boto3.client('ssm')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
+# Written next to the table's files by the Glue job: the source rows matching the archived range
+SOURCE_COUNT_FILE = "_sdas_source_count.json"
 
-def count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, TABLE_INDEX):
+
+def get_source_count(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME):
+    """
+    Returns the source row count the Glue job recorded for the table, or None if it recorded none.
+    """
+
+    bucket_parameter = ssm.get_parameter(
+        Name='/job/s3-bucket-table-data', WithDecryption=True)
+    key = f'{ARCHIVE_ID}/{DATABASE_NAME}/{TABLE_NAME}/{SOURCE_COUNT_FILE}'
+    try:
+        body = s3.get_object(Bucket=bucket_parameter['Parameter']['Value'], Key=key)["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(body)
+
+
+def count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME):
     
-    parameter = ssm.get_parameter(
-        Name='/archive/dynamodb-table', WithDecryption=True)
+    details_parameter = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
     query_parameter = ssm.get_parameter(
         Name='/archive/query-lookup-dynamodb-table', WithDecryption=True)
     athena_bucket_parameter = ssm.get_parameter(
         Name='/athena/s3-athena-temp-bucket', WithDecryption=True)
 
-    table = dynamodb.Table(parameter['Parameter']['Value'])
+    details_table = dynamodb.Table(details_parameter['Parameter']['Value'])
     query_table = dynamodb.Table(query_parameter['Parameter']['Value'])
     
     athena_bucket_value = athena_bucket_parameter['Parameter']['Value']
@@ -39,10 +59,14 @@ def count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, TABLE_INDEX):
     # START Count Validation
     try:
 
+        # The archived table holds only the rows the job archived, so its count is compared with
+        # the source count of the same rows when the query completes
         query = "SELECT COUNT(*) from \"" + ARCHIVE_ID + "-" + DATABASE_NAME + \
                 "-database\".\"" + ARCHIVE_ID + "-" + \
             DATABASE_NAME + "-" + TABLE_NAME + "-table\""
 
+        source_count = get_source_count(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME) or {}
+
         response = CLIENT.start_query_execution(
             QueryString=query,
             ResultConfiguration={"OutputLocation": f's3://{athena_bucket_value}/queries/'}
@@ -59,14 +83,18 @@ def count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, TABLE_INDEX):
             })
 
         # Add validation to archive record
-        table.update_item(
-            Key={'id': ARCHIVE_ID},
-            UpdateExpression=f'set table_details[{TABLE_INDEX}].count_validation = :newJob',
+        details_table.update_item(
+            Key={'archive_id': ARCHIVE_ID, 'item_key': f'table#{TABLE_NAME}'},
+            UpdateExpression='set count_validation = :newJob',
+            ConditionExpression='attribute_exists(item_key)',
             ExpressionAttributeValues={
                 ':newJob': {
                     "query_execution_id": response["QueryExecutionId"],
                     "state": "RUNNING",
                     "query": query,
+                    "source_count": source_count.get("rows"),
+                    "source_filter": source_count.get("filter"),
+                    "source_bounded": source_count.get("bounded", source_count.get("filter") is not None),
                     "results": []
                 }
             }
@@ -85,15 +113,7 @@ def lambda_handler(event, context):
     DATABASE_NAME = event["database"]
     ARCHIVE_ID = event["archive_id"]
     
-    parameter = ssm.get_parameter(
-        Name='/archive/dynamodb-table', WithDecryption=True)
-
-    table = dynamodb.Table(parameter['Parameter']['Value'])
-    dynamodb_response = table.get_item(Key={"id": ARCHIVE_ID})
-
 	# Count Validation
-    for index, item in enumerate(dynamodb_response["Item"]["table_details"]):
-        if item["table"] == TABLE_NAME:
-            count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, index)
-            
+    count_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME)
+
     return event
\ No newline at end of file
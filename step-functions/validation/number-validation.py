@@ -21,15 +21,15 @@ ssm = boto3.client('ssm')
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 
 
-def number_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, TABLE_INDEX, ROW_KEY):
-    parameter = ssm.get_parameter(
-        Name='/archive/dynamodb-table', WithDecryption=True)
+def number_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, ROW_KEY):
+    details_parameter = ssm.get_parameter(
+        Name='/archive/details-dynamodb-table', WithDecryption=True)
     query_parameter = ssm.get_parameter(
         Name='/archive/query-lookup-dynamodb-table', WithDecryption=True)
     athena_bucket_parameter = ssm.get_parameter(
         Name='/athena/s3-athena-temp-bucket', WithDecryption=True)
 
-    table = dynamodb.Table(parameter['Parameter']['Value'])
+    details_table = dynamodb.Table(details_parameter['Parameter']['Value'])
     query_table = dynamodb.Table(query_parameter['Parameter']['Value'])
 
     athena_bucket_value = athena_bucket_parameter['Parameter']['Value']
@@ -57,9 +57,10 @@ def number_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, TABLE_INDEX, ROW_KE
             })
 
         # Add validation to archive record
-        table.update_item(
-            Key={'id': ARCHIVE_ID},
-            UpdateExpression=f'set table_details[{TABLE_INDEX}].number_validation = :newJob',
+        details_table.update_item(
+            Key={'archive_id': ARCHIVE_ID, 'item_key': f'table#{TABLE_NAME}'},
+            UpdateExpression='set number_validation = :newJob',
+            ConditionExpression='attribute_exists(item_key)',
             ExpressionAttributeValues={
                 ':newJob': {
                     "query_execution_id": response["QueryExecutionId"],
@@ -86,15 +87,7 @@ def lambda_handler(event, context):
     ARCHIVE_ID = event["archive_id"]
     ROW_KEY = event["key"]
 
-    parameter = ssm.get_parameter(
-        Name='/archive/dynamodb-table', WithDecryption=True)
-
-    table = dynamodb.Table(parameter['Parameter']['Value'])
-    dynamodb_response = table.get_item(Key={"id": ARCHIVE_ID})
-
     # Count Validation
-    for index, item in enumerate(dynamodb_response["Item"]["table_details"]):
-        if item["table"] == TABLE_NAME:
-            number_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, index, ROW_KEY)
+    number_validation(ARCHIVE_ID, DATABASE_NAME, TABLE_NAME, ROW_KEY)
 
     return event
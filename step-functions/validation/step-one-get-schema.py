@@ -17,6 +17,7 @@ import boto3
 import os
 
 REGION = os.getenv("REGION")
+ARCHIVE_DETAILS_TABLE = os.environ["ARCHIVE_DETAILS_TABLE"]
 dynamodb = boto3.resource('dynamodb', region_name=REGION)
 ssm = boto3.client('ssm')
 
@@ -48,6 +49,26 @@ def update_validation_count(archive_id):
     )
 
 
+def get_schema(archive_id, table_name):
+    """
+    Returns the schema of an archived table from its item in the archive details table.
+
+    Args:
+    archive_id (str): The ID of the archive the table belongs to.
+    table_name (str): The name of the table.
+
+    Returns:
+    list: The table's columns, or an empty list if the table has no item.
+    """
+
+    response = dynamodb.Table(ARCHIVE_DETAILS_TABLE).get_item(
+        Key={'archive_id': archive_id, 'item_key': f'table#{table_name}'},
+        ProjectionExpression="#schema",
+        ExpressionAttributeNames={"#schema": "schema"}
+    )
+    return response.get('Item', {}).get('schema', [])
+
+
 def lambda_handler(event, context):
     """
     Handles an AWS Lambda event and performs validation on a table schema.
@@ -68,6 +89,14 @@ def lambda_handler(event, context):
     string_counter = 0
     number_counter = 0
 
+    # Executions started before the schema was left out of the input still carry it
+    schema = event["table"].get("schema")
+    if schema is None:
+        schema = get_schema(event["table"]["archive_id"], event["table"]["table"])
+
+    # Columns deselected in the wizard are not archived and cannot be validated
+    archived_columns = [column for column in schema if column.get("existing", True)]
+
     # Count Validation
     update_validation_count(event["table"]["archive_id"])
     return_event.append({
@@ -80,7 +109,7 @@ def lambda_handler(event, context):
     })
 
     # String Validation
-    for schema in event["table"]["schema"][::-1]:
+    for schema in archived_columns[::-1]:
         if schema["value"] == "string":
             update_validation_count(event["table"]["archive_id"])
             return_event.append({
@@ -98,7 +127,7 @@ def lambda_handler(event, context):
             break
 
     # Number Validation
-    for schema in event["table"]["schema"][::-1]:
+    for schema in archived_columns[::-1]:
         if schema["value"] in ["decimal", "number", "int"]:
             update_validation_count(event["table"]["archive_id"])
             return_event.append({
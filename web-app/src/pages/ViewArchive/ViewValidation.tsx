@@ -199,23 +199,32 @@ export function ValidationTable(
 		if (!isSelected) {
 			return t('validationPage.selectTable');
 		} else if (isSelected && validationQueueindicator) {
+			const validation = selectedItems[0][validationName];
 			if (
-				Object.values(selectedItems[0][validationName]).length === 0 ||
-				selectedItems[0][validationName]['results'].length === 0
+				Object.values(validation).length === 0 ||
+				(validation['results'].length === 0 &&
+					!validation['results_location'])
 			) {
 				return t('validationPage.notAvailable');
 			} else {
 				console.log(selectedItems[0]);
+				// Large results are stored in S3; older archives keep the raw Athena rows
+				let outcome;
+				if (validation['results_location']) {
+					outcome = `${validation['results_rows']} rows in ${validation['results_location']}`;
+				} else if (Array.isArray(validation['results'][0])) {
+					outcome = validation['results'][0][0];
+				} else {
+					outcome = validation['results'][1]['Data'][0]['VarCharValue'];
+				}
 				return (
-					selectedItems[0][validationName]['query'] +
+					validation['query'] +
 					'\n' +
 					'/* ' +
 					validationName +
 					' ' +
-					(selectedItems[0][validationName]['results'][1]['Data'][0][
-						'VarCharValue'
-					] +
-						' */')
+					outcome +
+					' */'
 				);
 			}
 		} else if (validatingindicator) {